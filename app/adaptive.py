@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from app.config import SETTINGS
+from app.db import execute, fetch_all, fetch_one
+from app.diff import RISKY_LEVELS
+from app.utils import utc_now
+
+# Weight of the newest observation in the smoothed change rate.
+CHANGE_ALPHA = 0.3
+
+
+def interval_bounds(job: Any) -> tuple:
+    low = job["min_interval_seconds"] or job["interval_seconds"]
+    high = job["max_interval_seconds"] or max(job["interval_seconds"], SETTINGS.adaptive_max_interval_seconds)
+    return low, max(low, high)
+
+
+def effective_interval(job: Any) -> int:
+    """Seconds between runs: the adapted interval for adaptive jobs, else ``interval_seconds``."""
+    if job["adaptive"] and job["current_interval_seconds"]:
+        return job["current_interval_seconds"]
+    return job["interval_seconds"]
+
+
+def interval_for(job_id: str) -> Optional[int]:
+    row = fetch_one(
+        """
+        SELECT interval_seconds, adaptive, current_interval_seconds FROM jobs
+        WHERE id = ? AND status = 'active'
+        """,
+        (job_id,),
+    )
+    return effective_interval(row) if row else None
+
+
+def _recently_risky(risk_level: Optional[str], last_risk_at: Optional[str]) -> bool:
+    if risk_level in RISKY_LEVELS:
+        return True
+    if not last_risk_at:
+        return False
+    try:
+        flagged = datetime.fromisoformat(last_risk_at)
+    except ValueError:
+        return False
+    return datetime.now(timezone.utc) - flagged < timedelta(seconds=SETTINGS.adaptive_risk_hold_seconds)
+
+
+def adapt_interval(job_id: str, changed: bool, risk_level: Optional[str]) -> Optional[int]:
+    """Record one successful run and move the job's interval.
+
+    Pages flagged recently go straight to the minimum interval. Otherwise a
+    change halves the interval and an unchanged run stretches it by
+    ADAPTIVE_BACKOFF, so stable pages drift toward the maximum and busy ones
+    toward the minimum. Returns the new interval (None for non-adaptive jobs).
+    """
+    job = fetch_one(
+        """
+        SELECT j.interval_seconds, j.adaptive, j.min_interval_seconds, j.max_interval_seconds,
+               j.current_interval_seconds, s.change_rate, s.last_risk_at
+        FROM jobs j LEFT JOIN job_state s ON s.job_id = j.id
+        WHERE j.id = ?
+        """,
+        (job_id,),
+    )
+    if not job:
+        return None
+    rate = job["change_rate"]
+    rate = float(changed) if rate is None else CHANGE_ALPHA * changed + (1 - CHANGE_ALPHA) * rate
+    execute(
+        "UPDATE job_state SET change_rate = ?, last_change_at = COALESCE(?, last_change_at) WHERE job_id = ?",
+        (rate, utc_now() if changed else None, job_id),
+    )
+    if not job["adaptive"]:
+        return None
+    low, high = interval_bounds(job)
+    current = effective_interval(job)
+    if _recently_risky(risk_level, job["last_risk_at"]):
+        target = low
+    elif changed:
+        target = current / 2
+    else:
+        target = current * SETTINGS.adaptive_backoff
+    target = int(min(high, max(low, target)))
+    if target != job["current_interval_seconds"]:
+        execute("UPDATE jobs SET current_interval_seconds = ? WHERE id = ?", (target, job_id))
+    return target
+
+
+def adaptive_stats() -> Dict[str, Any]:
+    rows = fetch_all(
+        "SELECT interval_seconds, adaptive, current_interval_seconds FROM jobs WHERE status = 'active'"
+    )
+    base = sum(3600 / row["interval_seconds"] for row in rows)
+    actual = sum(3600 / effective_interval(row) for row in rows)
+    return {
+        "adaptive_jobs": sum(1 for row in rows if row["adaptive"]),
+        "runs_per_hour": round(actual, 1),
+        "runs_per_hour_fixed": round(base, 1),
+    }
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.config import SETTINGS
+from app.db import execute, fetch_all, fetch_one, parse_json
+from app.diff import RISKY_LEVELS
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+_STATS_LOCK = threading.Lock()
+STATS = {"sent": 0, "suppressed": 0}
+
+
+def alert_fingerprint(analysis: Dict[str, Any]) -> str:
+    """Identity of an incident: risk level, flag set and (optionally) the evidence,
+    normalized so rewording or reordering by the model doesn't make a new alert."""
+    flags = sorted({str(flag).strip().lower() for flag in analysis.get("flags") or []})
+    evidence = []
+    if SETTINGS.alert_key_evidence:
+        evidence = sorted({_NON_WORD.sub(" ", str(item).lower()).strip() for item in analysis.get("evidence") or []})
+    payload = json.dumps([analysis.get("risk_level", "none"), flags, evidence])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def _older_than(timestamp: Optional[str], seconds: float) -> bool:
+    if not timestamp:
+        return True
+    return datetime.now(timezone.utc) - datetime.fromisoformat(timestamp) >= timedelta(seconds=seconds)
+
+
+def _payload(job: Dict[str, Any], run_id: str, event: str, alert: Any, finished_at: str, **extra: Any) -> Dict[str, Any]:
+    resolved = event == "alert.resolved"
+    return {
+        "event": event,
+        "job_id": job["id"],
+        "run_id": run_id,
+        "url": job["url"],
+        "risk_level": "none" if resolved else alert["risk_level"],
+        "flags": [] if resolved else parse_json(alert["flags"]) or [],
+        "evidence": [] if resolved else parse_json(alert["evidence"]) or [],
+        "timestamp": finished_at,
+        "alert": {"id": alert["id"], "fingerprint": alert["fingerprint"], "opened_at": alert["opened_at"], **extra},
+    }
+
+
+def _mark_sent(alert_id: int, state: str, now: str) -> None:
+    execute(
+        """
+        UPDATE alerts SET notified_state = ?, last_notified_at = ?, notify_count = notify_count + 1
+        WHERE id = ?
+        """,
+        (state, now, alert_id),
+    )
+
+
+def _resolve_others(job: Dict[str, Any], keep: Optional[int], now: str, notify: bool) -> List[Any]:
+    """Close the job's active alerts other than ``keep``; returns those the
+    customer was told about and not yet told are over."""
+    rows = fetch_all(
+        """
+        UPDATE alerts SET state = 'resolved', resolved_at = COALESCE(resolved_at, ?)
+        WHERE job_id = ? AND id != ? AND (state != 'resolved' OR notified_state = 'open')
+        RETURNING id, fingerprint, risk_level, flags, evidence, opened_at, notified_state
+        """,
+        (now, job["id"], keep or -1),
+    )
+    return [row for row in rows if notify and row["notified_state"] == "open"]
+
+
+def evaluate_alerts(job: Dict[str, Any], run_id: str, analysis: Dict[str, Any], finished_at: str) -> List[Dict[str, Any]]:
+    """Advance the job's alert state for one fresh verdict; returns the webhook payloads to send.
+
+    Each (job, fingerprint) is one alert row: ``open`` when first seen, ``ongoing``
+    while later runs keep seeing it, ``resolved`` once a run no longer does. The
+    customer hears when an alert opens, when it resolves (ALERT_NOTIFY_RESOLVED),
+    every ALERT_REMIND_SECONDS while it lasts (0: never) and when it comes back
+    after being reported resolved, unless that report was less than
+    ALERT_RENOTIFY_SECONDS ago. A page flipping between variants therefore costs
+    one message per variant, not one per run. ``job_state.alert_fingerprint``
+    holds the active fingerprint, so each run touches a fixed number of rows:
+    safe runs with no active alert none at all, risky ones one indexed upsert.
+    """
+    now = finished_at
+    risky = analysis.get("risk_level", "none") in RISKY_LEVELS
+    state = fetch_one("SELECT alert_fingerprint FROM job_state WHERE job_id = ?", (job["id"],))
+    active = state["alert_fingerprint"] if state else None
+    payloads: List[Dict[str, Any]] = []
+
+    if not risky:
+        if active is None:
+            return []
+        for alert in _resolve_others(job, None, now, SETTINGS.alert_notify_resolved):
+            payloads.append(_payload(job, run_id, "alert.resolved", alert, finished_at, state="resolved"))
+            _mark_sent(alert["id"], "resolved", now)
+        execute("UPDATE job_state SET alert_fingerprint = NULL WHERE job_id = ?", (job["id"],))
+        return _count(payloads, 0)
+
+    fingerprint = alert_fingerprint(analysis)
+    alert = fetch_one(
+        """
+        INSERT INTO alerts (job_id, fingerprint, risk_level, flags, evidence, state, opened_at, last_seen_at)
+        VALUES (?, ?, ?, ?, ?, 'open', ?, ?)
+        ON CONFLICT(job_id, fingerprint) DO UPDATE SET
+            state = CASE WHEN state = 'resolved' THEN 'open' ELSE 'ongoing' END,
+            opened_at = CASE WHEN state = 'resolved' THEN excluded.opened_at ELSE opened_at END,
+            resolved_at = NULL,
+            evidence = excluded.evidence,
+            last_seen_at = excluded.last_seen_at
+        RETURNING id, fingerprint, risk_level, flags, evidence, state, notified_state, opened_at, last_notified_at
+        """,
+        (
+            job["id"],
+            fingerprint,
+            analysis.get("risk_level"),
+            json.dumps(analysis.get("flags") or []),
+            json.dumps(analysis.get("evidence") or []),
+            now,
+            now,
+        ),
+    )
+    if fingerprint != active:
+        execute("UPDATE job_state SET alert_fingerprint = ? WHERE job_id = ?", (fingerprint, job["id"]))
+    replaced = _resolve_others(job, alert["id"], now, True) if active is not None else []
+
+    if alert["notified_state"] == "open":
+        send = SETTINGS.alert_remind_seconds > 0 and _older_than(alert["last_notified_at"], SETTINGS.alert_remind_seconds)
+        event = "alert.ongoing"
+    else:
+        send = alert["notified_state"] is None or _older_than(alert["last_notified_at"], SETTINGS.alert_renotify_seconds)
+        event = "alert.opened"
+    if not send:
+        return _count([], 1)
+    extra = {"state": alert["state"]}
+    if replaced:
+        # The customer learns the old variants are over from this message.
+        extra["replaces"] = [row["id"] for row in replaced]
+        for row in replaced:
+            _mark_sent(row["id"], "resolved", now)
+    _mark_sent(alert["id"], "open", now)
+    return _count([_payload(job, run_id, event, alert, finished_at, **extra)], 0)
+
+
+def _count(payloads: List[Dict[str, Any]], suppressed: int) -> List[Dict[str, Any]]:
+    with _STATS_LOCK:
+        STATS["sent"] += len(payloads)
+        STATS["suppressed"] += suppressed
+    return payloads
+
+
+def alert_stats() -> Dict[str, Any]:
+    rows = fetch_all("SELECT state, COUNT(*) AS count FROM alerts GROUP BY state")
+    with _STATS_LOCK:
+        counters = dict(STATS)
+    return {"alerts": {row["state"]: row["count"] for row in rows}, "notifications": counters}
@@ -1,13 +1,21 @@
 from __future__ import annotations
 
-import base64
+import asyncio
+import hashlib
 import json
-from typing import Any, Dict, List, Tuple
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import httpx
 import anthropic
 
 from app.config import SETTINGS
+from app.http_clients import get_async_client, get_client
+from app.image_cache import IMAGE_CACHE, CachedImage, ImageCache
+from app.prompt import build_params, rank_image_urls
 
 SUPPORTED_MEDIA_TYPES = {
     "image/jpeg",
@@ -17,62 +25,176 @@ SUPPORTED_MEDIA_TYPES = {
 }
 
 
-def _truncate_text(lines: List[str]) -> str:
-    text = "\n".join(lines)
-    if len(text) <= SETTINGS.max_text_chars:
-        return text
-    return text[: SETTINGS.max_text_chars]
+def _accepted_media_type(resp: httpx.Response) -> str | None:
+    media_type = resp.headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type not in SUPPORTED_MEDIA_TYPES:
+        return None
+    length = resp.headers.get("content-length")
+    if length and length.isdigit() and int(length) > SETTINGS.max_image_bytes:
+        return None
+    return media_type
+
+
+def _remember(
+    url: str, media_type: str, data: bytes, headers: httpx.Headers
+) -> CachedImage:
+    if SETTINGS.image_cache_enabled:
+        return IMAGE_CACHE.store(
+            url, media_type, data, headers.get("etag"), headers.get("last-modified")
+        )
+    return CachedImage(
+        url=url,
+        media_type=media_type,
+        content_hash=hashlib.sha256(data).hexdigest(),
+        phash=None,
+        data=data,
+    )
+
+
+def _select_images(images: List[CachedImage]) -> List[CachedImage]:
+    selected: List[CachedImage] = []
+    seen = set()
+    for image in images:
+        if image.content_hash in seen:
+            continue
+        seen.add(image.content_hash)
+        if SETTINGS.image_cache_skip_benign and IMAGE_CACHE.is_known_benign(image):
+            continue
+        selected.append(image)
+    return selected
+
+
+_IMAGE_POOL: Optional[ThreadPoolExecutor] = None
+_IMAGE_POOL_LOCK = threading.Lock()
+
+
+def get_image_pool() -> ThreadPoolExecutor:
+    global _IMAGE_POOL
+    with _IMAGE_POOL_LOCK:
+        if _IMAGE_POOL is None:
+            _IMAGE_POOL = ThreadPoolExecutor(max(1, SETTINGS.image_fetch_workers), thread_name_prefix="image")
+        return _IMAGE_POOL
+
 
+def shutdown_image_pool() -> None:
+    global _IMAGE_POOL
+    with _IMAGE_POOL_LOCK:
+        pool, _IMAGE_POOL = _IMAGE_POOL, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
 
-def _fetch_image(url: str) -> Tuple[str, str] | None:
+
+def _fetch_image(url: str, deadline: float) -> CachedImage | None:
+    """Fetch one image, giving up at ``deadline`` (``time.monotonic()``): each
+    network wait is capped at the time left, and so is the body download."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+    cached = IMAGE_CACHE.lookup(url) if SETTINGS.image_cache_enabled else None
+    timeout = httpx.Timeout(min(SETTINGS.http_timeout_seconds, remaining))
     try:
-        with httpx.Client(timeout=10.0, follow_redirects=True) as client:
-            resp = client.get(url)
+        with get_client().stream(
+            "GET", url, headers=ImageCache.conditional_headers(cached), timeout=timeout
+        ) as resp:
+            if resp.status_code == 304 and cached:
+                return IMAGE_CACHE.load(cached)
             resp.raise_for_status()
-            media_type = resp.headers.get("content-type", "").split(";")[0].strip().lower()
-            if media_type not in SUPPORTED_MEDIA_TYPES:
+            media_type = _accepted_media_type(resp)
+            if not media_type:
                 return None
-            if len(resp.content) > SETTINGS.max_image_bytes:
-                return None
-            encoded = base64.b64encode(resp.content).decode("ascii")
-            return media_type, encoded
+            body = bytearray()
+            for chunk in resp.iter_bytes():
+                body.extend(chunk)
+                if len(body) > SETTINGS.max_image_bytes or time.monotonic() > deadline:
+                    return None
+            headers = resp.headers
     except httpx.HTTPError:
         return None
+    return _remember(url, media_type, bytes(body), headers)
 
 
-def _collect_images(image_urls: List[str]) -> List[Dict[str, Any]]:
-    images: List[Dict[str, Any]] = []
-    for url in image_urls[: SETTINGS.max_images]:
-        result = _fetch_image(url)
-        if not result:
+def _collect_images(image_urls: List[str]) -> List[CachedImage]:
+    urls = image_urls[: SETTINGS.max_images]
+    if not urls:
+        return []
+    deadline = time.monotonic() + SETTINGS.image_fetch_deadline_seconds
+    limit = max(1, SETTINGS.image_fetch_concurrency)
+    pool = get_image_pool()
+    futures: List[Future] = []
+    pending: Set[Future] = set()
+    for url in urls:
+        if len(pending) >= limit:
+            _, pending = wait(pending, max(0.0, deadline - time.monotonic()), FIRST_COMPLETED)
+            if len(pending) >= limit:
+                break
+        future = pool.submit(_fetch_image, url, deadline)
+        futures.append(future)
+        pending.add(future)
+    wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+    images: List[CachedImage] = []
+    for future in futures:
+        if not future.done() or future.exception() is not None:
             continue
-        media_type, encoded = result
-        images.append(
-            {
-                "type": "image",
-                "source": {"type": "base64", "media_type": media_type, "data": encoded},
-            }
-        )
-    return images
-
-
-def _build_prompt(url: str, text: str, image_urls: List[str]) -> str:
-    return (
-        "You are a content safety analyst. First infer the website context (e.g., portfolio, "
-        "e-commerce, news, documentation, hobby, research, community). Then assess risk ONLY "
-        "if the content is promotional, instructional, transactional, or directly depicting "
-        "harmful items. Do NOT flag neutral mentions in academic, historical, portfolio, or "
-        "news contexts unless there is clear promotion or instruction.\n\n"
-        "Return ONLY valid JSON with keys:\n"
-        "- site_context: short string\n"
-        "- risk_level: none|low|high\n"
-        "- flags: array of strings\n"
-        "- evidence: array of objects with fields {type, snippet, rationale}\n"
-        "- summary: 1-3 sentences explaining the decision in plain language\n\n"
-        f"URL: {url}\n"
-        f"Image URLs (for reference): {image_urls}\n"
-        f"Text:\n{text}"
-    )
+        result = future.result()
+        if result:
+            images.append(result)
+    return _select_images(images)
+
+
+async def _fetch_image_async(
+    client: httpx.AsyncClient,
+    url: str,
+    job_limit: asyncio.Semaphore,
+    stage_limit: Optional[asyncio.Semaphore],
+) -> CachedImage | None:
+    cached = await asyncio.to_thread(IMAGE_CACHE.lookup, url) if SETTINGS.image_cache_enabled else None
+    try:
+        async with job_limit, stage_limit or nullcontext():
+            async with client.stream(
+                "GET", url, headers=ImageCache.conditional_headers(cached)
+            ) as resp:
+                if resp.status_code == 304 and cached:
+                    return await asyncio.to_thread(IMAGE_CACHE.load, cached)
+                resp.raise_for_status()
+                media_type = _accepted_media_type(resp)
+                if not media_type:
+                    return None
+                body = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    body.extend(chunk)
+                    if len(body) > SETTINGS.max_image_bytes:
+                        return None
+                headers = resp.headers
+    except httpx.HTTPError:
+        return None
+    return await asyncio.to_thread(_remember, url, media_type, bytes(body), headers)
+
+
+async def _collect_images_async(
+    image_urls: List[str], limit: Optional[asyncio.Semaphore] = None
+) -> List[CachedImage]:
+    urls = image_urls[: SETTINGS.max_images]
+    if not urls:
+        return []
+    client = get_async_client()
+    job_limit = asyncio.Semaphore(max(1, SETTINGS.image_fetch_concurrency))
+    tasks = [asyncio.ensure_future(_fetch_image_async(client, url, job_limit, limit)) for url in urls]
+    _, pending = await asyncio.wait(tasks, timeout=SETTINGS.image_fetch_deadline_seconds)
+    for task in pending:
+        task.cancel()
+    images: List[CachedImage] = []
+    for task in tasks:
+        if task in pending or task.exception() is not None:
+            continue
+        result = task.result()
+        if result:
+            images.append(result)
+    return await asyncio.to_thread(_select_images, images)
+
+
+def remember_verdict(image_hashes: List[str], risk_level: str) -> None:
+    if SETTINGS.image_cache_enabled and image_hashes:
+        IMAGE_CACHE.mark_classified(image_hashes, risk_level)
 
 
 def _extract_json(text: str) -> Dict[str, Any]:
@@ -86,23 +208,31 @@ def _extract_json(text: str) -> Dict[str, Any]:
         return json.loads(text[start : end + 1])
 
 
-def analyze_content(url: str, text_lines: List[str], image_urls: List[str]) -> Dict[str, Any]:
-    if not SETTINGS.claude_api_key:
-        raise RuntimeError("CLAUDE_API_KEY is not set")
+_USAGE_FIELDS = ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens")
+_USAGE: Dict[str, int] = dict.fromkeys(("messages", *_USAGE_FIELDS), 0)
+_USAGE_LOCK = threading.Lock()
+
+
+def _record_usage(message: Any) -> None:
+    usage = getattr(message, "usage", None)
+    with _USAGE_LOCK:
+        _USAGE["messages"] += 1
+        for name in _USAGE_FIELDS:
+            _USAGE[name] += getattr(usage, name, None) or 0
+
+
+def llm_usage() -> Dict[str, Any]:
+    """Token usage since startup; ``cache_hit_ratio`` is the share of prompt
+    tokens read from the prompt cache."""
+    with _USAGE_LOCK:
+        usage: Dict[str, Any] = dict(_USAGE)
+    prompt = usage["input_tokens"] + usage["cache_creation_input_tokens"] + usage["cache_read_input_tokens"]
+    usage["cache_hit_ratio"] = round(usage["cache_read_input_tokens"] / prompt, 3) if prompt else 0.0
+    return usage
 
-    text = _truncate_text(text_lines)
-    prompt = _build_prompt(url, text, image_urls)
-    content: List[Dict[str, Any]] = [{"type": "text", "text": prompt}]
-    content.extend(_collect_images(image_urls))
-
-    client = anthropic.Anthropic(api_key=SETTINGS.claude_api_key)
-    message = client.messages.create(
-        model=SETTINGS.anthropic_model,
-        max_tokens=512,
-        system="You are a content safety classifier. Respond with JSON only.",
-        messages=[{"role": "user", "content": content}],
-    )
 
+def parse_message(message: Any) -> Dict[str, Any]:
+    _record_usage(message)
     raw = "".join(
         part.text for part in message.content if getattr(part, "type", "") == "text"
     ).strip()
@@ -114,3 +244,84 @@ def analyze_content(url: str, text_lines: List[str], image_urls: List[str]) -> D
         "evidence": parsed.get("evidence") or [],
         "summary": parsed.get("summary", ""),
     }
+
+
+def build_request(
+    url: str,
+    text_lines: List[str],
+    image_urls: List[str],
+    previous: Optional[Dict[str, Any]] = None,
+    alts: Optional[Dict[str, str]] = None,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Return ``messages.create`` params and the content hashes of attached images."""
+    images = _collect_images(rank_image_urls(image_urls, alts))
+    params, attached = build_params(url, text_lines, image_urls, images, previous, alts)
+    return params, [image.content_hash for image in attached]
+
+
+_CLIENT: Optional[anthropic.Anthropic] = None
+_ASYNC_CLIENT: Optional[anthropic.AsyncAnthropic] = None
+
+
+def get_anthropic_client() -> anthropic.Anthropic:
+    global _CLIENT
+    if not SETTINGS.claude_api_key:
+        raise RuntimeError("CLAUDE_API_KEY is not set")
+    if _CLIENT is None:
+        _CLIENT = anthropic.Anthropic(
+            api_key=SETTINGS.claude_api_key, base_url=SETTINGS.anthropic_base_url or None
+        )
+    return _CLIENT
+
+
+def _async_client() -> anthropic.AsyncAnthropic:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        _ASYNC_CLIENT = anthropic.AsyncAnthropic(
+            api_key=SETTINGS.claude_api_key, base_url=SETTINGS.anthropic_base_url or None
+        )
+    return _ASYNC_CLIENT
+
+
+def analyze_content(
+    url: str,
+    text_lines: List[str],
+    image_urls: List[str],
+    previous: Optional[Dict[str, Any]] = None,
+    alts: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Classify a page. With ``previous`` set, ``text_lines``/``image_urls`` hold
+    only the added or changed content and the model updates the prior verdict.
+    """
+    client = get_anthropic_client()
+    params, image_hashes = build_request(url, text_lines, image_urls, previous, alts)
+    message = client.messages.create(**params)
+    result = parse_message(message)
+    remember_verdict(image_hashes, result["risk_level"])
+    return result
+
+
+async def analyze_content_async(
+    url: str,
+    text_lines: List[str],
+    image_urls: List[str],
+    previous: Optional[Dict[str, Any]] = None,
+    alts: Optional[Dict[str, str]] = None,
+    *,
+    image_limit: Optional[asyncio.Semaphore] = None,
+    llm_limit: Optional[asyncio.Semaphore] = None,
+) -> Dict[str, Any]:
+    if not SETTINGS.claude_api_key:
+        raise RuntimeError("CLAUDE_API_KEY is not set")
+
+    images = await _collect_images_async(rank_image_urls(image_urls, alts), image_limit)
+    params, attached = build_params(url, text_lines, image_urls, images, previous, alts)
+
+    client = _async_client()
+    async with llm_limit or nullcontext():
+        message = await client.messages.create(**params)
+    result = parse_message(message)
+    await asyncio.to_thread(
+        remember_verdict, [image.content_hash for image in attached], result["risk_level"]
+    )
+    return result
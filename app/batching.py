@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+import anthropic
+
+from app.analysis import get_anthropic_client, parse_message, remember_verdict
+from app.config import SETTINGS
+from app.db import execute, fetch_all, parse_json, transaction
+from app.prompt import inline_images
+from app.runner import fail_run, load_job, load_state, record_and_notify
+from app.utils import utc_now
+
+
+def flush_pending() -> int:
+    """Submit queued requests as one message batch. Returns the number submitted."""
+    rows = fetch_all(
+        "SELECT run_id, params FROM llm_batch_requests WHERE state = ? ORDER BY created_at LIMIT ?",
+        ("pending", max(1, SETTINGS.batch_max_requests)),
+    )
+    if not rows:
+        return 0
+    client = get_anthropic_client()
+    batch = client.messages.batches.create(
+        requests=[
+            {"custom_id": row["run_id"], "params": inline_images(parse_json(row["params"]))} for row in rows
+        ]
+    )
+    now = utc_now()
+    with transaction():
+        for row in rows:
+            execute(
+                "UPDATE llm_batch_requests SET state = ?, batch_id = ?, submitted_at = ? WHERE run_id = ?",
+                ("submitted", batch.id, now, row["run_id"]),
+            )
+    return len(rows)
+
+
+def _finish(row: Dict[str, Any], message: Any) -> None:
+    context = parse_json(row["context"])
+    job = load_job(row["job_id"])
+    analysis = parse_message(message)
+    record_and_notify(
+        job,
+        row["run_id"],
+        context["raw_hash"],
+        analysis,
+        load_state(job["id"]),
+        context["mode"],
+        fetch=context["fetch"],
+        blocks=context["blocks"],
+        images=context["images"],
+    )
+    remember_verdict(context["image_hashes"], analysis["risk_level"])
+
+
+def _close(run_id: str, state: str, error: str | None = None) -> bool:
+    """Move a request out of ``submitted``. False when another poller already closed it.
+
+    The request params and context are only needed until the result is recorded,
+    so they are cleared here rather than left for retention.
+    """
+    return execute(
+        """
+        UPDATE llm_batch_requests SET state = ?, error = ?, finished_at = ?, params = '', context = ''
+        WHERE run_id = ? AND state = ?
+        """,
+        (state, error, utc_now(), run_id, "submitted"),
+    ) > 0
+
+
+def _fail(run_id: str, error: str) -> bool:
+    with transaction():
+        if not _close(run_id, "failed", error):
+            return False
+        fail_run(run_id, RuntimeError(error))
+    return True
+
+
+def poll_submitted() -> int:
+    """Fan results of ended batches back to their runs. Returns the number of runs closed."""
+    batch_ids = [
+        row["batch_id"]
+        for row in fetch_all(
+            "SELECT DISTINCT batch_id FROM llm_batch_requests WHERE state = ?", ("submitted",)
+        )
+    ]
+    if not batch_ids:
+        return 0
+    client = get_anthropic_client()
+    closed = 0
+    for batch_id in batch_ids:
+        if client.messages.batches.retrieve(batch_id).processing_status != "ended":
+            continue
+        rows = {
+            row["run_id"]: dict(row)
+            for row in fetch_all(
+                "SELECT * FROM llm_batch_requests WHERE batch_id = ? AND state = ?",
+                (batch_id, "submitted"),
+            )
+        }
+        for item in client.messages.batches.results(batch_id):
+            row = rows.pop(item.custom_id, None)
+            if row is None:
+                continue
+            if item.result.type == "succeeded":
+                # Claim and record together: a poller that loses the race (or dies
+                # mid-way) never stores the verdict or notifies twice.
+                try:
+                    with transaction():
+                        claimed = _close(row["run_id"], "done")
+                        if claimed:
+                            _finish(row, item.result.message)
+                except Exception as exc:
+                    claimed = _fail(row["run_id"], str(exc))
+            else:
+                error = getattr(item.result, "error", None)
+                message = f"batch request {item.result.type}: {error}" if error else f"batch request {item.result.type}"
+                claimed = _fail(row["run_id"], message)
+            closed += claimed
+        for run_id in rows:
+            closed += _fail(run_id, "missing from batch results")
+    return closed
+
+
+def process_batches() -> Dict[str, int]:
+    if not SETTINGS.claude_api_key:
+        return {"submitted": 0, "closed": 0}
+    return {"closed": poll_submitted(), "submitted": flush_pending()}
+
+
+def _bench_params(index: int) -> Dict[str, Any]:
+    text = "Buy cheap ammo, discreet shipping." if index % 5 == 0 else "Docs for our open source tool."
+    return {
+        "model": SETTINGS.anthropic_model,
+        "max_tokens": 512,
+        "messages": [{"role": "user", "content": f"URL: https://example.com/{index}\nText:\n{text}"}],
+    }
+
+
+def _bench_realtime(client: anthropic.Anthropic, requests: int, workers: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda i: client.messages.create(**_bench_params(i)), range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 2),
+        "requests_per_minute": round(len(results) / elapsed * 60),
+        "http_requests": len(results),
+    }
+
+
+def _bench_batch(client: anthropic.Anthropic, requests: int, poll_seconds: float) -> Dict[str, Any]:
+    start = time.perf_counter()
+    batch = client.messages.batches.create(
+        requests=[{"custom_id": f"bench-{i}", "params": _bench_params(i)} for i in range(requests)]
+    )
+    polls = 0
+    while client.messages.batches.retrieve(batch.id).processing_status != "ended":
+        polls += 1
+        time.sleep(poll_seconds)
+    succeeded = sum(1 for item in client.messages.batches.results(batch.id) if item.result.type == "succeeded")
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 2),
+        "requests_per_minute": round(succeeded / elapsed * 60),
+        "http_requests": polls + 3,
+        "succeeded": succeeded,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare realtime vs batched LLM throughput (point ANTHROPIC_BASE_URL at fake_anthropic_server.py)."
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Requests per mode (default: 200)")
+    parser.add_argument("--workers", type=int, default=16, help="Realtime concurrency (default: 16)")
+    parser.add_argument("--poll", type=float, default=0.5, help="Batch poll interval in seconds (default: 0.5)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    client = get_anthropic_client().with_options(max_retries=10)
+    report = {
+        "realtime": _bench_realtime(client, args.requests, args.workers),
+        "batch": _bench_batch(client, args.requests, args.poll),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
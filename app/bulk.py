@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import codecs
+import csv
+import io
+import json
+import queue
+import sys
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+
+from app.config import SETTINGS
+from app.db import execute, fetch_all, init_db, transaction
+from app.events import publish_bulk
+from app.listing import JOB_FIELDS, Listing, like_prefix
+from app.models import JobCreate
+from app.scheduler import first_run_at
+from app.utils import url_key, utc_now
+
+IMPORT_BATCH = 1000
+ID_CHUNK = 500
+MAX_REPORTED_ERRORS = 50
+IMPORT_FIELDS = (
+    "url",
+    "interval_seconds",
+    "mode",
+    "webhook_url",
+    "llm_mode",
+    "adaptive",
+    "min_interval_seconds",
+    "max_interval_seconds",
+    "crawl_max_pages",
+    "crawl_max_seconds",
+)
+
+Scheduled = List[Tuple[str, int]]
+
+
+def _lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode a byte stream into lines (with their line endings), chunk by chunk."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _records(lines: Iterator[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, {key: value for key, value in record.items() if key and value not in ("", None)}
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, exc
+
+
+def _validate(record: Any, defaults: Dict[str, Any]) -> JobCreate:
+    if isinstance(record, Exception):
+        raise ValueError(f"invalid JSON: {record}")
+    if isinstance(record, str):
+        record = {"url": record}
+    if not isinstance(record, dict):
+        raise ValueError("expected an object or a URL string")
+    values = {**defaults, **{key: record[key] for key in IMPORT_FIELDS if key in record}}
+    url = str(values.get("url") or "").strip()
+    if url and "://" not in url:
+        url = "https://" + url
+    values["url"] = url
+    return JobCreate(**values)
+
+
+def _insert_batch(keyed: List[Tuple[str, JobCreate]]) -> Tuple[Scheduled, int]:
+    """Insert (url_key, job) pairs whose key isn't in the table yet; returns (created, duplicates)."""
+    now = utc_now()
+    with transaction() as conn:
+        marks = ", ".join("?" for _ in keyed)
+        existing = {
+            row[0]
+            for row in fetch_all(f"SELECT url_key FROM jobs WHERE url_key IN ({marks})", tuple(key for key, _ in keyed))
+        }
+        rows = []
+        created: Scheduled = []
+        for key, job in keyed:
+            if key in existing:
+                continue
+            job_id = str(uuid.uuid4())
+            rows.append(
+                (
+                    job_id,
+                    str(job.url),
+                    key,
+                    job.interval_seconds,
+                    job.mode,
+                    str(job.webhook_url) if job.webhook_url is not None else SETTINGS.default_webhook_url or "",
+                    "active",
+                    now,
+                    now,
+                    job.llm_mode,
+                    int(job.adaptive),
+                    job.min_interval_seconds,
+                    job.max_interval_seconds,
+                    job.crawl_max_pages,
+                    job.crawl_max_seconds,
+                    first_run_at(job_id, job.interval_seconds).isoformat(),
+                )
+            )
+            created.append((job_id, job.interval_seconds))
+        conn.executemany(
+            """
+            INSERT INTO jobs (id, url, url_key, interval_seconds, mode, webhook_url, status, created_at, updated_at,
+                              llm_mode, adaptive, min_interval_seconds, max_interval_seconds,
+                              crawl_max_pages, crawl_max_seconds, next_run_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+    return created, len(keyed) - len(created)
+
+
+def import_jobs(
+    chunks: Iterable[bytes],
+    fmt: str = "ndjson",
+    defaults: Optional[Dict[str, Any]] = None,
+    on_created: Optional[Callable[[Scheduled], None]] = None,
+) -> Dict[str, Any]:
+    """Create jobs from an NDJSON or CSV byte stream, IMPORT_BATCH rows per transaction.
+
+    Each record needs ``url``; other job fields fall back to ``defaults``. NDJSON
+    lines may also be bare JSON strings. Rows whose normalized URL already exists
+    (in the table or earlier in the file) are skipped.
+    """
+    defaults = defaults or {}
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"rows": 0, "created": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    seen = set()
+    batch: List[Tuple[str, JobCreate]] = []
+
+    def flush() -> None:
+        created, duplicates = _insert_batch(batch)
+        report["created"] += len(created)
+        report["duplicates"] += duplicates
+        batch.clear()
+        if created and on_created is not None:
+            on_created(created)
+
+    for line, record in _records(_lines(chunks), fmt):
+        report["rows"] += 1
+        try:
+            job = _validate(record, defaults)
+        except (ValueError, ValidationError) as exc:
+            report["invalid"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                message = exc.errors()[0]["msg"] if isinstance(exc, ValidationError) else str(exc)
+                report["errors"].append({"line": line, "error": message})
+            continue
+        key = url_key(str(job.url))
+        if key in seen:
+            report["duplicates"] += 1
+            continue
+        seen.add(key)
+        batch.append((key, job))
+        if len(batch) >= IMPORT_BATCH:
+            flush()
+    if batch:
+        flush()
+    if report["created"]:
+        publish_bulk("import", report["created"])
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows"] / elapsed) if elapsed else 0
+    return report
+
+
+_END = object()
+
+
+async def import_stream(
+    stream: AsyncIterator[bytes],
+    fmt: str,
+    defaults: Dict[str, Any],
+    on_created: Optional[Callable[[Scheduled], None]] = None,
+) -> Dict[str, Any]:
+    """Run ``import_jobs`` on a worker thread while the request body is still
+    arriving. The bounded queue keeps a fast client from buffering the whole upload."""
+    chunks: queue.Queue = queue.Queue(maxsize=16)
+
+    def feed() -> Iterator[bytes]:
+        while True:
+            chunk = chunks.get()
+            if chunk is _END:
+                return
+            yield chunk
+
+    task = asyncio.ensure_future(asyncio.to_thread(import_jobs, feed(), fmt, defaults, on_created))
+
+    async def put(item: Any) -> None:
+        while not task.done():
+            try:
+                chunks.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.005)
+
+    try:
+        async for chunk in stream:
+            if task.done():
+                break
+            await put(chunk)
+    finally:
+        await put(_END)
+    return await task
+
+
+def export_csv(listing: Listing) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(listing.output_fields)
+    for rows in listing.chunks(None, None):
+        for row in rows:
+            writer.writerow(["" if row[field] is None else row[field] for field in listing.output_fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def matching_job_ids(
+    ids: Optional[Sequence[str]] = None,
+    status: Optional[str] = None,
+    mode: Optional[str] = None,
+    llm_mode: Optional[str] = None,
+    url_prefix: Optional[str] = None,
+) -> List[str]:
+    filters = [
+        ("status = ?", status),
+        ("mode = ?", mode),
+        ("llm_mode = ?", llm_mode),
+        ("url LIKE ? ESCAPE '\\'", like_prefix(url_prefix)),
+    ]
+    clauses = [clause for clause, value in filters if value is not None]
+    params = [value for _, value in filters if value is not None]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    matched = [row[0] for row in fetch_all(f"SELECT id FROM jobs {where}", tuple(params))]
+    if ids is not None:
+        wanted = set(ids)
+        matched = [job_id for job_id in matched if job_id in wanted]
+    return matched
+
+
+def _chunks(ids: Sequence[str]) -> Iterator[Sequence[str]]:
+    for start in range(0, len(ids), ID_CHUNK):
+        yield ids[start : start + ID_CHUNK]
+
+
+def delete_jobs(ids: Sequence[str]) -> int:
+    """Delete jobs and everything hanging off them, one transaction per ID_CHUNK jobs."""
+    deleted = 0
+    for chunk in _chunks(ids):
+        marks = ", ".join("?" for _ in chunk)
+        with transaction():
+            for table in ("llm_batch_requests", "runs", "job_state", "run_daily", "alerts", "crawl_pages"):
+                execute(f"DELETE FROM {table} WHERE job_id IN ({marks})", tuple(chunk))
+            execute(f"DELETE FROM scrape_routes WHERE key IN ({marks})", tuple(f"job:{job_id}" for job_id in chunk))
+            deleted += execute(f"DELETE FROM jobs WHERE id IN ({marks})", tuple(chunk))
+    return deleted
+
+
+def set_status(ids: Sequence[str], status: str) -> Scheduled:
+    """Pause or resume jobs; returns (id, effective interval) of the jobs changed."""
+    changed: Scheduled = []
+    now = utc_now()
+    for chunk in _chunks(ids):
+        marks = ", ".join("?" for _ in chunk)
+        with transaction():
+            rows = fetch_all(
+                f"""
+                UPDATE jobs SET status = ?, updated_at = ?, current_interval_seconds = NULL
+                WHERE id IN ({marks}) AND status != ?
+                RETURNING id, interval_seconds
+                """,
+                (status, now, *chunk, status),
+            )
+        changed.extend((row["id"], row["interval_seconds"]) for row in rows)
+    return changed
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk import/export jobs without the API.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="Create jobs from an NDJSON or CSV file ('-' for stdin)")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--format", choices=("ndjson", "csv"), default=None)
+    import_cmd.add_argument("--interval", type=int, default=3600, help="Default interval_seconds")
+    import_cmd.add_argument("--mode", default="auto", help="Default mode")
+    export_cmd = sub.add_parser("export", help="Write jobs to stdout")
+    export_cmd.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    export_cmd.add_argument("--status", default=None)
+    return parser.parse_args()
+
+
+def main() -> None:
+    from app.listing import jobs_listing
+
+    args = parse_args()
+    init_db()
+    if args.command == "import":
+        fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+        handle = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+        with handle:
+            chunks = iter(lambda: handle.read(1 << 16), b"")
+            report = import_jobs(chunks, fmt, {"interval_seconds": args.interval, "mode": args.mode})
+        # A running API in local scheduler mode registers these timers on its next restart;
+        # leased workers pick them up from next_run_at right away.
+        print(json.dumps(report, indent=2))
+        return
+    listing = jobs_listing(",".join(JOB_FIELDS), args.status)
+    for part in (export_csv(listing) if args.format == "csv" else listing.stream(None, None)):
+        sys.stdout.write(part)
+
+
+if __name__ == "__main__":
+    main()
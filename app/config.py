@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import json
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -9,18 +10,140 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+DEFAULT_VOLATILE_PATTERNS = (
+    r"\b\d{4}-\d{2}-\d{2}(?:[ t]\d{1,2}:\d{2}(?::\d{2})?(?:\.\d+)?(?:z|[+-]\d{2}:?\d{2})?)?\b",
+    r"\b\d{1,2}/\d{1,2}/\d{2,4}\b",
+    r"\b\d{1,2}:\d{2}(?::\d{2})?\s*(?:am|pm)?\b",
+    r"\b\d+\s+(?:second|minute|hour|day|week|month|year)s?\s+ago\b",
+    r"\b[a-z0-9_\-]{32,}\b",
+    r"\b\d[\d,.]*\s*(?:views|comments|likes|shares|followers|online)\b",
+)
+
+
+def _env_patterns(name: str) -> tuple:
+    raw = os.environ.get(name)
+    if not raw:
+        return DEFAULT_VOLATILE_PATTERNS
+    return tuple(json.loads(raw))
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
 @dataclass(frozen=True)
 class Settings:
     db_path: Path = Path(os.environ.get("DB_PATH", "./data/app.db"))
+    db_synchronous: str = os.environ.get("DB_SYNCHRONOUS", "NORMAL")
+    db_cache_kib: int = int(os.environ.get("DB_CACHE_KIB", "16384"))
+    db_mmap_bytes: int = int(os.environ.get("DB_MMAP_BYTES", str(256 * 1024 * 1024)))
+    db_busy_timeout_ms: int = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+    retention_days: int = int(os.environ.get("RETENTION_DAYS", "30"))
+    archive_dir: Path = Path(os.environ.get("ARCHIVE_DIR", "./data/archive"))
+    retention_chunk_rows: int = int(os.environ.get("RETENTION_CHUNK_ROWS", "5000"))
+    compact_interval_seconds: int = int(os.environ.get("COMPACT_INTERVAL_SECONDS", "3600"))
+    vacuum_pages: int = int(os.environ.get("VACUUM_PAGES", "2000"))
+    events_retention_hours: int = int(os.environ.get("EVENTS_RETENTION_HOURS", "24"))
+    events_heartbeat_seconds: float = float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", "15"))
+    events_poll_seconds: float = float(os.environ.get("EVENTS_POLL_SECONDS", "5"))
     claude_api_key: str = os.environ.get("CLAUDE_API_KEY", "")
     anthropic_model: str = os.environ.get("ANTHROPIC_MODEL", "claude-3-5-sonnet-20241022")
+    anthropic_base_url: str = os.environ.get("ANTHROPIC_BASE_URL", "")
+    batch_flush_seconds: int = int(os.environ.get("BATCH_FLUSH_SECONDS", "60"))
+    batch_max_requests: int = int(os.environ.get("BATCH_MAX_REQUESTS", "1000"))
     default_webhook_url: str = os.environ.get("DEFAULT_WEBHOOK_URL", "")
-    max_text_chars: int = int(os.environ.get("MAX_TEXT_CHARS", "12000"))
+    # MAX_TEXT_CHARS is still honored as a rough fallback (~4 chars per token).
+    prompt_text_tokens: int = int(
+        os.environ.get("PROMPT_TEXT_TOKENS") or int(os.environ.get("MAX_TEXT_CHARS", "12000")) // 4
+    )
+    prompt_image_tokens: int = int(os.environ.get("PROMPT_IMAGE_TOKENS", "6400"))
+    prompt_cache: bool = _env_bool("PROMPT_CACHE", "1")
     max_images: int = int(os.environ.get("MAX_IMAGES", "8"))
     max_image_bytes: int = int(os.environ.get("MAX_IMAGE_BYTES", str(2 * 1024 * 1024)))
+    image_fetch_concurrency: int = int(os.environ.get("IMAGE_FETCH_CONCURRENCY", "4"))
+    image_fetch_workers: int = int(os.environ.get("IMAGE_FETCH_WORKERS", "16"))
+    image_fetch_deadline_seconds: float = float(os.environ.get("IMAGE_FETCH_DEADLINE_SECONDS", "15"))
+    image_cache_enabled: bool = _env_bool("IMAGE_CACHE_ENABLED", "1")
+    image_cache_dir: Path = Path(os.environ.get("IMAGE_CACHE_DIR", "./data/image_cache"))
+    image_cache_max_bytes: int = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    image_cache_skip_benign: bool = _env_bool("IMAGE_CACHE_SKIP_BENIGN", "1")
+    image_phash_distance: int = int(os.environ.get("IMAGE_PHASH_DISTANCE", "3"))
     auto_min_text_lines: int = int(os.environ.get("AUTO_MIN_TEXT_LINES", "5"))
-    webhook_max_retries: int = int(os.environ.get("WEBHOOK_MAX_RETRIES", "3"))
+    auto_routing: bool = _env_bool("AUTO_ROUTING", "1")
+    route_reprobe_runs: int = int(os.environ.get("ROUTE_REPROBE_RUNS", "20"))
+    route_reprobe_seconds: int = int(os.environ.get("ROUTE_REPROBE_SECONDS", str(3 * 86400)))
+    conditional_fetch: bool = _env_bool("CONDITIONAL_FETCH", "1")
+    incremental_analysis: bool = _env_bool("INCREMENTAL_ANALYSIS", "1")
+    incremental_max_added_ratio: float = float(os.environ.get("INCREMENTAL_MAX_ADDED_RATIO", "0.6"))
+    prefilter_enabled: bool = _env_bool("PREFILTER_ENABLED", "0")
+    prefilter_threshold: float = float(os.environ.get("PREFILTER_THRESHOLD", "2.0"))
+    prefilter_window_chars: int = int(os.environ.get("PREFILTER_WINDOW_CHARS", "160"))
+    prefilter_terms_path: str = os.environ.get("PREFILTER_TERMS_PATH", "")
+    prefilter_gate_images: bool = _env_bool("PREFILTER_GATE_IMAGES", "0")
+    volatile_patterns: tuple = field(default_factory=lambda: _env_patterns("VOLATILE_PATTERNS"))
+    alert_renotify_seconds: int = int(os.environ.get("ALERT_RENOTIFY_SECONDS", str(6 * 3600)))
+    alert_remind_seconds: int = int(os.environ.get("ALERT_REMIND_SECONDS", "0"))
+    alert_notify_resolved: bool = _env_bool("ALERT_NOTIFY_RESOLVED", "1")
+    alert_key_evidence: bool = _env_bool("ALERT_KEY_EVIDENCE", "1")
+    crawl_max_pages: int = int(os.environ.get("CRAWL_MAX_PAGES", "200"))
+    crawl_max_seconds: int = int(os.environ.get("CRAWL_MAX_SECONDS", "300"))
+    crawl_max_depth: int = int(os.environ.get("CRAWL_MAX_DEPTH", "5"))
+    crawl_concurrency: int = int(os.environ.get("CRAWL_CONCURRENCY", "4"))
+    crawl_workers: int = int(os.environ.get("CRAWL_WORKERS", "16"))
+    crawl_frontier_size: int = int(os.environ.get("CRAWL_FRONTIER_SIZE", "20000"))
+    crawl_seen_exact: int = int(os.environ.get("CRAWL_SEEN_EXACT", "100000"))
+    crawl_bloom_capacity: int = int(os.environ.get("CRAWL_BLOOM_CAPACITY", "5000000"))
+    crawl_bloom_error_rate: float = float(os.environ.get("CRAWL_BLOOM_ERROR_RATE", "0.001"))
+    crawl_max_analyses: int = int(os.environ.get("CRAWL_MAX_ANALYSES", "25"))
+    crawl_robots: bool = _env_bool("CRAWL_ROBOTS", "1")
+    crawl_sitemaps: bool = _env_bool("CRAWL_SITEMAPS", "1")
+    crawl_max_sitemap_urls: int = int(os.environ.get("CRAWL_MAX_SITEMAP_URLS", "100000"))
+    crawl_max_delay_seconds: float = float(os.environ.get("CRAWL_MAX_DELAY_SECONDS", "10"))
+    crawl_page_ttl_days: int = int(os.environ.get("CRAWL_PAGE_TTL_DAYS", "30"))
+    webhook_max_retries: int = int(os.environ.get("WEBHOOK_MAX_RETRIES", "10"))
     webhook_backoff_seconds: float = float(os.environ.get("WEBHOOK_BACKOFF_SECONDS", "1.5"))
+    webhook_backoff_max_seconds: float = float(os.environ.get("WEBHOOK_BACKOFF_MAX_SECONDS", "900"))
+    webhook_concurrency: int = int(
+        os.environ.get("WEBHOOK_CONCURRENCY") or os.environ.get("PIPELINE_WEBHOOK_CONCURRENCY", "32")
+    )
+    webhook_endpoint_concurrency: int = int(os.environ.get("WEBHOOK_ENDPOINT_CONCURRENCY", "2"))
+    webhook_circuit_failures: int = int(os.environ.get("WEBHOOK_CIRCUIT_FAILURES", "5"))
+    webhook_circuit_seconds: float = float(os.environ.get("WEBHOOK_CIRCUIT_SECONDS", "300"))
+    webhook_batch_size: int = int(os.environ.get("WEBHOOK_BATCH_SIZE", "1"))
+    webhook_batch_wait_seconds: float = float(os.environ.get("WEBHOOK_BATCH_WAIT_SECONDS", "0"))
+    browser_pool_size: int = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+    browser_max_pages: int = int(os.environ.get("BROWSER_MAX_PAGES", "100"))
+    render_profile: str = os.environ.get("RENDER_PROFILE", "full")
+    render_block_hosts: tuple = tuple(
+        host for host in os.environ.get("RENDER_BLOCK_HOSTS", "").split(",") if host.strip()
+    )
+    execution_engine: str = os.environ.get("EXECUTION_ENGINE", "threads")
+    scheduler_mode: str = os.environ.get("SCHEDULER_MODE", "local")
+    scheduler_worker_id: str = os.environ.get("SCHEDULER_WORKER_ID", "")
+    scheduler_capacity: int = int(os.environ.get("SCHEDULER_CAPACITY", "16"))
+    scheduler_poll_seconds: float = float(os.environ.get("SCHEDULER_POLL_SECONDS", "2"))
+    lease_seconds: float = float(os.environ.get("LEASE_SECONDS", "120"))
+    lease_store: str = os.environ.get("LEASE_STORE", "sqlite")
+    adaptive_max_interval_seconds: int = int(os.environ.get("ADAPTIVE_MAX_INTERVAL_SECONDS", "86400"))
+    adaptive_backoff: float = float(os.environ.get("ADAPTIVE_BACKOFF", "1.5"))
+    adaptive_risk_hold_seconds: int = int(os.environ.get("ADAPTIVE_RISK_HOLD_SECONDS", str(7 * 86400)))
+    schedule_jitter: bool = _env_bool("SCHEDULE_JITTER", "1")
+    host_max_concurrency: int = int(os.environ.get("HOST_MAX_CONCURRENCY", "2"))
+    host_min_interval_seconds: float = float(os.environ.get("HOST_MIN_INTERVAL_SECONDS", "1"))
+    pipeline_scrape_concurrency: int = int(os.environ.get("PIPELINE_SCRAPE_CONCURRENCY", "32"))
+    pipeline_image_concurrency: int = int(os.environ.get("PIPELINE_IMAGE_CONCURRENCY", "64"))
+    pipeline_llm_concurrency: int = int(os.environ.get("PIPELINE_LLM_CONCURRENCY", "8"))
+    parse_backend: str = os.environ.get("PARSE_BACKEND", "html.parser")
+    parse_workers: int = int(os.environ.get("PARSE_WORKERS", "0"))
+    parse_queue_size: int = int(os.environ.get("PARSE_QUEUE_SIZE", "64"))
+    parse_timeout_seconds: float = float(os.environ.get("PARSE_TIMEOUT_SECONDS", "20"))
+    http2: bool = _env_bool("HTTP2", "1")
+    http_timeout_seconds: float = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "10"))
+    http_max_connections: int = int(os.environ.get("HTTP_MAX_CONNECTIONS", "200"))
+    http_max_keepalive: int = int(os.environ.get("HTTP_MAX_KEEPALIVE", "50"))
+    http_keepalive_seconds: float = float(os.environ.get("HTTP_KEEPALIVE_SECONDS", "30"))
+    http_max_per_host: int = int(os.environ.get("HTTP_MAX_PER_HOST", "8"))
+    dns_cache_ttl_seconds: float = float(os.environ.get("DNS_CACHE_TTL_SECONDS", "300"))
 
 
 SETTINGS = Settings()
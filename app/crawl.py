@@ -0,0 +1,615 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+import httpx
+
+from app.analysis import analyze_content
+from app.config import SETTINGS
+from app.db import execute, fetch_all, fetch_one, init_db, insert_json, parse_json
+from app.diff import RISKY_LEVELS
+from app.http_clients import get_client
+from app.parsing import parse_html
+from app.prefilter import get_prefilter
+from app.utils import content_hash, url_key, utc_now
+from static.scrape import DEFAULT_HEADERS, normalize_url, page_links
+
+ROBOTS_AGENT = "URLValidatorBot"
+MAX_ROBOTS_BYTES = 500_000
+MAX_SITEMAP_FILES = 50
+SITEMAP_LOOKUP_CHUNK = 500
+MAX_FLAGGED_PAGES = 20
+
+_TRACKING_PARAM = re.compile(r"^(?:utm_\w+|fbclid|gclid|dclid|msclkid|yclid|igshid|mc_cid|mc_eid|_ga|_gl|ref_src)$")
+_NOT_A_PAGE = re.compile(
+    r"\.(?:jpe?g|png|gif|webp|avif|svg|ico|bmp|tiff?|pdf|zip|gz|tgz|rar|7z|exe|dmg|msi|apk|mp[34]|m4[av]|mov|avi|"
+    r"wmv|webm|ogg|wav|flac|css|js|json|xml|rss|atom|woff2?|ttf|eot|docx?|xlsx?|pptx?|csv)$",
+    re.IGNORECASE,
+)
+_XML_NAMESPACE = re.compile(r"^\{[^}]*\}")
+_SAFE = {
+    "site_context": "",
+    "risk_level": "none",
+    "flags": [],
+    "evidence": [],
+    "summary": "No risk terms found by the local pre-filter.",
+}
+
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_crawl_pool() -> ThreadPoolExecutor:
+    """Page fetches of every running crawl share these threads (and their SQLite
+    connections); each crawl keeps at most CRAWL_CONCURRENCY of them busy."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(SETTINGS.crawl_workers, thread_name_prefix="crawl")
+        return _POOL
+
+
+def shutdown_crawl_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def canonical_url(url: str) -> Optional[str]:
+    """Form crawled URLs are deduplicated on: ``url_key`` with dot segments
+    resolved and tracking parameters dropped from a sorted query. None for
+    anything that isn't an http(s) page."""
+    parts = urlsplit(url.strip())
+    if parts.scheme.lower() not in ("http", "https") or not parts.hostname or _NOT_A_PAGE.search(parts.path):
+        return None
+    path = parts.path or "/"
+    if "/." in path:
+        path = urlsplit(urljoin("http://host", path)).path
+    query = urlencode(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not _TRACKING_PARAM.match(name.lower())
+        )
+    )
+    return url_key(urlunsplit((parts.scheme, parts.netloc, path, query, "")))
+
+
+def _site(url: str) -> str:
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Set membership in a fixed ``bytearray``: no false negatives, and about
+    ``error_rate`` false positives once ``capacity`` items are in."""
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes) -> Iterator[int]:
+        # Kirsch-Mitzenmacher: k positions from two 64-bit halves of one hash.
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:16], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, digest: bytes) -> bool:
+        """Returns False if ``digest`` was (probably) already present."""
+        added = False
+        for position in self._positions(digest):
+            index, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[index] & mask:
+                self.bits[index] |= mask
+                added = True
+        self.count += added
+        return added
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class SeenSet:
+    """URLs already queued this crawl: an exact set of 16-byte digests up to
+    ``exact_limit``, then a Bloom filter, so memory stays flat on 100k+ URL
+    sites at the cost of rarely skipping a URL that wasn't seen."""
+
+    def __init__(self, exact_limit: int, capacity: int, error_rate: float) -> None:
+        self.exact_limit = exact_limit
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._exact: Optional[Set[bytes]] = set()
+        self._bloom: Optional[BloomFilter] = None
+
+    def add(self, key: str) -> bool:
+        digest = _digest(key)
+        if self._bloom is not None:
+            return self._bloom.add(digest)
+        assert self._exact is not None
+        if digest in self._exact:
+            return False
+        self._exact.add(digest)
+        if len(self._exact) > self.exact_limit:
+            self._bloom = BloomFilter(max(self.capacity, 2 * self.exact_limit), self.error_rate)
+            for item in self._exact:
+                self._bloom.add(item)
+            self._exact = None
+        return True
+
+    def __len__(self) -> int:
+        return self._bloom.count if self._bloom is not None else len(self._exact or ())
+
+    @property
+    def kind(self) -> str:
+        return "bloom" if self._bloom is not None else "exact"
+
+
+class Frontier:
+    """FIFO of (url, depth) for a breadth-first crawl, capped at ``limit``."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.dropped = 0
+        self._queue: Deque[Tuple[str, int]] = deque()
+
+    def push(self, url: str, depth: int) -> bool:
+        if len(self._queue) >= self.limit:
+            self.dropped += 1
+            return False
+        self._queue.append((url, depth))
+        return True
+
+    def pop(self) -> Tuple[str, int]:
+        return self._queue.popleft()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+
+def load_robots(client: httpx.Client, origin: str) -> Tuple[RobotFileParser, str]:
+    """Per RFC 9309: a 4xx robots.txt allows everything, an unreachable one (5xx,
+    network error) disallows everything."""
+    robots = RobotFileParser(f"{origin}/robots.txt")
+    try:
+        response = client.get(robots.url, headers=DEFAULT_HEADERS)
+    except httpx.HTTPError:
+        robots.disallow_all = True
+        return robots, "unreachable"
+    if response.status_code >= 500:
+        robots.disallow_all = True
+        return robots, "unreachable"
+    if response.status_code >= 400:
+        robots.allow_all = True
+        return robots, "missing"
+    robots.parse(response.text[:MAX_ROBOTS_BYTES].splitlines())
+    return robots, "ok"
+
+
+def _timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def sitemap_entries(client: httpx.Client, url: str, limit: int) -> Iterator[Tuple[str, Optional[str]]]:
+    """(loc, lastmod) for the pages in ``url`` and the sitemaps it indexes.
+
+    Files are parsed as they stream in (gzip included) and each entry is dropped
+    once read, so a 50 MB sitemap never sits in memory."""
+    pending = deque([url])
+    visited: Set[str] = set()
+    yielded = 0
+    while pending and len(visited) < MAX_SITEMAP_FILES:
+        current = pending.popleft()
+        if current in visited:
+            continue
+        visited.add(current)
+        try:
+            with client.stream("GET", current, headers=DEFAULT_HEADERS) as response:
+                if response.status_code != 200:
+                    continue
+                parser = XMLPullParser(events=("start", "end"))
+                inflate: Any = None
+                root = None
+                loc: Optional[str] = None
+                lastmod: Optional[str] = None
+                for chunk in response.iter_bytes():
+                    if inflate is None:
+                        inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == b"\x1f\x8b" else False
+                    parser.feed(inflate.decompress(chunk) if inflate else chunk)
+                    for event, element in parser.read_events():
+                        if event == "start":
+                            root = element if root is None else root
+                            continue
+                        tag = _XML_NAMESPACE.sub("", element.tag)
+                        if tag == "loc":
+                            loc = (element.text or "").strip()
+                        elif tag == "lastmod":
+                            lastmod = (element.text or "").strip()
+                        elif tag in ("url", "sitemap"):
+                            if loc and tag == "sitemap":
+                                pending.append(loc)
+                            elif loc:
+                                yield loc, lastmod
+                                yielded += 1
+                                if yielded >= limit:
+                                    return
+                            loc = lastmod = None
+                            root.clear()
+        except (httpx.HTTPError, ParseError, zlib.error):
+            continue
+
+
+@dataclass
+class PageResult:
+    url: str
+    depth: int
+    outcome: str = "unchanged"
+    links: List[str] = field(default_factory=list)
+    change: Optional[Tuple[str, str]] = None
+    error: Optional[str] = None
+
+
+class Crawler:
+    """Breadth-first crawl of a crawl-mode job's site within its page and time budget.
+
+    Same-site links (``www.`` ignored) up to CRAWL_MAX_DEPTH are queued once each,
+    robots.txt permitting. Sitemap pages come after the start page, except those
+    whose ``lastmod`` is older than our last visit. Every page's body and content
+    hash is kept in ``crawl_pages``; only pages whose content changed are analyzed,
+    at most ``max_analyses`` LLM calls per crawl (the rest wait for the next one).
+    """
+
+    def __init__(self, job: Dict[str, Any], client: Optional[httpx.Client] = None) -> None:
+        self.job = job
+        self.client = client or get_client()
+        self.root = canonical_url(normalize_url(job["url"])) or normalize_url(job["url"])
+        parts = urlsplit(self.root)
+        self.origin = f"{parts.scheme}://{parts.netloc}"
+        self.site = _site(self.root)
+        self.max_pages = job.get("crawl_max_pages") or SETTINGS.crawl_max_pages
+        self.max_seconds = job.get("crawl_max_seconds") or SETTINGS.crawl_max_seconds
+        self.max_analyses = SETTINGS.crawl_max_analyses
+        self.frontier = Frontier(SETTINGS.crawl_frontier_size)
+        self.seen = SeenSet(SETTINGS.crawl_seen_exact, SETTINGS.crawl_bloom_capacity, SETTINGS.crawl_bloom_error_rate)
+        self.robots: Optional[RobotFileParser] = None
+        self.changes: List[Tuple[str, str]] = []
+        self.stats: Dict[str, Any] = dict.fromkeys(
+            (
+                "pages",
+                "changed",
+                "unchanged",
+                "deferred",
+                "gone",
+                "skipped",
+                "errors",
+                "robots_blocked",
+                "depth_limited",
+                "sitemap_urls",
+                "sitemap_fresh",
+            ),
+            0,
+        )
+        self._analyses = 0
+        self._analyses_lock = threading.Lock()
+
+    def _discover(self, url: str, depth: int) -> None:
+        key = canonical_url(url)
+        if key is None or _site(key) != self.site:
+            return
+        if depth > SETTINGS.crawl_max_depth:
+            self.stats["depth_limited"] += 1
+            return
+        if self.seen.add(key):
+            self.frontier.push(key, depth)
+
+    def _ingest_sitemaps(self, deadline: float) -> None:
+        sitemaps = (self.robots.site_maps() if self.robots is not None else None) or [f"{self.origin}/sitemap.xml"]
+        batch: List[Tuple[str, Optional[datetime]]] = []
+
+        def flush() -> None:
+            marks = ", ".join("?" for _ in batch)
+            known = {
+                row["url_key"]: _timestamp(row["last_seen_at"])
+                for row in fetch_all(
+                    f"""
+                    SELECT url_key, last_seen_at FROM crawl_pages
+                    WHERE job_id = ? AND content_hash IS NOT NULL AND url_key IN ({marks})
+                    """,
+                    (self.job["id"], *(key for key, _ in batch)),
+                )
+            }
+            fresh = []
+            for key, lastmod in batch:
+                visited = known.get(key)
+                if lastmod is not None and visited is not None and lastmod <= visited:
+                    # Unchanged since our last visit by the site's own account.
+                    fresh.append(key)
+                    self.seen.add(key)
+                else:
+                    self._discover(key, 1)
+            if fresh:
+                # Still listed, so still there: keep them (and their verdicts) from being pruned.
+                marks = ", ".join("?" for _ in fresh)
+                execute(
+                    f"UPDATE crawl_pages SET last_seen_at = ? WHERE job_id = ? AND url_key IN ({marks})",
+                    (utc_now(), self.job["id"], *fresh),
+                )
+            self.stats["sitemap_fresh"] += len(fresh)
+            batch.clear()
+
+        budget = min(SETTINGS.crawl_max_sitemap_urls, self.frontier.limit)
+        for sitemap in sitemaps:
+            if _site(sitemap) != self.site:
+                continue
+            for loc, lastmod in sitemap_entries(self.client, sitemap, budget - self.stats["sitemap_urls"]):
+                key = canonical_url(urljoin(sitemap, loc))
+                self.stats["sitemap_urls"] += 1
+                if key is not None and _site(key) == self.site:
+                    batch.append((key, _timestamp(lastmod)))
+                if len(batch) >= SITEMAP_LOOKUP_CHUNK:
+                    flush()
+                if time.monotonic() >= deadline:
+                    break
+            if batch:
+                flush()
+            if self.stats["sitemap_urls"] >= budget or time.monotonic() >= deadline:
+                break
+
+    def run(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        deadline = started + self.max_seconds
+        delay = 0.0
+        if SETTINGS.crawl_robots:
+            self.robots, self.stats["robots"] = load_robots(self.client, self.origin)
+            delay = min(float(self.robots.crawl_delay(ROBOTS_AGENT) or 0), SETTINGS.crawl_max_delay_seconds)
+        self._discover(self.root, 0)
+        if SETTINGS.crawl_sitemaps:
+            self._ingest_sitemaps(deadline)
+
+        stop = "done"
+        next_start = 0.0
+        concurrency = max(1, SETTINGS.crawl_concurrency)
+        pool = get_crawl_pool()
+        pending: Set[Future] = set()
+        while True:
+            while len(pending) < concurrency and self.frontier:
+                if self.stats["pages"] >= self.max_pages:
+                    stop = "page_budget"
+                    break
+                if time.monotonic() >= deadline:
+                    stop = "time_budget"
+                    break
+                url, depth = self.frontier.pop()
+                if self.robots is not None and not self.robots.can_fetch(ROBOTS_AGENT, url):
+                    self.stats["robots_blocked"] += 1
+                    continue
+                if delay:
+                    time.sleep(max(0.0, next_start - time.monotonic()))
+                    next_start = time.monotonic() + delay
+                self.stats["pages"] += 1
+                pending.add(pool.submit(self._visit, url, depth))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._collect(future.result())
+
+        self.stats.update(
+            stop=stop,
+            queued=len(self.frontier),
+            dropped=self.frontier.dropped,
+            seen=len(self.seen),
+            seen_set=self.seen.kind,
+            analyses=self._analyses,
+            seconds=round(time.monotonic() - started, 2),
+        )
+        return self.stats
+
+    def _collect(self, result: PageResult) -> None:
+        self.stats[result.outcome] += 1
+        if result.error:
+            self.stats["last_error"] = f"{result.url}: {result.error}"
+        if result.change is not None:
+            self.changes.append(result.change)
+        for link in result.links:
+            self._discover(link, result.depth + 1)
+
+    def _reserve_analysis(self) -> bool:
+        with self._analyses_lock:
+            if self._analyses >= self.max_analyses:
+                return False
+            self._analyses += 1
+            return True
+
+    def _analyze(self, url: str, text: List[str], images: List[str], alts: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """The page's verdict, or None when the crawl's LLM budget is spent."""
+        if SETTINGS.prefilter_enabled:
+            result = get_prefilter().scan_page(text, [alt for alt in alts.values() if alt])
+            if result.score >= SETTINGS.prefilter_threshold:
+                text = result.windows
+            elif not images or SETTINGS.prefilter_gate_images:
+                return _SAFE
+        if not self._reserve_analysis():
+            return None
+        return analyze_content(url, text, images, None, alts)
+
+    def _upsert(self, key: str, depth: int, seen: bool = True, **columns: Any) -> None:
+        """``seen=False`` records the page without vouching for its stored
+        hashes: ``last_seen_at`` is what sitemap ``lastmod`` is compared with."""
+        now = utc_now()
+        columns["last_seen_at"] = now
+        names = ", ".join(columns)
+        marks = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in columns if seen or name != "last_seen_at")
+        execute(
+            f"""
+            INSERT INTO crawl_pages (job_id, url_key, url, depth, first_seen_at, {names})
+            VALUES (?, ?, ?, ?, ?, {marks})
+            ON CONFLICT(job_id, url_key) DO UPDATE SET depth = MIN(depth, excluded.depth){", " + updates if updates else ""}
+            """,
+            (self.job["id"], key, key, depth, now, *columns.values()),
+        )
+
+    def _visit(self, url: str, depth: int) -> PageResult:
+        result = PageResult(url, depth)
+        try:
+            row = fetch_one(
+                "SELECT body_hash, content_hash FROM crawl_pages WHERE job_id = ? AND url_key = ?",
+                (self.job["id"], url),
+            )
+            # No conditional request: even an unchanged page's links are needed to keep crawling.
+            response = self.client.get(url, headers=DEFAULT_HEADERS)
+            if response.status_code in (404, 410):
+                if row is not None:
+                    execute("DELETE FROM crawl_pages WHERE job_id = ? AND url_key = ?", (self.job["id"], url))
+                    result.change = (url, "gone")
+                result.outcome = "gone"
+                return result
+            response.raise_for_status()
+            final = str(response.url)
+            if _site(final) != self.site or "html" not in response.headers.get("content-type", "html"):
+                result.outcome = "skipped"
+                return result
+            body_hash = hashlib.sha256(response.content).hexdigest()
+            html = response.text
+            if row is not None and row["body_hash"] == body_hash:
+                result.links = page_links(html, final, SETTINGS.parse_backend)
+                self._upsert(url, depth)
+                return result
+
+            data = parse_html(html, final, links=True)
+            result.links = data.get("links") or []
+            text = data.get("text") or []
+            alts = {image["src"]: image.get("alt") or "" for image in data.get("images") or []}
+            images = list(alts)
+            # Crawled pages have no block diff, so volatile fragments are left out here.
+            digest = content_hash(text, images, normalize=True)
+            if row is not None and row["content_hash"] == digest:
+                self._upsert(url, depth, body_hash=body_hash)
+                return result
+
+            verdict = self._analyze(final, text, images, alts)
+            if verdict is None:
+                # Leave the hashes and last_seen_at alone so the next crawl,
+                # sitemap lastmod included, sees the change again.
+                self._upsert(url, depth, seen=False)
+                result.outcome = "deferred"
+                return result
+            now = utc_now()
+            self._upsert(
+                url,
+                depth,
+                body_hash=body_hash,
+                content_hash=digest,
+                risk_level=verdict.get("risk_level", "none"),
+                flags=insert_json(verdict.get("flags") or []),
+                evidence=insert_json(verdict.get("evidence") or []),
+                summary=verdict.get("summary"),
+                last_changed_at=now,
+                last_analyzed_at=now,
+            )
+            result.outcome = "changed"
+            result.change = (url, digest)
+        except Exception as exc:
+            result.outcome = "errors"
+            result.error = str(exc)
+        return result
+
+
+def crawl_site(job: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Tuple[str, str]]]:
+    """Crawl the job's site; returns the crawl stats and the (url, content hash) of pages that changed."""
+    crawler = Crawler(job)
+    stats = crawler.run()
+    return stats, crawler.changes
+
+
+def site_verdict(job: Dict[str, Any]) -> Dict[str, Any]:
+    """One verdict for the whole site from the stored page verdicts: the worst
+    risk level, every flag, and evidence prefixed with the page it came from."""
+    total = fetch_one("SELECT COUNT(*) FROM crawl_pages WHERE job_id = ?", (job["id"],))[0]
+    marks = ", ".join("?" for _ in RISKY_LEVELS)
+    flagged = fetch_one(
+        f"SELECT COUNT(*) FROM crawl_pages WHERE job_id = ? AND risk_level IN ({marks})", (job["id"], *RISKY_LEVELS)
+    )[0]
+    rows = fetch_all(
+        f"""
+        SELECT url, risk_level, flags, evidence FROM crawl_pages
+        WHERE job_id = ? AND risk_level IN ({marks})
+        ORDER BY risk_level = 'high' DESC, url
+        LIMIT ?
+        """,
+        (job["id"], *RISKY_LEVELS, MAX_FLAGGED_PAGES),
+    )
+    flags = sorted({flag for row in rows for flag in parse_json(row["flags"]) or []})
+    evidence = [f"{row['url']}: {item}" for row in rows for item in (parse_json(row["evidence"]) or [])[:2]]
+    if rows:
+        risk_level = "high" if rows[0]["risk_level"] == "high" else "low"
+        summary = f"{flagged} of {total} crawled pages flagged."
+    else:
+        risk_level = "none"
+        summary = f"No risky content on {total} crawled pages."
+    return {
+        "site_context": f"Crawl of {_site(job['url'])}",
+        "risk_level": risk_level,
+        "flags": flags,
+        "evidence": evidence[:MAX_FLAGGED_PAGES],
+        "summary": summary,
+    }
+
+
+def prune_pages(days: Optional[int] = None) -> int:
+    """Forget pages no crawl has reached in ``days`` (CRAWL_PAGE_TTL_DAYS), so
+    a page that dropped out of the site stops counting towards its verdict."""
+    days = SETTINGS.crawl_page_ttl_days if days is None else days
+    cutoff = datetime.fromtimestamp(time.time() - days * 86400, timezone.utc).isoformat()
+    return execute("DELETE FROM crawl_pages WHERE last_seen_at < ?", (cutoff,))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Crawl a crawl-mode job's site once and print the crawl stats.")
+    parser.add_argument("job_id")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    init_db()
+    job = fetch_one("SELECT * FROM jobs WHERE id = ?", (args.job_id,))
+    if job is None:
+        raise SystemExit(f"Job {args.job_id} not found")
+    stats, changes = crawl_site(dict(job))
+    print(json.dumps({**stats, "changed_pages": [url for url, _ in changes]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
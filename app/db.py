@@ -1,85 +1,541 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import sqlite3
 import threading
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from app.config import SETTINGS
+from app.utils import url_key, utc_now
 
-_DB_LOCK = threading.Lock()
+# One persistent connection per thread. WAL lets readers run alongside the
+# single writer, so there is no process-wide lock; writers queue on SQLite's
+# own lock via busy_timeout.
+_LOCAL = threading.local()
+_CONNECTIONS: List[sqlite3.Connection] = []
+_CONNECTIONS_LOCK = threading.Lock()
+_GENERATION = 0
 
 
 def _ensure_parent(path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
 
 
-def init_db() -> None:
-    _ensure_parent(SETTINGS.db_path)
-    with _connect() as conn:
-        conn.executescript(
+def _script(conn: sqlite3.Connection, sql: str) -> None:
+    # executescript() would COMMIT the migration's transaction, so run statements one by one.
+    for statement in sql.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def _migrate_baseline(conn: sqlite3.Connection) -> None:
+    """Schema as it stood before versioned migrations; idempotent on older databases."""
+    _script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            interval_seconds INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            webhook_url TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS runs (
+            id TEXT PRIMARY KEY,
+            job_id TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            status TEXT NOT NULL,
+            site_context TEXT,
+            risk_level TEXT,
+            flags TEXT,
+            evidence TEXT,
+            raw_hash TEXT,
+            risk_at TEXT,
+            summary TEXT,
+            error TEXT,
+            FOREIGN KEY(job_id) REFERENCES jobs(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS job_state (
+            job_id TEXT PRIMARY KEY,
+            last_hash TEXT,
+            last_site_context TEXT,
+            last_risk_level TEXT,
+            last_flags TEXT,
+            last_evidence TEXT,
+            last_risk_at TEXT,
+            last_summary TEXT,
+            last_notified_at TEXT,
+            FOREIGN KEY(job_id) REFERENCES jobs(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS image_blobs (
+            content_hash TEXT PRIMARY KEY,
+            media_type TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            phash TEXT,
+            phash_b0 INTEGER,
+            phash_b1 INTEGER,
+            phash_b2 INTEGER,
+            phash_b3 INTEGER,
+            classified_risk TEXT,
+            classified_at TEXT,
+            last_access REAL NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS image_cache (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at TEXT NOT NULL,
+            FOREIGN KEY(content_hash) REFERENCES image_blobs(content_hash)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_image_blobs_access ON image_blobs(last_access);
+        CREATE INDEX IF NOT EXISTS idx_image_blobs_b0 ON image_blobs(phash_b0);
+        CREATE INDEX IF NOT EXISTS idx_image_blobs_b1 ON image_blobs(phash_b1);
+        CREATE INDEX IF NOT EXISTS idx_image_blobs_b2 ON image_blobs(phash_b2);
+        CREATE INDEX IF NOT EXISTS idx_image_blobs_b3 ON image_blobs(phash_b3);
+        CREATE INDEX IF NOT EXISTS idx_image_cache_hash ON image_cache(content_hash);
+
+        CREATE TABLE IF NOT EXISTS llm_batch_requests (
+            run_id TEXT PRIMARY KEY,
+            job_id TEXT NOT NULL,
+            params TEXT NOT NULL,
+            context TEXT NOT NULL,
+            state TEXT NOT NULL,
+            batch_id TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            submitted_at TEXT,
+            finished_at TEXT,
+            FOREIGN KEY(run_id) REFERENCES runs(id)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_llm_batch_state ON llm_batch_requests(state, batch_id);
+        """
+    )
+    _ensure_column(conn, "runs", "risk_at", "TEXT")
+    _ensure_column(conn, "runs", "site_context", "TEXT")
+    _ensure_column(conn, "runs", "summary", "TEXT")
+    _ensure_column(conn, "job_state", "last_risk_level", "TEXT")
+    _ensure_column(conn, "job_state", "last_flags", "TEXT")
+    _ensure_column(conn, "job_state", "last_evidence", "TEXT")
+    _ensure_column(conn, "job_state", "last_risk_at", "TEXT")
+    _ensure_column(conn, "job_state", "last_site_context", "TEXT")
+    _ensure_column(conn, "job_state", "last_summary", "TEXT")
+    _ensure_column(conn, "job_state", "last_etag", "TEXT")
+    _ensure_column(conn, "job_state", "last_modified", "TEXT")
+    _ensure_column(conn, "job_state", "last_body_hash", "TEXT")
+    _ensure_column(conn, "job_state", "last_blocks", "TEXT")
+    _ensure_column(conn, "job_state", "last_images", "TEXT")
+    _ensure_column(conn, "runs", "analysis_mode", "TEXT")
+    _ensure_column(conn, "jobs", "llm_mode", "TEXT NOT NULL DEFAULT 'realtime'")
+
+
+def _migrate_run_indexes(conn: sqlite3.Connection) -> None:
+    _script(
+        conn,
+        """
+        CREATE INDEX IF NOT EXISTS idx_runs_job_started ON runs(job_id, started_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_runs_job_status_finished ON runs(job_id, status, finished_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at);
+        """,
+    )
+
+
+def verdict_fingerprint(
+    site_context: Any, risk_level: Any, flags: Optional[str], evidence: Optional[str], summary: Any
+) -> str:
+    payload = json.dumps([site_context, risk_level, flags, evidence, summary], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _migrate_verdicts(conn: sqlite3.Connection) -> None:
+    """Move verdict payloads out of ``runs`` into a deduplicated ``verdicts`` table.
+
+    Unchanged runs repeat the previous verdict verbatim, so most runs end up
+    sharing a handful of rows. ``runs`` keeps ``risk_level`` for filtering;
+    read full runs through the ``run_details`` view.
+    """
+    _script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS verdicts (
+            id INTEGER PRIMARY KEY,
+            fingerprint TEXT NOT NULL UNIQUE,
+            site_context TEXT,
+            risk_level TEXT,
+            flags TEXT,
+            evidence TEXT,
+            summary TEXT,
+            created_at TEXT NOT NULL
+        )
+        """,
+    )
+    _ensure_column(conn, "runs", "verdict_id", "INTEGER REFERENCES verdicts(id)")
+    now = utc_now()
+    groups = conn.execute(
+        """
+        SELECT DISTINCT site_context, risk_level, flags, evidence, summary FROM runs
+        WHERE verdict_id IS NULL AND status = 'success'
+        """
+    ).fetchall()
+    for group in groups:
+        values = tuple(group)
+        fingerprint = verdict_fingerprint(*values)
+        conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS jobs (
-                id TEXT PRIMARY KEY,
-                url TEXT NOT NULL,
-                interval_seconds INTEGER NOT NULL,
-                mode TEXT NOT NULL,
-                webhook_url TEXT NOT NULL,
-                status TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            );
-
-            CREATE TABLE IF NOT EXISTS runs (
-                id TEXT PRIMARY KEY,
-                job_id TEXT NOT NULL,
-                started_at TEXT NOT NULL,
-                finished_at TEXT,
-                status TEXT NOT NULL,
-                site_context TEXT,
-                risk_level TEXT,
-                flags TEXT,
-                evidence TEXT,
-                raw_hash TEXT,
-                risk_at TEXT,
-                summary TEXT,
-                error TEXT,
-                FOREIGN KEY(job_id) REFERENCES jobs(id)
-            );
-
-            CREATE TABLE IF NOT EXISTS job_state (
-                job_id TEXT PRIMARY KEY,
-                last_hash TEXT,
-                last_site_context TEXT,
-                last_risk_level TEXT,
-                last_flags TEXT,
-                last_evidence TEXT,
-                last_risk_at TEXT,
-                last_summary TEXT,
-                last_notified_at TEXT,
-                FOREIGN KEY(job_id) REFERENCES jobs(id)
-            );
+            INSERT OR IGNORE INTO verdicts (fingerprint, site_context, risk_level, flags, evidence, summary, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (fingerprint, *values, now),
+        )
+        verdict_id = conn.execute(
+            "SELECT id FROM verdicts WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()[0]
+        conn.execute(
             """
+            UPDATE runs
+            SET verdict_id = ?, site_context = NULL, flags = NULL, evidence = NULL, summary = NULL
+            WHERE verdict_id IS NULL AND status = 'success'
+              AND site_context IS ? AND risk_level IS ? AND flags IS ? AND evidence IS ? AND summary IS ?
+            """,
+            (verdict_id, *values),
         )
-        _ensure_column(conn, "runs", "risk_at", "TEXT")
-        _ensure_column(conn, "runs", "site_context", "TEXT")
-        _ensure_column(conn, "runs", "summary", "TEXT")
-        _ensure_column(conn, "job_state", "last_risk_level", "TEXT")
-        _ensure_column(conn, "job_state", "last_flags", "TEXT")
-        _ensure_column(conn, "job_state", "last_evidence", "TEXT")
-        _ensure_column(conn, "job_state", "last_risk_at", "TEXT")
-        _ensure_column(conn, "job_state", "last_site_context", "TEXT")
-        _ensure_column(conn, "job_state", "last_summary", "TEXT")
+    _script(
+        conn,
+        """
+        CREATE VIEW IF NOT EXISTS run_details AS
+        SELECT
+            r.id, r.job_id, r.started_at, r.finished_at, r.status, r.raw_hash, r.risk_at,
+            r.error, r.analysis_mode, r.verdict_id,
+            COALESCE(v.site_context, r.site_context) AS site_context,
+            COALESCE(v.risk_level, r.risk_level) AS risk_level,
+            COALESCE(v.flags, r.flags) AS flags,
+            COALESCE(v.evidence, r.evidence) AS evidence,
+            COALESCE(v.summary, r.summary) AS summary
+        FROM runs r LEFT JOIN verdicts v ON v.id = r.verdict_id
+        """,
+    )
+
+
+def _migrate_retention(conn: sqlite3.Connection) -> None:
+    _script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS run_daily (
+            job_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            success INTEGER NOT NULL,
+            failed INTEGER NOT NULL,
+            risk_none INTEGER NOT NULL,
+            risk_low INTEGER NOT NULL,
+            risk_high INTEGER NOT NULL,
+            latency_p50_ms INTEGER,
+            latency_p95_ms INTEGER,
+            latency_max_ms INTEGER,
+            PRIMARY KEY (job_id, day)
+        );
+
+        CREATE TABLE IF NOT EXISTS archive_segments (
+            id INTEGER PRIMARY KEY,
+            day TEXT NOT NULL,
+            path TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_archive_segments_day ON archive_segments(day);
+        CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started_at);
+        """,
+    )
+
+
+def _migrate_events(conn: sqlite3.Connection) -> None:
+    _script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            job_id TEXT,
+            payload TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_events_created ON events(created_at);
+        """,
+    )
+
+
+def _migrate_leases(conn: sqlite3.Connection) -> None:
+    for column in ("next_run_at", "lease_owner", "lease_expires_at"):
+        _ensure_column(conn, "jobs", column, "TEXT")
+    _script(
+        conn,
+        """
+        CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, next_run_at);
+
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at TEXT NOT NULL
+        );
+        """,
+    )
+    conn.execute(
+        "UPDATE jobs SET next_run_at = ? WHERE status = 'active' AND next_run_at IS NULL",
+        (utc_now(),),
+    )
+
+
+def _migrate_adaptive(conn: sqlite3.Connection) -> None:
+    _ensure_column(conn, "jobs", "adaptive", "INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(conn, "jobs", "min_interval_seconds", "INTEGER")
+    _ensure_column(conn, "jobs", "max_interval_seconds", "INTEGER")
+    _ensure_column(conn, "jobs", "current_interval_seconds", "INTEGER")
+    _ensure_column(conn, "job_state", "change_rate", "REAL")
+    _ensure_column(conn, "job_state", "last_change_at", "TEXT")
+
+
+def _migrate_url_keys(conn: sqlite3.Connection) -> None:
+    _ensure_column(conn, "jobs", "url_key", "TEXT")
+    rows = conn.execute("SELECT id, url FROM jobs").fetchall()
+    conn.executemany("UPDATE jobs SET url_key = ? WHERE id = ?", [(url_key(row[1]), row[0]) for row in rows])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_url_key ON jobs(url_key)")
+
+
+def _migrate_outbox(conn: sqlite3.Connection) -> None:
+    _script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS webhook_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            webhook_url TEXT NOT NULL,
+            job_id TEXT,
+            run_id TEXT,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TEXT NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            delivered_at TEXT
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_outbox_due ON webhook_outbox(status, next_attempt_at);
+        CREATE INDEX IF NOT EXISTS idx_outbox_created ON webhook_outbox(created_at);
+        """,
+    )
+
+
+def _migrate_alerts(conn: sqlite3.Connection) -> None:
+    _ensure_column(conn, "job_state", "alert_fingerprint", "TEXT")
+    _script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            risk_level TEXT NOT NULL,
+            flags TEXT,
+            evidence TEXT,
+            state TEXT NOT NULL,
+            notified_state TEXT,
+            opened_at TEXT NOT NULL,
+            last_seen_at TEXT NOT NULL,
+            last_notified_at TEXT,
+            resolved_at TEXT,
+            notify_count INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_job_fingerprint ON alerts(job_id, fingerprint);
+        CREATE INDEX IF NOT EXISTS idx_alerts_seen ON alerts(last_seen_at);
+        """,
+    )
+
+
+def _migrate_routes(conn: sqlite3.Connection) -> None:
+    for column, col_type in (
+        ("scrape_path", "TEXT"),
+        ("route_reason", "TEXT"),
+        ("static_ms", "INTEGER"),
+        ("browser_ms", "INTEGER"),
+    ):
+        _ensure_column(conn, "runs", column, col_type)
+    _script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS scrape_routes (
+            key TEXT PRIMARY KEY,
+            path TEXT,
+            shell_fingerprint TEXT,
+            static_count INTEGER NOT NULL DEFAULT 0,
+            browser_count INTEGER NOT NULL DEFAULT 0,
+            runs_since_probe INTEGER NOT NULL DEFAULT 0,
+            probed_at TEXT,
+            updated_at TEXT NOT NULL
+        );
+        """,
+    )
+
+
+def _migrate_run_details_routes(conn: sqlite3.Connection) -> None:
+    _script(
+        conn,
+        """
+        DROP VIEW IF EXISTS run_details;
+
+        CREATE VIEW run_details AS
+        SELECT
+            r.id, r.job_id, r.started_at, r.finished_at, r.status, r.raw_hash, r.risk_at,
+            r.error, r.analysis_mode, r.verdict_id,
+            r.scrape_path, r.route_reason, r.static_ms, r.browser_ms,
+            COALESCE(v.site_context, r.site_context) AS site_context,
+            COALESCE(v.risk_level, r.risk_level) AS risk_level,
+            COALESCE(v.flags, r.flags) AS flags,
+            COALESCE(v.evidence, r.evidence) AS evidence,
+            COALESCE(v.summary, r.summary) AS summary
+        FROM runs r LEFT JOIN verdicts v ON v.id = r.verdict_id
+        """,
+    )
+
+
+def _migrate_crawl(conn: sqlite3.Connection) -> None:
+    _ensure_column(conn, "jobs", "crawl_max_pages", "INTEGER")
+    _ensure_column(conn, "jobs", "crawl_max_seconds", "INTEGER")
+    _ensure_column(conn, "runs", "crawl", "TEXT")
+    _script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS crawl_pages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            url_key TEXT NOT NULL,
+            url TEXT NOT NULL,
+            depth INTEGER NOT NULL,
+            body_hash TEXT,
+            content_hash TEXT,
+            risk_level TEXT,
+            flags TEXT,
+            evidence TEXT,
+            summary TEXT,
+            first_seen_at TEXT NOT NULL,
+            last_seen_at TEXT NOT NULL,
+            last_changed_at TEXT,
+            last_analyzed_at TEXT
+        );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_crawl_pages_job_key ON crawl_pages(job_id, url_key);
+        CREATE INDEX IF NOT EXISTS idx_crawl_pages_job_risk ON crawl_pages(job_id, risk_level);
+        CREATE INDEX IF NOT EXISTS idx_crawl_pages_seen ON crawl_pages(last_seen_at);
+
+        DROP VIEW IF EXISTS run_details;
+
+        CREATE VIEW run_details AS
+        SELECT
+            r.id, r.job_id, r.started_at, r.finished_at, r.status, r.raw_hash, r.risk_at,
+            r.error, r.analysis_mode, r.verdict_id,
+            r.scrape_path, r.route_reason, r.static_ms, r.browser_ms, r.crawl,
+            COALESCE(v.site_context, r.site_context) AS site_context,
+            COALESCE(v.risk_level, r.risk_level) AS risk_level,
+            COALESCE(v.flags, r.flags) AS flags,
+            COALESCE(v.evidence, r.evidence) AS evidence,
+            COALESCE(v.summary, r.summary) AS summary
+        FROM runs r LEFT JOIN verdicts v ON v.id = r.verdict_id
+        """,
+    )
+
+
+# Append only; each entry runs once, in its own transaction, and bumps PRAGMA user_version.
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _migrate_baseline),
+    (2, _migrate_run_indexes),
+    (3, _migrate_verdicts),
+    (4, _migrate_retention),
+    (5, _migrate_events),
+    (6, _migrate_leases),
+    (7, _migrate_adaptive),
+    (8, _migrate_url_keys),
+    (9, _migrate_outbox),
+    (10, _migrate_alerts),
+    (11, _migrate_routes),
+    (12, _migrate_run_details_routes),
+    (13, _migrate_crawl),
+]
+
+
+def schema_version() -> int:
+    return _connection().execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db() -> None:
+    current = schema_version()
+    for version, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        with transaction() as conn:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
 
 
 def _connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(SETTINGS.db_path, check_same_thread=False)
+    _ensure_parent(SETTINGS.db_path)
+    conn = sqlite3.connect(
+        SETTINGS.db_path,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=256,
+        timeout=SETTINGS.db_busy_timeout_ms / 1000,
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SETTINGS.db_synchronous}")
+    conn.execute(f"PRAGMA cache_size=-{int(SETTINGS.db_cache_kib)}")
+    conn.execute(f"PRAGMA mmap_size={int(SETTINGS.db_mmap_bytes)}")
+    conn.execute(f"PRAGMA busy_timeout={int(SETTINGS.db_busy_timeout_ms)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
 
+def _connection() -> sqlite3.Connection:
+    conn = getattr(_LOCAL, "conn", None)
+    if conn is None or getattr(_LOCAL, "generation", -1) != _GENERATION:
+        conn = _connect()
+        _LOCAL.conn = conn
+        _LOCAL.generation = _GENERATION
+        _LOCAL.depth = 0
+        with _CONNECTIONS_LOCK:
+            _CONNECTIONS.append(conn)
+    return conn
+
+
+def close_connections() -> None:
+    global _GENERATION
+    with _CONNECTIONS_LOCK:
+        connections = list(_CONNECTIONS)
+        _CONNECTIONS.clear()
+        _GENERATION += 1
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
 def _ensure_column(conn: sqlite3.Connection, table: str, column: str, col_type: str) -> None:
     cur = conn.execute(f"PRAGMA table_info({table})")
     columns = {row[1] for row in cur.fetchall()}
@@ -88,31 +544,63 @@ def _ensure_column(conn: sqlite3.Connection, table: str, column: str, col_type:
 
 
 @contextmanager
-def db_cursor() -> Iterable[sqlite3.Cursor]:
-    with _DB_LOCK:
-        conn = _connect()
+def transaction() -> Iterator[sqlite3.Connection]:
+    """Group writes into one commit. Nested blocks join the outer transaction.
+
+    BEGIN IMMEDIATE takes the write lock up front so two writers never both
+    hold read snapshots and then deadlock upgrading them.
+    """
+    conn = _connection()
+    if _LOCAL.depth:
+        _LOCAL.depth += 1
         try:
-            yield conn.cursor()
-            conn.commit()
+            yield conn
         finally:
-            conn.close()
+            _LOCAL.depth -= 1
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    _LOCAL.depth = 1
+    _LOCAL.after_commit = []
+    try:
+        yield conn
+    except BaseException:
+        _LOCAL.depth = 0
+        _LOCAL.after_commit = []
+        conn.execute("ROLLBACK")
+        raise
+    _LOCAL.depth = 0
+    conn.execute("COMMIT")
+    callbacks, _LOCAL.after_commit = _LOCAL.after_commit, []
+    for callback in callbacks:
+        callback()
+
+
+def on_commit(callback: Callable[[], None]) -> None:
+    """Run ``callback`` once the current transaction commits (now, if there is none)."""
+    _connection()
+    if _LOCAL.depth:
+        _LOCAL.after_commit.append(callback)
+    else:
+        callback()
+
+
+@contextmanager
+def db_cursor() -> Iterator[sqlite3.Cursor]:
+    with transaction() as conn:
+        yield conn.cursor()
 
 
 def fetch_one(query: str, params: tuple = ()) -> Optional[sqlite3.Row]:
-    with db_cursor() as cur:
-        cur.execute(query, params)
-        return cur.fetchone()
+    return _connection().execute(query, params).fetchone()
 
 
 def fetch_all(query: str, params: tuple = ()) -> list[sqlite3.Row]:
-    with db_cursor() as cur:
-        cur.execute(query, params)
-        return cur.fetchall()
+    return _connection().execute(query, params).fetchall()
 
 
-def execute(query: str, params: tuple = ()) -> None:
-    with db_cursor() as cur:
-        cur.execute(query, params)
+def execute(query: str, params: tuple = ()) -> int:
+    """Run one statement; autocommits unless inside ``transaction()``. Returns rowcount."""
+    return _connection().execute(query, params).rowcount
 
 
 def insert_json(value: Any) -> Optional[str]:
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from app.config import SETTINGS
+from app.utils import block_hash
+
+RISKY_LEVELS = ("low", "high")
+
+
+@dataclass
+class BlockDiff:
+    added: List[str] = field(default_factory=list)
+    removed: int = 0
+    total: int = 0
+    new_images: List[str] = field(default_factory=list)
+    removed_images: int = 0
+
+    @property
+    def has_additions(self) -> bool:
+        return bool(self.added or self.new_images)
+
+    @property
+    def has_removals(self) -> bool:
+        return bool(self.removed or self.removed_images)
+
+
+def diff_blocks(
+    previous_blocks: Optional[List[str]],
+    previous_images: Optional[List[str]],
+    text_lines: List[str],
+    image_urls: List[str],
+) -> Optional[BlockDiff]:
+    """Compare the current page against the previous run's block hashes.
+
+    Returns None when there is no usable snapshot to diff against.
+    """
+    if previous_blocks is None or previous_images is None:
+        return None
+    remaining = {}
+    for digest in previous_blocks:
+        remaining[digest] = remaining.get(digest, 0) + 1
+
+    diff = BlockDiff(total=len(text_lines))
+    for line in text_lines:
+        digest = block_hash(line)
+        if remaining.get(digest):
+            remaining[digest] -= 1
+        else:
+            diff.added.append(line)
+    diff.removed = sum(remaining.values())
+
+    known_images = set(previous_images)
+    current_images = set(image_urls)
+    diff.new_images = [url for url in dict.fromkeys(image_urls) if url not in known_images]
+    diff.removed_images = len(known_images - current_images)
+    return diff
+
+
+def decide(diff: Optional[BlockDiff], previous_risk_level: Optional[str]) -> str:
+    """Return "reuse", "incremental" or "full" for the given diff."""
+    if diff is None or not previous_risk_level:
+        return "full"
+    if not diff.has_additions:
+        # Only volatile/ordering changes or pure removals. Removing content can't
+        # introduce risk, but it can clear a risky verdict, so re-check those.
+        if diff.has_removals and previous_risk_level in RISKY_LEVELS:
+            return "full"
+        return "reuse"
+    if diff.total and len(diff.added) / diff.total > SETTINGS.incremental_max_added_ratio:
+        return "full"
+    return "incremental"
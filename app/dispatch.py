@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from app.config import SETTINGS
+from app.db import fetch_one
+from app.pipeline import get_pipeline
+from app.runner import run_job
+
+
+@dataclass
+class _Item:
+    job_id: str
+    host: str
+    due: float
+    on_done: Optional[Callable[[], None]] = None
+    queued: float = field(default_factory=time.time)
+
+
+def job_host(job_id: str) -> str:
+    row = fetch_one("SELECT url FROM jobs WHERE id = ?", (job_id,))
+    return (urlsplit(row["url"]).hostname or "") if row else ""
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(pct * len(ordered)))], 3)
+
+
+class Dispatcher:
+    """Starts due jobs at a steady pace instead of all at once.
+
+    Jobs wait in one queue per host and are started round-robin across hosts,
+    so a host with hundreds of jobs cannot crowd out the rest. Each host gets
+    at most HOST_MAX_CONCURRENCY running jobs and one start per
+    HOST_MIN_INTERVAL_SECONDS; SCHEDULER_CAPACITY caps running jobs overall.
+    """
+
+    def __init__(self, capacity: int, host_concurrency: int, host_interval: float) -> None:
+        self.capacity = max(1, capacity)
+        self.host_concurrency = max(1, host_concurrency)
+        self.host_interval = max(0.0, host_interval)
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[_Item]] = {}
+        self._hosts: Deque[str] = deque()
+        self._running: Dict[str, int] = defaultdict(int)
+        self._next_start: Dict[str, float] = {}
+        self._pending: Set[str] = set()
+        self._lags: Deque[float] = deque(maxlen=1000)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.started = 0
+        self.skipped = 0
+
+    def submit(
+        self,
+        job_id: str,
+        due: Optional[float] = None,
+        on_done: Optional[Callable[[], None]] = None,
+        host: Optional[str] = None,
+    ) -> bool:
+        """Queue a job; False if it is already queued or running here (the run is coalesced)."""
+        host = job_host(job_id) if host is None else host
+        with self._cond:
+            if self._stopped or job_id in self._pending:
+                self.skipped += 1
+                return False
+            self._pending.add(job_id)
+            if host not in self._queues:
+                self._queues[host] = deque()
+                self._hosts.append(host)
+            self._queues[host].append(_Item(job_id, host, time.time() if due is None else due, on_done))
+            self._ensure_thread()
+            self._cond.notify()
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            if SETTINGS.execution_engine != "async":
+                self._executor = ThreadPoolExecutor(self.capacity, thread_name_prefix="job")
+            self._thread = threading.Thread(target=self._pump, name="dispatcher", daemon=True)
+            self._thread.start()
+
+    def _take(self) -> Tuple[Optional[_Item], Optional[float]]:
+        """Next startable item, or None and how long until a rate-limited host frees up."""
+        if sum(self._running.values()) >= self.capacity:
+            return None, None
+        now = time.monotonic()
+        wait: Optional[float] = None
+        for _ in range(len(self._hosts)):
+            host = self._hosts[0]
+            self._hosts.rotate(-1)
+            if self._running.get(host, 0) >= self.host_concurrency:
+                continue
+            ready_at = self._next_start.get(host, 0.0)
+            if ready_at > now:
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                continue
+            queue = self._queues[host]
+            item = queue.popleft()
+            if not queue:
+                del self._queues[host]
+                self._hosts.remove(host)
+            self._running[host] += 1
+            self._next_start[host] = now + self.host_interval
+            return item, None
+        return None, wait
+
+    def _pump(self) -> None:
+        while True:
+            with self._cond:
+                item, wait = self._take()
+                while item is None:
+                    if self._stopped:
+                        return
+                    self._cond.wait(wait)
+                    item, wait = self._take()
+            self._lags.append(max(0.0, time.time() - item.due))
+            self.started += 1
+            self._start(item)
+
+    def _start(self, item: _Item) -> None:
+        try:
+            if self._executor is not None:
+                future: Optional[Future] = self._executor.submit(run_job, item.job_id)
+            else:
+                future = get_pipeline().submit(item.job_id)
+        except Exception:
+            future = None
+        if future is None:
+            self._finish(item)
+        else:
+            future.add_done_callback(lambda _: self._finish(item))
+
+    def _finish(self, item: _Item) -> None:
+        with self._cond:
+            self._running[item.host] -= 1
+            if not self._running[item.host]:
+                del self._running[item.host]
+            self._pending.discard(item.job_id)
+            self._cond.notify()
+        if item.on_done is not None:
+            item.on_done()
+
+    def shutdown(self) -> List[str]:
+        """Stop starting jobs; returns the ids of queued jobs that never started.
+        Running jobs finish (and call their ``on_done``) as usual."""
+        with self._cond:
+            self._stopped = True
+            unstarted = [item.job_id for queue in self._queues.values() for item in queue]
+            self._queues.clear()
+            self._hosts.clear()
+            self._pending.difference_update(unstarted)
+            self._cond.notify_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        return unstarted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            depth = {host: len(queue) for host, queue in self._queues.items()}
+            running = dict(self._running)
+            lags = list(self._lags)
+            oldest = min((queue[0].queued for queue in self._queues.values()), default=None)
+        busiest = sorted(depth.items(), key=lambda item: -item[1])[:10]
+        return {
+            "capacity": self.capacity,
+            "queued": sum(depth.values()),
+            "running": sum(running.values()),
+            "hosts_waiting": len(depth),
+            "oldest_wait_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "started": self.started,
+            "coalesced": self.skipped,
+            "lag_seconds": {
+                "p50": _percentile(lags, 0.5),
+                "p95": _percentile(lags, 0.95),
+                "max": round(max(lags), 3) if lags else 0.0,
+            },
+            "busiest_hosts": [{"host": host, "queued": count, "running": running.get(host, 0)} for host, count in busiest],
+        }
+
+
+_DISPATCHER: Optional[Dispatcher] = None
+_DISPATCHER_LOCK = threading.Lock()
+
+
+def get_dispatcher() -> Dispatcher:
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        if _DISPATCHER is None:
+            _DISPATCHER = Dispatcher(
+                capacity=SETTINGS.scheduler_capacity,
+                host_concurrency=SETTINGS.host_max_concurrency,
+                host_interval=SETTINGS.host_min_interval_seconds,
+            )
+        return _DISPATCHER
+
+
+def shutdown_dispatcher() -> List[str]:
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        dispatcher, _DISPATCHER = _DISPATCHER, None
+    return dispatcher.shutdown() if dispatcher is not None else []
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from app.config import SETTINGS
+from app.db import execute, fetch_all, fetch_one, on_commit
+from app.listing import JOB_FIELDS, LATEST_RUN_FIELDS, row_json
+from app.utils import utc_now
+
+BACKFILL_CHUNK = 500
+
+
+def _publish(event_type: str, job_id: Optional[str], payload: str) -> None:
+    """Append an event; joins the caller's transaction so it commits with the change."""
+    execute(
+        "INSERT INTO events (type, job_id, payload, created_at) VALUES (?, ?, ?, ?)",
+        (event_type, job_id, payload, utc_now()),
+    )
+    on_commit(HUB.wake)
+
+
+def publish_job(job_id: str, event_type: str = "job.updated") -> None:
+    if event_type == "job.deleted":
+        _publish(event_type, job_id, json.dumps({"id": job_id}))
+        return
+    row = fetch_one(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,))
+    if row:
+        _publish(event_type, job_id, row_json(row, JOB_FIELDS))
+
+
+def publish_run(run_id: str, event_type: str = "run.updated") -> None:
+    fields = ("job_id", *LATEST_RUN_FIELDS)
+    row = fetch_one(f"SELECT {', '.join(fields)} FROM run_details WHERE id = ?", (run_id,))
+    if row:
+        _publish(event_type, row["job_id"], row_json(row, fields))
+
+
+def publish_bulk(action: str, count: int) -> None:
+    """One event for a batch change, instead of one per job; clients reload the list."""
+    _publish("jobs.bulk", None, json.dumps({"action": action, "count": count}))
+
+
+def prune_events(hours: Optional[int] = None) -> int:
+    hours = SETTINGS.events_retention_hours if hours is None else hours
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+    return execute("DELETE FROM events WHERE created_at < ?", (cutoff,))
+
+
+def _format(row: Any) -> str:
+    return f"id: {row['id']}\nevent: {row['type']}\ndata: {row['payload']}\n\n"
+
+
+def _events_after(last_id: int, limit: int = BACKFILL_CHUNK) -> List[Any]:
+    return fetch_all(
+        "SELECT id, type, payload FROM events WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)
+    )
+
+
+class EventHub:
+    """Fans new ``events`` rows out to SSE subscribers on the server's event loop.
+
+    One pump reads the table per wake-up, no matter how many browsers are
+    connected. Writers in this process wake it after commit; the periodic poll
+    picks up writes from other processes.
+    """
+
+    def __init__(self, poll_seconds: float = 5.0) -> None:
+        self.poll_seconds = poll_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._pump: Optional[asyncio.Task] = None
+        self._queues: Set[asyncio.Queue] = set()
+        self._lock = threading.Lock()
+        self.last_id = 0
+
+    def wake(self) -> None:
+        with self._lock:
+            loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            while self._queues:
+                rows = await asyncio.to_thread(_events_after, self.last_id)
+                if not rows:
+                    break
+                self.last_id = rows[-1]["id"]
+                for queue in list(self._queues):
+                    queue.put_nowait(rows)
+
+    async def _ensure_pump(self) -> None:
+        if self._pump is not None and not self._pump.done():
+            return
+        head = await asyncio.to_thread(fetch_one, "SELECT COALESCE(MAX(id), 0) FROM events")
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+        self.last_id = head[0]
+        self._pump = asyncio.create_task(self._run())
+
+    async def subscribe(self, last_event_id: Optional[int]) -> AsyncIterator[str]:
+        await self._ensure_pump()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._queues.add(queue)
+        try:
+            sent = self.last_id if last_event_id is None else last_event_id
+            oldest = await asyncio.to_thread(fetch_one, "SELECT MIN(id) FROM events")
+            if last_event_id is not None and oldest[0] is not None and last_event_id < oldest[0] - 1:
+                # Events the client missed were pruned; it has to reload from the API.
+                yield f"id: {self.last_id}\nevent: reset\ndata: {{}}\n\n"
+                sent = self.last_id
+            else:
+                while True:
+                    rows = await asyncio.to_thread(_events_after, sent, BACKFILL_CHUNK)
+                    for row in rows:
+                        yield _format(row)
+                        sent = row["id"]
+                    if len(rows) < BACKFILL_CHUNK:
+                        break
+            yield f"id: {sent}\nevent: ready\ndata: {{}}\n\n"
+            while True:
+                try:
+                    rows = await asyncio.wait_for(queue.get(), timeout=SETTINGS.events_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                for row in rows:
+                    if row["id"] > sent:
+                        yield _format(row)
+                        sent = row["id"]
+        finally:
+            self._queues.discard(queue)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"subscribers": len(self._queues), "last_id": self.last_id}
+
+
+HUB = EventHub(SETTINGS.events_poll_seconds)
@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+import urllib.request
+import weakref
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpcore
+import httpx
+
+from app.config import SETTINGS
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ConnectionStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._requests: Dict[str, int] = defaultdict(int)
+        self._connections: Dict[str, int] = defaultdict(int)
+        self._dns_hits = 0
+        self._dns_misses = 0
+
+    def request(self, host: str) -> None:
+        with self._lock:
+            self._requests[host] += 1
+
+    def connection(self, host: str) -> None:
+        with self._lock:
+            self._connections[host] += 1
+
+    def dns(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._dns_hits += 1
+            else:
+                self._dns_misses += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            hosts = {}
+            for host in set(self._requests) | set(self._connections):
+                requests = self._requests.get(host, 0)
+                connections = self._connections.get(host, 0)
+                hosts[host] = {
+                    "requests": requests,
+                    "connections": connections,
+                    "reused": max(0, requests - connections),
+                }
+            total_requests = sum(self._requests.values())
+            total_connections = sum(self._connections.values())
+            return {
+                "requests": total_requests,
+                "connections": total_connections,
+                "reuse_ratio": (
+                    round(1 - total_connections / total_requests, 4) if total_requests else 0.0
+                ),
+                "dns_cache": {"hits": self._dns_hits, "misses": self._dns_misses},
+                "hosts": hosts,
+            }
+
+
+STATS = ConnectionStats()
+
+
+class DnsCache:
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, int], Tuple[float, str]] = {}
+
+    @staticmethod
+    def _is_ip(host: str) -> bool:
+        try:
+            ipaddress.ip_address(host)
+            return True
+        except ValueError:
+            return False
+
+    def _cached(self, host: str, port: int) -> Optional[str]:
+        if self.ttl_seconds <= 0 or self._is_ip(host):
+            return host
+        with self._lock:
+            entry = self._entries.get((host, port))
+        if entry and entry[0] > time.monotonic():
+            STATS.dns(hit=True)
+            return entry[1]
+        return None
+
+    def _store(self, host: str, port: int, infos: list) -> str:
+        STATS.dns(hit=False)
+        address = infos[0][4][0]
+        with self._lock:
+            self._entries[(host, port)] = (time.monotonic() + self.ttl_seconds, address)
+        return address
+
+    def resolve(self, host: str, port: int) -> str:
+        cached = self._cached(host, port)
+        if cached is not None:
+            return cached
+        return self._store(host, port, socket.getaddrinfo(host, port, type=socket.SOCK_STREAM))
+
+    async def resolve_async(self, host: str, port: int) -> str:
+        cached = self._cached(host, port)
+        if cached is not None:
+            return cached
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        return self._store(host, port, infos)
+
+
+DNS_CACHE = DnsCache(SETTINGS.dns_cache_ttl_seconds)
+
+
+class _CachingBackend(httpcore.NetworkBackend):
+    def __init__(self) -> None:
+        self._inner = httpcore.SyncBackend()
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        STATS.connection(host)
+        return self._inner.connect_tcp(
+            DNS_CACHE.resolve(host, port), port, timeout, local_address, socket_options
+        )
+
+    def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return self._inner.connect_unix_socket(path, timeout, socket_options)
+
+    def sleep(self, seconds: float) -> None:
+        self._inner.sleep(seconds)
+
+
+class _AsyncCachingBackend(httpcore.AsyncNetworkBackend):
+    def __init__(self) -> None:
+        self._inner = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        STATS.connection(host)
+        address = await DNS_CACHE.resolve_async(host, port)
+        return await self._inner.connect_tcp(address, port, timeout, local_address, socket_options)
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._inner.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._inner.sleep(seconds)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=SETTINGS.http_max_connections,
+        max_keepalive_connections=SETTINGS.http_max_keepalive,
+        keepalive_expiry=SETTINGS.http_keepalive_seconds,
+    )
+
+
+def _pool_kwargs() -> Dict[str, Any]:
+    limits = _limits()
+    return {
+        "max_connections": limits.max_connections,
+        "max_keepalive_connections": limits.max_keepalive_connections,
+        "keepalive_expiry": limits.keepalive_expiry,
+        "http1": True,
+        "http2": SETTINGS.http2 and HTTP2_AVAILABLE,
+    }
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, release) -> None:
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release) -> None:
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+def _limit_timeout(request: httpx.Request) -> Optional[float]:
+    """Wait for a per-host slot at most as long as for a pooled connection."""
+    timeout = request.extensions.get("timeout") or {}
+    return timeout.get("pool", SETTINGS.http_timeout_seconds)
+
+
+class PooledTransport(httpx.HTTPTransport):
+    def __init__(self, per_host: int, proxy: Optional[str] = None) -> None:
+        if proxy:
+            # The proxy resolves names, so httpx's own proxy pool is used as is.
+            super().__init__(limits=_limits(), http2=SETTINGS.http2 and HTTP2_AVAILABLE, proxy=proxy)
+        else:
+            # httpx has no hook for a network backend; build the pool here instead of
+            # letting HTTPTransport.__init__ create one that would only be discarded.
+            self._pool = httpcore.ConnectionPool(
+                ssl_context=httpx.create_ssl_context(), network_backend=_CachingBackend(), **_pool_kwargs()
+            )
+        self._per_host = per_host
+        self._host_lock = threading.Lock()
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+
+    def _host_limit(self, host: str) -> threading.BoundedSemaphore:
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self._per_host)
+            return self._host_limits[host]
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        STATS.request(request.url.host)
+        limit = self._host_limit(request.url.host)
+        timeout = _limit_timeout(request)
+        if not limit.acquire(timeout=-1 if timeout is None else timeout):
+            raise httpx.PoolTimeout(f"no free connection slot for {request.url.host}", request=request)
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            limit.release()
+            raise
+        response.stream = _ReleasingStream(response.stream, limit.release)
+        return response
+
+
+class AsyncPooledTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, per_host: int, proxy: Optional[str] = None) -> None:
+        if proxy:
+            super().__init__(limits=_limits(), http2=SETTINGS.http2 and HTTP2_AVAILABLE, proxy=proxy)
+        else:
+            self._pool = httpcore.AsyncConnectionPool(
+                ssl_context=httpx.create_ssl_context(),
+                network_backend=_AsyncCachingBackend(),
+                **_pool_kwargs(),
+            )
+        self._per_host = per_host
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self._per_host)
+        return self._host_limits[host]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        STATS.request(request.url.host)
+        limit = self._host_limit(request.url.host)
+        try:
+            await asyncio.wait_for(limit.acquire(), _limit_timeout(request))
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout(f"no free connection slot for {request.url.host}", request=request) from None
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            limit.release()
+            raise
+        response.stream = _AsyncReleasingStream(response.stream, limit.release)
+        return response
+
+
+def _proxy_mounts(transport: Callable[[str], Any]) -> Dict[str, Any]:
+    """Routes for HTTP_PROXY / HTTPS_PROXY / ALL_PROXY / NO_PROXY, matching what httpx
+    does itself. httpx ignores the environment once a client has a custom transport,
+    so the shared clients mount proxied transports here."""
+    proxies = urllib.request.getproxies()
+    made: Dict[str, Any] = {}
+    mounts: Dict[str, Any] = {}
+    for scheme in ("http", "https", "all"):
+        url = proxies.get(scheme)
+        if url:
+            url = url if "://" in url else f"http://{url}"
+            if url not in made:
+                made[url] = transport(url)
+            mounts[f"{scheme}://"] = made[url]
+    if not mounts:
+        return {}
+    # None routes a pattern back to the client's own (direct) transport.
+    for host in (host.strip() for host in proxies.get("no", "").split(",")):
+        if host == "*":
+            return {}
+        if not host:
+            continue
+        if "://" in host:
+            mounts[host] = None
+        elif DnsCache._is_ip(host):
+            mounts[f"all://[{host}]" if ":" in host else f"all://{host}"] = None
+        elif host.lower() == "localhost":
+            mounts[f"all://{host}"] = None
+        else:
+            mounts[f"all://*{host}"] = None
+    return mounts
+
+
+_CLIENT: Optional[httpx.Client] = None
+# One client per event loop (a client can't be shared across loops). Keyed
+# weakly, and clients of closed loops are dropped, so short-lived loops
+# (asyncio.run) don't pile up pools; long-lived loops close theirs with
+# close_async_client() before they stop.
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> httpx.Client:
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = httpx.Client(
+                transport=PooledTransport(SETTINGS.http_max_per_host),
+                mounts=_proxy_mounts(lambda url: PooledTransport(SETTINGS.http_max_per_host, url)),
+                timeout=httpx.Timeout(SETTINGS.http_timeout_seconds),
+                follow_redirects=True,
+            )
+        return _CLIENT
+
+
+def get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    with _CLIENT_LOCK:
+        client = _ASYNC_CLIENTS.get(loop)
+        if client is None:
+            for closed in [other for other in _ASYNC_CLIENTS if other.is_closed()]:
+                del _ASYNC_CLIENTS[closed]
+            client = httpx.AsyncClient(
+                transport=AsyncPooledTransport(SETTINGS.http_max_per_host),
+                mounts=_proxy_mounts(lambda url: AsyncPooledTransport(SETTINGS.http_max_per_host, url)),
+                timeout=httpx.Timeout(SETTINGS.http_timeout_seconds),
+                follow_redirects=True,
+            )
+            _ASYNC_CLIENTS[loop] = client
+        return client
+
+
+async def close_async_client() -> None:
+    """Close the running loop's client, if it has one."""
+    loop = asyncio.get_running_loop()
+    with _CLIENT_LOCK:
+        client = _ASYNC_CLIENTS.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def connection_stats() -> Dict[str, Any]:
+    return {"http2": SETTINGS.http2 and HTTP2_AVAILABLE, **STATS.snapshot()}
+
+
+def close_clients() -> None:
+    global _CLIENT
+    with _CLIENT_LOCK:
+        client, _CLIENT = _CLIENT, None
+        async_clients = list(_ASYNC_CLIENTS.items())
+        _ASYNC_CLIENTS.clear()
+    if client is not None:
+        client.close()
+    for loop, async_client in async_clients:
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(async_client.aclose(), loop).result(timeout=5)
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from app.config import SETTINGS
+from app.db import execute, fetch_all, fetch_one, transaction
+from app.utils import utc_now
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+PHASH_BANDS = 4
+# Pigeonhole: hashes within distance d agree on at least one of d + 1 bands, so
+# the fixed band columns only guarantee a candidate up to this distance.
+MAX_PHASH_DISTANCE = PHASH_BANDS - 1
+
+
+@dataclass
+class CachedImage:
+    url: str
+    media_type: str
+    content_hash: str
+    phash: Optional[str]
+    data: bytes
+    classified_risk: Optional[str] = None
+
+
+def perceptual_hash(data: bytes) -> Optional[str]:
+    """64-bit difference hash (dHash); None when Pillow is missing or decoding fails."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            pixels = list(img.convert("L").resize((9, 8)).getdata())
+    except Exception:
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | int(left > right)
+    if bits in (0, (1 << 64) - 1):
+        # Flat or monotonic images all hash alike; don't use them for near-dup matching.
+        return None
+    return f"{bits:016x}"
+
+
+def _bands(phash: str) -> List[int]:
+    value = int(phash, 16)
+    return [(value >> (16 * band)) & 0xFFFF for band in range(PHASH_BANDS)]
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+class ImageCache:
+    """Content-addressed on-disk image cache indexed in SQLite.
+
+    Blobs are stored once per content hash; URLs map onto blobs together with
+    the ETag/Last-Modified validators used for conditional GETs. Near-duplicate
+    lookup splits the 64-bit perceptual hash into four 16-bit bands, so any
+    image within Hamming distance 3 shares at least one indexed band. Larger
+    distances would silently miss matches, so they are rejected.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, phash_distance: int = 3) -> None:
+        if not 0 <= phash_distance <= MAX_PHASH_DISTANCE:
+            raise ValueError(
+                f"IMAGE_PHASH_DISTANCE must be between 0 and {MAX_PHASH_DISTANCE} "
+                f"({PHASH_BANDS} indexed bands), got {phash_distance}"
+            )
+        self.root = root
+        self.max_bytes = max_bytes
+        self.phash_distance = phash_distance
+        self._evict_lock = threading.Lock()
+
+    def _blob_path(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / content_hash
+
+    def lookup(self, url: str) -> Optional[Dict[str, str]]:
+        row = fetch_one(
+            """
+            SELECT c.url, c.content_hash, c.etag, c.last_modified, b.media_type, b.phash, b.classified_risk
+            FROM image_cache c JOIN image_blobs b ON b.content_hash = c.content_hash
+            WHERE c.url = ?
+            """,
+            (url,),
+        )
+        if not row or not self._blob_path(row["content_hash"]).exists():
+            return None
+        return dict(row)
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, str]]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if not entry:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, entry: Dict[str, str]) -> Optional[CachedImage]:
+        try:
+            data = self._blob_path(entry["content_hash"]).read_bytes()
+        except OSError:
+            return None
+        execute(
+            "UPDATE image_blobs SET last_access = ? WHERE content_hash = ?",
+            (time.time(), entry["content_hash"]),
+        )
+        return CachedImage(
+            url=entry["url"],
+            media_type=entry["media_type"],
+            content_hash=entry["content_hash"],
+            phash=entry["phash"],
+            data=data,
+            classified_risk=entry["classified_risk"],
+        )
+
+    def read(self, content_hash: str) -> Optional[bytes]:
+        try:
+            return self._blob_path(content_hash).read_bytes()
+        except OSError:
+            return None
+
+    def store(
+        self,
+        url: str,
+        media_type: str,
+        data: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> CachedImage:
+        content_hash = hashlib.sha256(data).hexdigest()
+        existing = fetch_one(
+            "SELECT phash, classified_risk FROM image_blobs WHERE content_hash = ?",
+            (content_hash,),
+        )
+        path = self._blob_path(content_hash)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+        phash = existing["phash"] if existing else perceptual_hash(data)
+        classified_risk = existing["classified_risk"] if existing else None
+        with transaction():
+            if existing:
+                execute(
+                    "UPDATE image_blobs SET last_access = ? WHERE content_hash = ?",
+                    (time.time(), content_hash),
+                )
+            else:
+                bands = _bands(phash) if phash else [None] * PHASH_BANDS
+                execute(
+                    """
+                    INSERT OR IGNORE INTO image_blobs
+                        (content_hash, media_type, size, phash, phash_b0, phash_b1, phash_b2, phash_b3, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (content_hash, media_type, len(data), phash, *bands, time.time()),
+                )
+            execute(
+                """
+                INSERT INTO image_cache (url, content_hash, etag, last_modified, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    fetched_at = excluded.fetched_at
+                """,
+                (url, content_hash, etag, last_modified, utc_now()),
+            )
+        if not existing:
+            self.evict()
+        return CachedImage(
+            url=url,
+            media_type=media_type,
+            content_hash=content_hash,
+            phash=phash,
+            data=data,
+            classified_risk=classified_risk,
+        )
+
+    def _similar_risks(self, phash: str) -> List[str]:
+        bands = _bands(phash)
+        rows = fetch_all(
+            """
+            SELECT phash, classified_risk FROM image_blobs
+            WHERE classified_risk IS NOT NULL
+              AND (phash_b0 = ? OR phash_b1 = ? OR phash_b2 = ? OR phash_b3 = ?)
+            """,
+            tuple(bands),
+        )
+        return [
+            row["classified_risk"]
+            for row in rows
+            if row["phash"] and hamming(row["phash"], phash) <= self.phash_distance
+        ]
+
+    def is_known_benign(self, image: CachedImage) -> bool:
+        if image.classified_risk is not None:
+            return image.classified_risk == "none"
+        if not image.phash:
+            return False
+        risks = self._similar_risks(image.phash)
+        return bool(risks) and all(risk == "none" for risk in risks)
+
+    def mark_classified(self, content_hashes: Iterable[str], risk_level: str) -> None:
+        now = utc_now()
+        with transaction():
+            for content_hash in set(content_hashes):
+                # A risky verdict always wins over an earlier benign one for the same bytes.
+                execute(
+                    """
+                    UPDATE image_blobs
+                    SET classified_risk = ?, classified_at = ?
+                    WHERE content_hash = ? AND (classified_risk IS NULL OR classified_risk = 'none')
+                    """,
+                    (risk_level, now, content_hash),
+                )
+
+    def evict(self) -> None:
+        if self.max_bytes <= 0:
+            return
+        with self._evict_lock:
+            total = fetch_one("SELECT COALESCE(SUM(size), 0) AS total FROM image_blobs")["total"]
+            if total <= self.max_bytes:
+                return
+            target = int(self.max_bytes * 0.9)
+            rows = fetch_all("SELECT content_hash, size FROM image_blobs ORDER BY last_access ASC")
+            for row in rows:
+                if total <= target:
+                    break
+                with transaction():
+                    execute("DELETE FROM image_cache WHERE content_hash = ?", (row["content_hash"],))
+                    execute("DELETE FROM image_blobs WHERE content_hash = ?", (row["content_hash"],))
+                try:
+                    self._blob_path(row["content_hash"]).unlink()
+                except OSError:
+                    pass
+                total -= row["size"]
+
+    def stats(self) -> Dict[str, int]:
+        row = fetch_one(
+            """
+            SELECT COUNT(*) AS blobs, COALESCE(SUM(size), 0) AS bytes,
+                   SUM(CASE WHEN classified_risk IS NOT NULL THEN 1 ELSE 0 END) AS classified
+            FROM image_blobs
+            """
+        )
+        urls = fetch_one("SELECT COUNT(*) AS urls FROM image_cache")
+        return {
+            "blobs": row["blobs"],
+            "bytes": row["bytes"],
+            "classified": row["classified"] or 0,
+            "urls": urls["urls"],
+            "max_bytes": self.max_bytes,
+        }
+
+
+IMAGE_CACHE = ImageCache(
+    SETTINGS.image_cache_dir,
+    SETTINGS.image_cache_max_bytes,
+    SETTINGS.image_phash_distance,
+)
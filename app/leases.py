@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import importlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config import SETTINGS
+from app.db import execute, fetch_all, fetch_one, transaction
+from app.utils import utc_now
+
+
+@dataclass
+class Claim:
+    job_id: str
+    due_at: str
+    interval_seconds: int
+
+
+def after(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+def next_run_after(claim: Claim) -> str:
+    """Keep the job on its cadence; if it fell a whole interval behind, skip the
+    missed slots instead of running back to back."""
+    due = datetime.fromisoformat(claim.due_at) + timedelta(seconds=claim.interval_seconds)
+    now = datetime.now(timezone.utc)
+    if due <= now:
+        due = now + timedelta(seconds=claim.interval_seconds)
+    return due.isoformat()
+
+
+class LeaseStore(ABC):
+    """Where workers claim due jobs. Claims expire unless renewed, so jobs held by
+    a crashed worker become due again. Subclass this for a networked store and
+    set LEASE_STORE=package.module:ClassName."""
+
+    @abstractmethod
+    def claim_due(self, owner: str, limit: int, lease_seconds: float) -> List[Claim]:
+        """Lease up to ``limit`` due jobs to ``owner`` for ``lease_seconds``."""
+
+    @abstractmethod
+    def claim_one(self, owner: str, job_id: str, lease_seconds: float) -> Optional[Claim]:
+        """Lease one job to ``owner`` whether or not it is due; None if another lease holds it.
+        ``due_at`` of the claim is the job's current ``next_run_at``."""
+
+    @abstractmethod
+    def renew(self, owner: str, job_ids: Sequence[str], lease_seconds: float) -> List[str]:
+        """Extend leases still held by ``owner``; returns the ids it still holds."""
+
+    @abstractmethod
+    def release(self, owner: str, job_id: str, next_run_at: Optional[str]) -> None:
+        """Drop ``owner``'s lease on the job and make it due at ``next_run_at``."""
+
+    @abstractmethod
+    def schedule(self, job_id: str, next_run_at: Optional[str]) -> None:
+        """Set when a job is next due; None takes it off the schedule."""
+
+    def schedule_many(self, items: Sequence[Tuple[str, Optional[str]]]) -> None:
+        for job_id, next_run_at in items:
+            self.schedule(job_id, next_run_at)
+
+    @abstractmethod
+    def acquire(self, name: str, owner: str, lease_seconds: float) -> bool:
+        """Take or renew a named lease, for tasks that only one worker should run."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class SQLiteLeaseStore(LeaseStore):
+    def claim_due(self, owner: str, limit: int, lease_seconds: float) -> List[Claim]:
+        if limit <= 0:
+            return []
+        now = utc_now()
+        with transaction():
+            rows = fetch_all(
+                """
+                UPDATE jobs SET lease_owner = ?, lease_expires_at = ?
+                WHERE id IN (
+                    SELECT id FROM jobs
+                    WHERE status = 'active' AND next_run_at <= ?
+                      AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                    ORDER BY next_run_at
+                    LIMIT ?
+                )
+                RETURNING id, next_run_at,
+                    CASE WHEN adaptive AND current_interval_seconds THEN current_interval_seconds
+                         ELSE interval_seconds END AS interval_seconds
+                """,
+                (owner, after(lease_seconds), now, now, limit),
+            )
+        return [Claim(row["id"], row["next_run_at"], row["interval_seconds"]) for row in rows]
+
+    def claim_one(self, owner: str, job_id: str, lease_seconds: float) -> Optional[Claim]:
+        with transaction():
+            row = fetch_one(
+                """
+                UPDATE jobs SET lease_owner = ?, lease_expires_at = ?
+                WHERE id = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                RETURNING id, next_run_at,
+                    CASE WHEN adaptive AND current_interval_seconds THEN current_interval_seconds
+                         ELSE interval_seconds END AS interval_seconds
+                """,
+                (owner, after(lease_seconds), job_id, utc_now()),
+            )
+        return Claim(row["id"], row["next_run_at"], row["interval_seconds"]) if row else None
+
+    def renew(self, owner: str, job_ids: Sequence[str], lease_seconds: float) -> List[str]:
+        if not job_ids:
+            return []
+        marks = ", ".join("?" for _ in job_ids)
+        with transaction():
+            rows = fetch_all(
+                f"UPDATE jobs SET lease_expires_at = ? WHERE lease_owner = ? AND id IN ({marks}) RETURNING id",
+                (after(lease_seconds), owner, *job_ids),
+            )
+        return [row["id"] for row in rows]
+
+    def release(self, owner: str, job_id: str, next_run_at: Optional[str]) -> None:
+        execute(
+            """
+            UPDATE jobs SET lease_owner = NULL, lease_expires_at = NULL, next_run_at = ?
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (next_run_at, job_id, owner),
+        )
+
+    def schedule(self, job_id: str, next_run_at: Optional[str]) -> None:
+        execute("UPDATE jobs SET next_run_at = ? WHERE id = ?", (next_run_at, job_id))
+
+    def schedule_many(self, items: Sequence[Tuple[str, Optional[str]]]) -> None:
+        with transaction() as conn:
+            conn.executemany("UPDATE jobs SET next_run_at = ? WHERE id = ?", [(at, job_id) for job_id, at in items])
+
+    def acquire(self, name: str, owner: str, lease_seconds: float) -> bool:
+        return bool(
+            execute(
+                """
+                INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+                """,
+                (name, owner, after(lease_seconds), utc_now()),
+            )
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        now = utc_now()
+        row = fetch_one(
+            """
+            SELECT
+                SUM(next_run_at <= ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)) AS due,
+                SUM(lease_expires_at >= ?) AS leased,
+                MIN(CASE WHEN lease_expires_at IS NULL OR lease_expires_at < ? THEN next_run_at END) AS oldest_due
+            FROM jobs WHERE status = 'active'
+            """,
+            (now, now, now, now),
+        )
+        oldest = row["oldest_due"]
+        lag = (
+            max(0.0, (datetime.now(timezone.utc) - datetime.fromisoformat(oldest)).total_seconds())
+            if oldest
+            else 0.0
+        )
+        return {"due": row["due"] or 0, "leased": row["leased"] or 0, "lag_seconds": round(lag, 1)}
+
+
+def get_lease_store() -> LeaseStore:
+    spec = SETTINGS.lease_store
+    if spec in ("", "sqlite"):
+        return SQLiteLeaseStore()
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
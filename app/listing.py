@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.db import fetch_all
+
+JOB_FIELDS = (
+    "id",
+    "url",
+    "interval_seconds",
+    "mode",
+    "webhook_url",
+    "status",
+    "created_at",
+    "updated_at",
+    "llm_mode",
+    "adaptive",
+    "min_interval_seconds",
+    "max_interval_seconds",
+    "current_interval_seconds",
+    "crawl_max_pages",
+    "crawl_max_seconds",
+)
+RUN_FIELDS = (
+    "id",
+    "job_id",
+    "started_at",
+    "finished_at",
+    "status",
+    "site_context",
+    "risk_level",
+    "flags",
+    "evidence",
+    "raw_hash",
+    "risk_at",
+    "summary",
+    "error",
+    "analysis_mode",
+    "scrape_path",
+    "route_reason",
+    "static_ms",
+    "browser_ms",
+    "crawl",
+)
+ALERT_FIELDS = (
+    "id",
+    "job_id",
+    "fingerprint",
+    "risk_level",
+    "flags",
+    "evidence",
+    "state",
+    "notified_state",
+    "opened_at",
+    "last_seen_at",
+    "last_notified_at",
+    "resolved_at",
+    "notify_count",
+)
+PAGE_FIELDS = (
+    "id",
+    "job_id",
+    "url",
+    "depth",
+    "content_hash",
+    "risk_level",
+    "flags",
+    "evidence",
+    "summary",
+    "first_seen_at",
+    "last_seen_at",
+    "last_changed_at",
+    "last_analyzed_at",
+)
+# Stored as JSON text; spliced into output verbatim instead of json.loads + dumps.
+JSON_FIELDS = {"flags", "evidence", "crawl"}
+# Stored as 0/1; emitted as JSON booleans to match the single-object endpoints.
+BOOL_FIELDS = {"adaptive"}
+LATEST_RUN = "latest_run"
+LATEST_RUN_FIELDS = (
+    "id",
+    "status",
+    "started_at",
+    "finished_at",
+    "site_context",
+    "risk_level",
+    "flags",
+    "risk_at",
+    "summary",
+)
+STREAM_CHUNK = 500
+
+
+def encode_cursor(sort_value: Any, row_id: str) -> str:
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    return sort_value, row_id
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str], extra: Sequence[str] = ()) -> List[str]:
+    if not fields:
+        return list(allowed)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed and field not in extra]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(requested))
+
+
+def row_json(row: Any, fields: Sequence[str], extra: Optional[Dict[str, str]] = None) -> str:
+    """Serialize one sqlite3.Row to a JSON object string."""
+    parts = []
+    for field in fields:
+        if extra and field in extra:
+            parts.append(f"{json.dumps(field)}:{extra[field]}")
+            continue
+        value = row[field]
+        if field in JSON_FIELDS:
+            parts.append(f"{json.dumps(field)}:{value or 'null'}")
+        elif field in BOOL_FIELDS and value is not None:
+            parts.append(f"{json.dumps(field)}:{'true' if value else 'false'}")
+        else:
+            parts.append(f"{json.dumps(field)}:{json.dumps(value, ensure_ascii=False)}")
+    return "{" + ",".join(parts) + "}"
+
+
+class Listing:
+    """Keyset-paginated query over ``table`` ordered by ``sort`` DESC, id DESC."""
+
+    def __init__(
+        self,
+        table: str,
+        sort: str,
+        fields: Sequence[str],
+        filters: Sequence[Tuple[str, Any]] = (),
+    ) -> None:
+        self.table = table
+        self.sort = sort
+        self.fields = [field for field in fields if field != LATEST_RUN]
+        self.latest_run = LATEST_RUN in fields
+        self.output_fields = list(fields)
+        self.filters = [(clause, value) for clause, value in filters if value is not None]
+
+    def _fetch(self, cursor: Optional[str], limit: int) -> List[Any]:
+        columns = ", ".join(dict.fromkeys([*self.fields, self.sort, "id"]))
+        clauses = [clause for clause, _ in self.filters]
+        params: List[Any] = [value for _, value in self.filters]
+        if cursor:
+            sort_value, row_id = decode_cursor(cursor)
+            clauses.append(f"({self.sort}, id) < (?, ?)")
+            params.extend([sort_value, row_id])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return fetch_all(
+            f"SELECT {columns} FROM {self.table} {where} ORDER BY {self.sort} DESC, id DESC LIMIT ?",
+            (*params, limit),
+        )
+
+    def _latest_runs(self, rows: List[Any]) -> Dict[str, str]:
+        if not self.latest_run or not rows:
+            return {}
+        ids = [row["id"] for row in rows]
+        marks = ", ".join("?" for _ in ids)
+        latest = fetch_all(
+            f"""
+            SELECT job_id, {', '.join(LATEST_RUN_FIELDS)} FROM run_details
+            WHERE id IN (
+                SELECT (SELECT r.id FROM runs r WHERE r.job_id = j.id ORDER BY r.started_at DESC LIMIT 1)
+                FROM jobs j WHERE j.id IN ({marks})
+            )
+            """,
+            tuple(ids),
+        )
+        return {row["job_id"]: row_json(row, LATEST_RUN_FIELDS) for row in latest}
+
+    def _serialize(self, rows: List[Any]) -> List[str]:
+        latest = self._latest_runs(rows)
+        return [
+            row_json(row, self.output_fields, {LATEST_RUN: latest.get(row["id"], "null")})
+            for row in rows
+        ]
+
+    def page(self, cursor: Optional[str], limit: int) -> Tuple[str, Optional[str]]:
+        """Return a JSON array body and the cursor for the next page (None at the end)."""
+        rows = self._fetch(cursor, limit + 1)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][self.sort], rows[-1]["id"]) if more else None
+        return "[" + ",".join(self._serialize(rows)) + "]", next_cursor
+
+    def chunks(self, cursor: Optional[str], limit: Optional[int]) -> Iterator[List[Any]]:
+        """Yield rows STREAM_CHUNK at a time so memory stays flat."""
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = STREAM_CHUNK if remaining is None else min(STREAM_CHUNK, remaining)
+            rows = self._fetch(cursor, size)
+            if not rows:
+                return
+            yield rows
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                return
+            cursor = encode_cursor(rows[-1][self.sort], rows[-1]["id"])
+
+    def stream(self, cursor: Optional[str], limit: Optional[int]) -> Iterator[str]:
+        """Yield NDJSON lines."""
+        for rows in self.chunks(cursor, limit):
+            yield "\n".join(self._serialize(rows)) + "\n"
+
+
+def jobs_listing(
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    mode: Optional[str] = None,
+    llm_mode: Optional[str] = None,
+    url_prefix: Optional[str] = None,
+) -> Listing:
+    return Listing(
+        "jobs",
+        "created_at",
+        parse_fields(fields, JOB_FIELDS, (LATEST_RUN,)),
+        [
+            ("status = ?", status),
+            ("mode = ?", mode),
+            ("llm_mode = ?", llm_mode),
+            ("url LIKE ? ESCAPE '\\'", like_prefix(url_prefix)),
+        ],
+    )
+
+
+def like_prefix(prefix: Optional[str]) -> Optional[str]:
+    if not prefix:
+        return None
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def runs_listing(
+    job_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Listing:
+    return Listing(
+        "run_details",
+        "started_at",
+        parse_fields(fields, RUN_FIELDS),
+        [
+            ("job_id = ?", job_id),
+            ("status = ?", status),
+            ("risk_level = ?", risk_level),
+            ("started_at >= ?", since),
+            ("started_at <= ?", until),
+        ],
+    )
+
+
+def alerts_listing(
+    job_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    state: Optional[str] = None,
+    risk_level: Optional[str] = None,
+) -> Listing:
+    return Listing(
+        "alerts",
+        "last_seen_at",
+        parse_fields(fields, ALERT_FIELDS),
+        [("job_id = ?", job_id), ("state = ?", state), ("risk_level = ?", risk_level)],
+    )
+
+
+def pages_listing(
+    job_id: str,
+    fields: Optional[str] = None,
+    risk_level: Optional[str] = None,
+) -> Listing:
+    return Listing(
+        "crawl_pages",
+        "last_seen_at",
+        parse_fields(fields, PAGE_FIELDS),
+        [("job_id = ?", job_id), ("risk_level = ?", risk_level)],
+    )
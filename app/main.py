@@ -1,19 +1,48 @@
 from __future__ import annotations
 
 import uuid
+from itertools import islice
 from pathlib import Path
-from typing import List
+from typing import List, Literal, Optional
+from urllib.parse import urlsplit
 
-from fastapi import BackgroundTasks, FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+from app.adaptive import effective_interval
+from app.alerts import alert_stats
+from app.analysis import llm_usage
 from app.config import SETTINGS
-from app.db import execute, fetch_all, fetch_one, init_db, parse_json
-from app.models import JobCreate, JobOut, JobUpdate, RunOut
-from app.runner import run_job
+from app.bulk import delete_jobs, export_csv, import_stream, matching_job_ids, set_status
+from app.db import close_connections, execute, fetch_one, init_db, transaction
+from app.events import HUB, publish_bulk, publish_job
+from app.http_clients import close_clients, connection_stats
+from app.listing import Listing, alerts_listing, decode_cursor, jobs_listing, pages_listing, runs_listing
+from app.models import (
+    AlertState,
+    BulkAction,
+    JobCreate,
+    JobMode,
+    JobOut,
+    JobStatus,
+    JobUpdate,
+    LlmMode,
+    RiskLevel,
+    RunOut,
+    RunStatus,
+)
+from app.notify import dead_letters, retry_dead, webhook_stats
+from app.parsing import parser_stats, shutdown_parser_pool
+from app.pipeline import get_pipeline, shutdown_pipeline
+from app.routing import route_stats
+from app.retention import daily_history, query_archive, storage_stats
 from app.scheduler import SchedulerManager
-from app.utils import utc_now
+from app.scrapers import browser_stats, shutdown_browser_pool
+from app.utils import url_key, utc_now
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
 app = FastAPI(title="URL Risk Monitor API")
 scheduler = SchedulerManager()
@@ -28,6 +57,11 @@ def on_startup() -> None:
 @app.on_event("shutdown")
 def on_shutdown() -> None:
     scheduler.shutdown()
+    close_clients()
+    shutdown_pipeline()
+    shutdown_browser_pool()
+    shutdown_parser_pool()
+    close_connections()
 
 
 _FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend"
@@ -58,31 +92,148 @@ def create_job(payload: JobCreate) -> JobOut:
     )
     if webhook_url is None:
         webhook_url = ""
-    execute(
-        """
-        INSERT INTO jobs (id, url, interval_seconds, mode, webhook_url, status, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            job_id,
-            str(payload.url),
-            payload.interval_seconds,
-            payload.mode,
-            webhook_url or "",
-            "active",
-            now,
-            now,
-        ),
-    )
+    with transaction():
+        execute(
+            """
+            INSERT INTO jobs (id, url, url_key, interval_seconds, mode, webhook_url, status, created_at, updated_at,
+                              llm_mode, adaptive, min_interval_seconds, max_interval_seconds,
+                              crawl_max_pages, crawl_max_seconds)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                job_id,
+                str(payload.url),
+                url_key(str(payload.url)),
+                payload.interval_seconds,
+                payload.mode,
+                webhook_url or "",
+                "active",
+                now,
+                now,
+                payload.llm_mode,
+                int(payload.adaptive),
+                payload.min_interval_seconds,
+                payload.max_interval_seconds,
+                payload.crawl_max_pages,
+                payload.crawl_max_seconds,
+            ),
+        )
+        publish_job(job_id, "job.created")
     scheduler.schedule_job(job_id, payload.interval_seconds)
     row = fetch_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
     return JobOut(**row)
 
 
-@app.get("/jobs", response_model=List[JobOut])
-def list_jobs() -> List[JobOut]:
-    rows = fetch_all("SELECT * FROM jobs ORDER BY created_at DESC")
-    return [JobOut(**row) for row in rows]
+def _listing_responses(model: type) -> dict:
+    """OpenAPI for the listing endpoints, which return a raw body FastAPI can't
+    validate: pages of ``model`` objects, with only the ``fields`` asked for."""
+    item = model.model_json_schema()
+    item.pop("required", None)
+    return {
+        200: {
+            "description": f"{model.__name__} objects; X-Next-Cursor and Link point at the next page.",
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": item}},
+                "application/x-ndjson": {"schema": {"type": "string", "description": "One object per line"}},
+            },
+        }
+    }
+
+
+def _listing_response(
+    request: Request, listing: Listing, cursor: Optional[str], limit: Optional[int], format: Optional[str]
+) -> Response:
+    """JSON array (next page cursor in X-Next-Cursor / Link) or, with
+    format=ndjson or Accept: application/x-ndjson, a stream of every match."""
+    try:
+        if cursor:
+            decode_cursor(cursor)
+        if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+            return StreamingResponse(listing.stream(cursor, limit), media_type="application/x-ndjson")
+        body, next_cursor = listing.page(cursor, limit or DEFAULT_PAGE_SIZE)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/jobs", responses=_listing_responses(JobOut))
+def list_jobs(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[JobStatus] = None,
+    mode: Optional[JobMode] = None,
+    llm_mode: Optional[LlmMode] = None,
+    url_prefix: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated; 'latest_run' embeds each job's newest run"),
+    format: Optional[Literal["json", "ndjson"]] = None,
+) -> Response:
+    try:
+        listing = jobs_listing(fields, status, mode, llm_mode, url_prefix)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return _listing_response(request, listing, cursor, limit, format)
+
+
+@app.get("/jobs/export")
+def export_jobs(
+    status: Optional[JobStatus] = None,
+    mode: Optional[JobMode] = None,
+    llm_mode: Optional[LlmMode] = None,
+    url_prefix: Optional[str] = None,
+    format: Literal["ndjson", "csv"] = "ndjson",
+) -> StreamingResponse:
+    """Every matching job, streamed; the output can be fed back to POST /jobs/import."""
+    listing = jobs_listing(None, status, mode, llm_mode, url_prefix)
+    if format == "csv":
+        body, media_type = export_csv(listing), "text/csv"
+    else:
+        body, media_type = listing.stream(None, None), "application/x-ndjson"
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="jobs.{format}"'}
+    )
+
+
+@app.post("/jobs/import")
+async def import_jobs(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = None,
+    interval_seconds: int = Query(3600, ge=30, le=60 * 60 * 24),
+    mode: JobMode = "auto",
+    llm_mode: LlmMode = "realtime",
+    adaptive: bool = False,
+) -> dict:
+    """Create jobs from an NDJSON or CSV body (format from the query or Content-Type).
+    Query values are defaults for fields a row leaves out; URLs already present are skipped."""
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    defaults = {"interval_seconds": interval_seconds, "mode": mode, "llm_mode": llm_mode, "adaptive": adaptive}
+    return await import_stream(request.stream(), format, defaults, scheduler.schedule_jobs)
+
+
+@app.post("/jobs/bulk")
+def bulk_jobs(payload: BulkAction) -> dict:
+    filters = (payload.ids, payload.status, payload.mode, payload.llm_mode, payload.url_prefix)
+    if all(value is None for value in filters) and not payload.all:
+        raise HTTPException(status_code=400, detail="Set a filter, or all=true to act on every job")
+    ids = matching_job_ids(*filters)
+    if payload.action == "delete":
+        count = delete_jobs(ids)
+        scheduler.remove_jobs(ids)
+    else:
+        changed = set_status(ids, "paused" if payload.action == "pause" else "active")
+        count = len(changed)
+        if payload.action == "pause":
+            scheduler.remove_jobs([job_id for job_id, _ in changed])
+        else:
+            scheduler.schedule_jobs(changed)
+    if count:
+        publish_bulk(payload.action, count)
+    return {"action": payload.action, "matched": len(ids), "changed": count}
 
 
 @app.get("/jobs/{job_id}", response_model=JobOut)
@@ -114,16 +265,42 @@ def update_job(job_id: str, payload: JobUpdate) -> JobOut:
     if payload.status is not None:
         updates.append("status = ?")
         params.append(payload.status)
+    if payload.llm_mode is not None:
+        updates.append("llm_mode = ?")
+        params.append(payload.llm_mode)
+    if payload.adaptive is not None:
+        updates.append("adaptive = ?")
+        params.append(int(payload.adaptive))
+    if payload.min_interval_seconds is not None:
+        updates.append("min_interval_seconds = ?")
+        params.append(payload.min_interval_seconds)
+    if payload.max_interval_seconds is not None:
+        updates.append("max_interval_seconds = ?")
+        params.append(payload.max_interval_seconds)
+    if payload.crawl_max_pages is not None:
+        updates.append("crawl_max_pages = ?")
+        params.append(payload.crawl_max_pages)
+    if payload.crawl_max_seconds is not None:
+        updates.append("crawl_max_seconds = ?")
+        params.append(payload.crawl_max_seconds)
+    if any(
+        value is not None
+        for value in (payload.interval_seconds, payload.adaptive, payload.min_interval_seconds, payload.max_interval_seconds)
+    ):
+        # Start adapting again from the new base interval.
+        updates.append("current_interval_seconds = NULL")
 
     if updates:
         updates.append("updated_at = ?")
         params.append(utc_now())
         params.append(job_id)
-        execute(f"UPDATE jobs SET {', '.join(updates)} WHERE id = ?", tuple(params))
+        with transaction():
+            execute(f"UPDATE jobs SET {', '.join(updates)} WHERE id = ?", tuple(params))
+            publish_job(job_id)
 
     updated = fetch_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
     if updated["status"] == "active":
-        scheduler.schedule_job(job_id, updated["interval_seconds"])
+        scheduler.schedule_job(job_id, effective_interval(updated))
     else:
         scheduler.remove_job(job_id)
     return JobOut(**updated)
@@ -134,27 +311,112 @@ def delete_job(job_id: str) -> dict:
     row = fetch_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
     if not row:
         raise HTTPException(status_code=404, detail="Job not found")
-    execute("DELETE FROM runs WHERE job_id = ?", (job_id,))
-    execute("DELETE FROM job_state WHERE job_id = ?", (job_id,))
-    execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+    with transaction():
+        delete_jobs([job_id])
+        publish_job(job_id, "job.deleted")
     scheduler.remove_job(job_id)
     return {"status": "deleted"}
 
 
-@app.get("/jobs/{job_id}/runs", response_model=List[RunOut])
-def list_runs(job_id: str) -> List[RunOut]:
-    rows = fetch_all("SELECT * FROM runs WHERE job_id = ? ORDER BY started_at DESC", (job_id,))
-    output = []
-    for row in rows:
-        row = dict(row)
-        row["flags"] = parse_json(row.get("flags"))
-        row["evidence"] = parse_json(row.get("evidence"))
-        output.append(RunOut(**row))
-    return output
+@app.get("/jobs/{job_id}/runs", responses=_listing_responses(RunOut))
+def list_runs(
+    job_id: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[RunStatus] = None,
+    risk_level: Optional[RiskLevel] = None,
+    since: Optional[str] = Query(None, description="ISO timestamp, inclusive"),
+    until: Optional[str] = Query(None, description="ISO timestamp, inclusive"),
+    fields: Optional[str] = None,
+    format: Optional[Literal["json", "ndjson"]] = None,
+) -> Response:
+    try:
+        listing = runs_listing(job_id, fields, status, risk_level, since, until)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return _listing_response(request, listing, cursor, limit, format)
+
+
+@app.get("/jobs/{job_id}/pages")
+def list_pages(
+    job_id: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    risk_level: Optional[RiskLevel] = None,
+    fields: Optional[str] = None,
+    format: Optional[Literal["json", "ndjson"]] = None,
+) -> Response:
+    """Pages a crawl-mode job has visited, most recently crawled first, with each page's own verdict."""
+    try:
+        listing = pages_listing(job_id, fields, risk_level)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return _listing_response(request, listing, cursor, limit, format)
+
+
+@app.get("/runs", responses=_listing_responses(RunOut))
+def list_all_runs(
+    request: Request,
+    job_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[RunStatus] = None,
+    risk_level: Optional[RiskLevel] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Optional[Literal["json", "ndjson"]] = None,
+) -> Response:
+    try:
+        listing = runs_listing(job_id, fields, status, risk_level, since, until)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return _listing_response(request, listing, cursor, limit, format)
+
+
+@app.get("/alerts")
+def list_alerts(
+    request: Request,
+    job_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    state: Optional[AlertState] = None,
+    risk_level: Optional[RiskLevel] = None,
+    fields: Optional[str] = None,
+    format: Optional[Literal["json", "ndjson"]] = None,
+) -> Response:
+    """Alerts by most recently seen; ``state=open`` or ``ongoing`` are live incidents."""
+    try:
+        listing = alerts_listing(job_id, fields, state, risk_level)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return _listing_response(request, listing, cursor, limit, format)
+
+
+@app.get("/alerts/stats")
+def alerts_stats() -> dict:
+    return alert_stats()
+
+
+@app.get("/jobs/{job_id}/history")
+def job_history(job_id: str, since: Optional[str] = None) -> List[dict]:
+    return daily_history(job_id, since)
+
+
+@app.get("/jobs/{job_id}/runs/archive")
+def archived_runs(
+    job_id: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+) -> List[dict]:
+    return list(islice(query_archive(job_id, since, until), limit))
 
 
 @app.post("/jobs/{job_id}/run")
-def run_job_now(job_id: str, background_tasks: BackgroundTasks) -> dict:
+def run_job_now(job_id: str) -> dict:
     row = fetch_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
     if not row:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -164,5 +426,80 @@ def run_job_now(job_id: str, background_tasks: BackgroundTasks) -> dict:
     )
     if running:
         return {"status": "already_running"}
-    background_tasks.add_task(run_job, job_id)
+    if not scheduler.run_now(job_id, host=urlsplit(row["url"]).hostname or ""):
+        return {"status": "already_running"}
     return {"status": "queued"}
+
+
+@app.get("/events")
+async def events(request: Request, last_event_id: Optional[int] = None) -> StreamingResponse:
+    """Server-sent job.* / run.* events. Resumes after Last-Event-ID (header or query)."""
+    header = request.headers.get("last-event-id")
+    if header and header.isdigit():
+        last_event_id = int(header)
+    return StreamingResponse(
+        HUB.subscribe(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/parser/stats")
+def parser_stats_endpoint() -> dict:
+    return parser_stats()
+
+
+@app.get("/browser/stats")
+def browser_stats_endpoint() -> dict:
+    return browser_stats()
+
+
+@app.get("/llm/stats")
+def llm_stats() -> dict:
+    return llm_usage()
+
+
+@app.get("/http/stats")
+def http_stats() -> dict:
+    return connection_stats()
+
+
+@app.get("/storage/stats")
+def storage() -> dict:
+    return storage_stats()
+
+
+@app.get("/pipeline/stats")
+def pipeline_stats() -> dict:
+    return get_pipeline().stats()
+
+
+@app.get("/scheduler/stats")
+def scheduler_stats() -> dict:
+    return scheduler.stats()
+
+
+@app.get("/routing/stats")
+def routing_stats(hours: int = Query(24, ge=1, le=24 * 90)) -> dict:
+    return route_stats(hours)
+
+
+@app.get("/webhooks/stats")
+def webhooks_stats() -> dict:
+    return webhook_stats()
+
+
+@app.get("/webhooks/dead")
+def list_dead_webhooks(limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)) -> List[dict]:
+    return dead_letters(limit)
+
+
+@app.post("/webhooks/dead/retry")
+def retry_dead_webhooks(ids: Optional[List[int]] = Query(None)) -> dict:
+    """Requeue dead-lettered alerts: the given ids, or all of them."""
+    return {"requeued": retry_dead(ids)}
+
+
+@app.get("/events/stats")
+def events_stats() -> dict:
+    return HUB.stats()
@@ -4,10 +4,12 @@ from typing import Any, Literal, Optional
 from pydantic import BaseModel, HttpUrl, Field
 
 
-JobMode = Literal["static", "dynamic", "auto"]
+JobMode = Literal["static", "dynamic", "auto", "crawl"]
 JobStatus = Literal["active", "paused"]
 RiskLevel = Literal["none", "low", "high"]
-RunStatus = Literal["running", "success", "failed"]
+RunStatus = Literal["running", "queued", "success", "failed"]
+LlmMode = Literal["realtime", "batch"]
+AlertState = Literal["open", "ongoing", "resolved"]
 
 
 class JobCreate(BaseModel):
@@ -15,6 +17,12 @@ class JobCreate(BaseModel):
     interval_seconds: int = Field(ge=30, le=60 * 60 * 24)
     mode: JobMode = "auto"
     webhook_url: Optional[HttpUrl] = None
+    llm_mode: LlmMode = "realtime"
+    adaptive: bool = False
+    min_interval_seconds: Optional[int] = Field(default=None, ge=30, le=60 * 60 * 24 * 30)
+    max_interval_seconds: Optional[int] = Field(default=None, ge=30, le=60 * 60 * 24 * 30)
+    crawl_max_pages: Optional[int] = Field(default=None, ge=1, le=100_000)
+    crawl_max_seconds: Optional[int] = Field(default=None, ge=10, le=60 * 60 * 6)
 
 
 class JobUpdate(BaseModel):
@@ -22,6 +30,25 @@ class JobUpdate(BaseModel):
     mode: Optional[JobMode] = None
     webhook_url: Optional[HttpUrl] = None
     status: Optional[JobStatus] = None
+    llm_mode: Optional[LlmMode] = None
+    adaptive: Optional[bool] = None
+    min_interval_seconds: Optional[int] = Field(default=None, ge=30, le=60 * 60 * 24 * 30)
+    max_interval_seconds: Optional[int] = Field(default=None, ge=30, le=60 * 60 * 24 * 30)
+    crawl_max_pages: Optional[int] = Field(default=None, ge=1, le=100_000)
+    crawl_max_seconds: Optional[int] = Field(default=None, ge=10, le=60 * 60 * 6)
+
+
+class BulkAction(BaseModel):
+    """Pause, resume or delete every job matching the filters. With no filter
+    set, ``all`` must be true."""
+
+    action: Literal["pause", "resume", "delete"]
+    ids: Optional[list[str]] = None
+    status: Optional[JobStatus] = None
+    mode: Optional[JobMode] = None
+    llm_mode: Optional[LlmMode] = None
+    url_prefix: Optional[str] = None
+    all: bool = False
 
 
 class JobOut(BaseModel):
@@ -33,6 +60,13 @@ class JobOut(BaseModel):
     status: JobStatus
     created_at: str
     updated_at: str
+    llm_mode: LlmMode = "realtime"
+    adaptive: bool = False
+    min_interval_seconds: Optional[int] = None
+    max_interval_seconds: Optional[int] = None
+    current_interval_seconds: Optional[int] = None
+    crawl_max_pages: Optional[int] = None
+    crawl_max_seconds: Optional[int] = None
 
 
 class RunOut(BaseModel):
@@ -49,3 +83,9 @@ class RunOut(BaseModel):
     risk_at: Optional[str]
     summary: Optional[str]
     error: Optional[str]
+    analysis_mode: Optional[str] = None
+    scrape_path: Optional[str] = None
+    route_reason: Optional[str] = None
+    static_ms: Optional[int] = None
+    browser_ms: Optional[int] = None
+    crawl: Optional[Any] = None
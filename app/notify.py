@@ -1,23 +1,366 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import random
+import threading
 import time
-from typing import Any, Dict
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
 
 import httpx
 
 from app.config import SETTINGS
+from app.db import execute, fetch_all, fetch_one, on_commit, transaction
+from app.http_clients import close_async_client, get_async_client
+from app.leases import after
+from app.utils import utc_now
 
+# A claimed delivery is hidden from other workers for this long; if the worker
+# dies mid-POST it becomes due again afterwards.
+CLAIM_SECONDS = 60
+POLL_SECONDS = 5.0
+# Statuses worth retrying; any other 4xx means the request itself is wrong.
+RETRYABLE_STATUS = {408, 409, 425, 429}
 
-def send_webhook(webhook_url: str, payload: Dict[str, Any]) -> None:
-    attempt = 0
-    while True:
-        attempt += 1
+
+def enqueue_webhook(webhook_url: str, payload: Dict[str, Any], job_id: Optional[str], run_id: Optional[str]) -> None:
+    """Queue an alert for delivery. Joins the caller's transaction, so the alert
+    is stored if and only if the run result is."""
+    now = datetime.now(timezone.utc)
+    due = now + timedelta(seconds=SETTINGS.webhook_batch_wait_seconds if SETTINGS.webhook_batch_size > 1 else 0)
+    execute(
+        """
+        INSERT INTO webhook_outbox (webhook_url, job_id, run_id, payload, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (webhook_url, job_id, run_id, json.dumps(payload), due.isoformat(), now.isoformat()),
+    )
+    on_commit(wake_webhook_worker)
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter: a random delay in the upper half of the step."""
+    step = min(SETTINGS.webhook_backoff_max_seconds, SETTINGS.webhook_backoff_seconds * 2 ** (attempts - 1))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def _retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    value = response.headers.get("retry-after") if response is not None else None
+    if value and value.strip().isdigit():
+        return min(float(value), SETTINGS.webhook_backoff_max_seconds)
+    return None
+
+
+def claim_deliveries(limit: int, skip_urls: Sequence[str] = ()) -> List[Any]:
+    if limit <= 0:
+        return []
+    now = utc_now()
+    skip = f"AND webhook_url NOT IN ({', '.join('?' for _ in skip_urls)})" if skip_urls else ""
+    with transaction():
+        return fetch_all(
+            f"""
+            UPDATE webhook_outbox SET next_attempt_at = ?, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM webhook_outbox
+                WHERE status = 'pending' AND next_attempt_at <= ? {skip}
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING id, webhook_url, job_id, payload, attempts
+            """,
+            (after(CLAIM_SECONDS), now, *skip_urls, limit),
+        )
+
+
+def _next_due_in() -> float:
+    row = fetch_one("SELECT MIN(next_attempt_at) FROM webhook_outbox WHERE status = 'pending'")
+    if not row or not row[0]:
+        return POLL_SECONDS
+    due = (datetime.fromisoformat(row[0]) - datetime.now(timezone.utc)).total_seconds()
+    return min(POLL_SECONDS, max(0.05, due))
+
+
+def _mark_delivered(rows: Sequence[Any]) -> None:
+    now = utc_now()
+    ids = [row["id"] for row in rows]
+    job_ids = sorted({row["job_id"] for row in rows if row["job_id"]})
+    with transaction():
+        execute(
+            f"UPDATE webhook_outbox SET status = 'delivered', delivered_at = ?, last_error = NULL "
+            f"WHERE id IN ({', '.join('?' for _ in ids)})",
+            (now, *ids),
+        )
+        if job_ids:
+            execute(
+                f"UPDATE job_state SET last_notified_at = ? WHERE job_id IN ({', '.join('?' for _ in job_ids)})",
+                (now, *job_ids),
+            )
+
+
+def _mark_failed(rows: Sequence[Any], error: str, permanent: bool, retry_after: Optional[float]) -> None:
+    with transaction():
+        for row in rows:
+            if permanent or row["attempts"] >= SETTINGS.webhook_max_retries:
+                execute(
+                    "UPDATE webhook_outbox SET status = 'dead', last_error = ? WHERE id = ?",
+                    (error, row["id"]),
+                )
+                continue
+            delay = max(retry_after or 0.0, backoff_seconds(row["attempts"]))
+            execute(
+                "UPDATE webhook_outbox SET next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (after(delay), error, row["id"]),
+            )
+
+
+def _defer(rows: Sequence[Any], until: float) -> None:
+    """Hand claimed rows back untried (the endpoint's circuit opened meanwhile)."""
+    ids = [row["id"] for row in rows]
+    execute(
+        f"UPDATE webhook_outbox SET next_attempt_at = ?, attempts = attempts - 1 "
+        f"WHERE id IN ({', '.join('?' for _ in ids)})",
+        (datetime.fromtimestamp(until, timezone.utc).isoformat(), *ids),
+    )
+
+
+class _Circuit:
+    def __init__(self) -> None:
+        self.failures = 0
+        self.open_until = 0.0
+
+    def is_open(self, now: float) -> bool:
+        return self.open_until > now
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            self.failures = 0
+            self.open_until = 0.0
+            return
+        self.failures += 1
+        if self.failures >= SETTINGS.webhook_circuit_failures:
+            # After the pause one probe goes through; another failure reopens it.
+            self.open_until = time.time() + SETTINGS.webhook_circuit_seconds
+
+
+class WebhookWorker:
+    """Delivers queued alerts from ``webhook_outbox`` on its own event loop, so
+    runs never wait on customer endpoints.
+
+    Failed deliveries retry with exponential backoff and jitter until
+    WEBHOOK_MAX_RETRIES, then stay in the table as ``dead``. An endpoint that
+    fails WEBHOOK_CIRCUIT_FAILURES times in a row is skipped for
+    WEBHOOK_CIRCUIT_SECONDS. With WEBHOOK_BATCH_SIZE > 1, alerts due for the same
+    URL are sent together as ``{"alerts": [...]}``. Every API process and
+    scheduler worker may run one; claims keep them from sending the same row.
+    """
+
+    def __init__(self, concurrency: int, endpoint_concurrency: int, batch_size: int) -> None:
+        self.concurrency = max(1, concurrency)
+        self.endpoint_concurrency = max(1, endpoint_concurrency)
+        self.batch_size = max(1, batch_size)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._endpoints: Dict[str, asyncio.Semaphore] = {}
+        self._circuits: Dict[str, _Circuit] = defaultdict(_Circuit)
+        self._inflight = 0
+        self._stopped = False
+        self.delivered = 0
+        self.failed = 0
+        self.dead = 0
+        self.posts = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        ready = threading.Event()
+        loop = asyncio.new_event_loop()
+
+        def _run() -> None:
+            asyncio.set_event_loop(loop)
+            self._wake = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            loop.call_soon(ready.set)
+            loop.run_until_complete(self._run())
+            loop.run_until_complete(close_async_client())
+
+        self._thread = threading.Thread(target=_run, name="webhooks", daemon=True)
+        self._thread.start()
+        ready.wait()
+        self._loop = loop
+
+    def wake(self) -> None:
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    def shutdown(self) -> None:
+        self._stopped = True
+        self.wake()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+        self._loop = None
+
+    async def _run(self) -> None:
+        while not self._stopped:
+            now = time.time()
+            skip = [url for url, circuit in self._circuits.items() if circuit.is_open(now)]
+            capacity = self.concurrency * self.batch_size - self._inflight
+            try:
+                rows = await asyncio.to_thread(claim_deliveries, capacity, skip)
+            except Exception:
+                rows = []
+            by_url: Dict[str, List[Any]] = defaultdict(list)
+            for row in rows:
+                by_url[row["webhook_url"]].append(row)
+            for url, items in by_url.items():
+                for start in range(0, len(items), self.batch_size):
+                    group = items[start : start + self.batch_size]
+                    self._inflight += len(group)
+                    asyncio.ensure_future(self._deliver(url, group))
+            if rows and len(rows) == capacity:
+                await asyncio.sleep(0)
+                continue
+            self._wake.clear()
+            try:
+                timeout = await asyncio.to_thread(_next_due_in)
+            except Exception:
+                timeout = POLL_SECONDS
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _endpoint(self, url: str) -> asyncio.Semaphore:
+        if url not in self._endpoints:
+            self._endpoints[url] = asyncio.Semaphore(self.endpoint_concurrency)
+        return self._endpoints[url]
+
+    async def _deliver(self, url: str, rows: List[Any]) -> None:
         try:
-            with httpx.Client(timeout=10.0) as client:
-                resp = client.post(webhook_url, json=payload)
-                resp.raise_for_status()
-                return
-        except httpx.HTTPError:
-            if attempt >= SETTINGS.webhook_max_retries:
-                raise
-            time.sleep(SETTINGS.webhook_backoff_seconds * attempt)
+            async with self._endpoint(url), self._slots:
+                circuit = self._circuits[url]
+                if circuit.is_open(time.time()):
+                    await asyncio.to_thread(_defer, rows, circuit.open_until)
+                    return
+                payloads = [json.loads(row["payload"]) for row in rows]
+                body = payloads[0] if self.batch_size == 1 else {"alerts": payloads}
+                response: Optional[httpx.Response] = None
+                self.posts += 1
+                try:
+                    response = await get_async_client().post(url, json=body)
+                    response.raise_for_status()
+                except httpx.HTTPError as exc:
+                    status = response.status_code if response is not None else None
+                    permanent = status is not None and 400 <= status < 500 and status not in RETRYABLE_STATUS
+                    circuit.record(False)
+                    self.failed += len(rows)
+                    self.dead += sum(
+                        1 for row in rows if permanent or row["attempts"] >= SETTINGS.webhook_max_retries
+                    )
+                    await asyncio.to_thread(_mark_failed, rows, str(exc)[:500], permanent, _retry_after(response))
+                    return
+                circuit.record(True)
+                self.delivered += len(rows)
+                await asyncio.to_thread(_mark_delivered, rows)
+        finally:
+            self._inflight -= len(rows)
+            self.wake()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "running": self._thread is not None,
+            "inflight": self._inflight,
+            "posts": self.posts,
+            "delivered": self.delivered,
+            "failed_attempts": self.failed,
+            "dead_lettered": self.dead,
+            "open_circuits": sorted(url for url, circuit in self._circuits.items() if circuit.is_open(now)),
+        }
+
+
+_WORKER: Optional[WebhookWorker] = None
+_WORKER_LOCK = threading.Lock()
+
+
+def get_webhook_worker() -> WebhookWorker:
+    global _WORKER
+    with _WORKER_LOCK:
+        if _WORKER is None:
+            _WORKER = WebhookWorker(
+                concurrency=SETTINGS.webhook_concurrency,
+                endpoint_concurrency=SETTINGS.webhook_endpoint_concurrency,
+                batch_size=SETTINGS.webhook_batch_size,
+            )
+        return _WORKER
+
+
+def wake_webhook_worker() -> None:
+    if _WORKER is not None:
+        _WORKER.wake()
+
+
+def shutdown_webhook_worker() -> None:
+    global _WORKER
+    with _WORKER_LOCK:
+        worker, _WORKER = _WORKER, None
+    if worker is not None:
+        worker.shutdown()
+
+
+def retry_dead(ids: Optional[Sequence[int]] = None) -> int:
+    """Requeue dead-lettered deliveries (all of them, or just ``ids``) with a fresh retry budget."""
+    where = f"AND id IN ({', '.join('?' for _ in ids)})" if ids else ""
+    count = execute(
+        f"UPDATE webhook_outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'dead' {where}",
+        (utc_now(), *(ids or ())),
+    )
+    wake_webhook_worker()
+    return count
+
+
+def dead_letters(limit: int = 100) -> List[Dict[str, Any]]:
+    rows = fetch_all(
+        """
+        SELECT id, webhook_url, job_id, run_id, attempts, last_error, created_at
+        FROM webhook_outbox WHERE status = 'dead' ORDER BY id DESC LIMIT ?
+        """,
+        (limit,),
+    )
+    return [dict(row) for row in rows]
+
+
+def prune_outbox(days: Optional[int] = None) -> int:
+    days = SETTINGS.retention_days if days is None else days
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    return execute("DELETE FROM webhook_outbox WHERE status IN ('delivered', 'dead') AND created_at < ?", (cutoff,))
+
+
+def webhook_stats() -> Dict[str, Any]:
+    now = utc_now()
+    row = fetch_one(
+        """
+        SELECT
+            SUM(status = 'pending') AS pending,
+            SUM(status = 'pending' AND next_attempt_at <= ?) AS due,
+            SUM(status = 'pending' AND attempts > 0) AS retrying,
+            SUM(status = 'dead') AS dead,
+            MIN(CASE WHEN status = 'pending' THEN created_at END) AS oldest_pending
+        FROM webhook_outbox
+        """,
+        (now,),
+    )
+    worker = _WORKER.stats() if _WORKER is not None else {"running": False}
+    return {
+        "pending": row["pending"] or 0,
+        "due": row["due"] or 0,
+        "retrying": row["retrying"] or 0,
+        "dead": row["dead"] or 0,
+        "oldest_pending": row["oldest_pending"],
+        "worker": worker,
+    }
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import SETTINGS
+from static.scrape import BACKENDS, lxml_html, parse_page
+
+
+class ParseError(RuntimeError):
+    pass
+
+
+class ParserPool:
+    """Runs ``parse_page`` in worker processes so large pages don't hold the GIL
+    of the scheduler and API threads.
+
+    At most ``workers`` pages are parsed at once and ``queue_size`` callers may
+    wait for a slot; beyond that ``parse`` fails fast. A page that takes longer
+    than ``timeout`` seconds gets its worker killed and raises ParseError.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float, backend: str) -> None:
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.backend = backend
+        self._slots = threading.Semaphore(self.workers)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.waiting = 0
+        self.parsed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that holds SQLite connections and
+                # event-loop threads is not safe.
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.restarts += 1
+        # ProcessPoolExecutor can't cancel a running task; kill its workers instead.
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def parse(self, html: str, base_url: str, links: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            if self.waiting >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise ParseError("parser queue is full")
+            self.waiting += 1
+        try:
+            with self._slots:
+                for attempt in range(2):
+                    executor = self._pool()
+                    future = executor.submit(parse_page, html, base_url, self.backend, links)
+                    try:
+                        result = future.result(timeout=self.timeout)
+                    except FutureTimeout:
+                        self.timeouts += 1
+                        self._restart(executor)
+                        raise ParseError(f"parsing {base_url} took longer than {self.timeout}s")
+                    except BrokenProcessPool:
+                        # Another page's timeout killed the pool under us; retry once.
+                        self._restart(executor)
+                        if attempt:
+                            raise
+                        continue
+                    self.parsed += 1
+                    return result
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        raise ParseError("parser pool unavailable")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "parsed": self.parsed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+        }
+
+
+_POOL: Optional[ParserPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_parser_pool() -> Optional[ParserPool]:
+    """None when PARSE_WORKERS=0: pages are parsed on the calling thread."""
+    global _POOL
+    if SETTINGS.parse_workers <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ParserPool(
+                workers=SETTINGS.parse_workers,
+                queue_size=SETTINGS.parse_queue_size,
+                timeout=SETTINGS.parse_timeout_seconds,
+                backend=SETTINGS.parse_backend,
+            )
+        return _POOL
+
+
+def shutdown_parser_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def parse_html(html: str, base_url: str, links: bool = False) -> Dict[str, Any]:
+    pool = get_parser_pool()
+    if pool is None:
+        return parse_page(html, base_url, SETTINGS.parse_backend, links)
+    return pool.parse(html, base_url, links)
+
+
+def parser_stats() -> Dict[str, Any]:
+    pool = get_parser_pool()
+    if pool is None:
+        return {"backend": SETTINGS.parse_backend, "workers": 0, "lxml_available": lxml_html is not None}
+    return {**pool.stats(), "lxml_available": lxml_html is not None}
+
+
+# Rough shape of real pages: most of the HTML is head scripts/styles, navigation
+# and markup around a much smaller amount of text. Sizes follow typical HTML
+# document weights (median ~30 KB, long tail into megabytes).
+CORPUS_SIZES = {"small": 15_000, "median": 40_000, "large": 250_000, "huge": 1_500_000}
+
+_WORDS = (
+    "product review shipping order account support guide release notes pricing team "
+    "customer service community forum article update security privacy policy terms "
+    "download install configure deploy monitor dashboard report analytics search"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(6, 24))]
+    if rng.random() < 0.3:
+        i = rng.randrange(len(words))
+        words[i] = f'<a href="/{words[i]}?id={rng.randint(1, 9999)}">{words[i]}</a>'
+    if rng.random() < 0.2:
+        i = rng.randrange(len(words))
+        words[i] = f"<strong>{words[i]}</strong>"
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_page(rng: random.Random, size: int) -> str:
+    head = [
+        "<!DOCTYPE html><html lang=\"en\"><head><meta charset=\"utf-8\"><title>Example &amp; Co</title>",
+        "<style>" + "".join(f".c{i}{{margin:{i}px;padding:{i % 7}px}}" for i in range(200)) + "</style>",
+        "<script>window.dataLayer=[" + ",".join(f'{{"k":{i}}}' for i in range(150)) + "];</script>",
+        "</head><body>",
+    ]
+    nav = "<nav><ul>" + "".join(f'<li><a href="/s{i}">{rng.choice(_WORDS)}</a></li>' for i in range(30)) + "</ul></nav>"
+    parts = head + [nav]
+    total = sum(len(part) for part in parts)
+    n = 0
+    while total < size:
+        n += 1
+        block = rng.random()
+        if block < 0.45:
+            chunk = f"<p class=\"c{n % 200}\">{_sentence(rng)} {_sentence(rng)}</p>"
+        elif block < 0.55:
+            level = rng.randint(1, 3)
+            chunk = f"<h{level}>{_sentence(rng)}</h{level}>"
+        elif block < 0.7:
+            chunk = "<ul>" + "".join(f"<li>{_sentence(rng)}</li>" for _ in range(rng.randint(2, 6))) + "</ul>"
+        elif block < 0.8:
+            chunk = (
+                f'<figure><img src="/img/{n}.jpg" alt="{rng.choice(_WORDS)} photo" loading="lazy">'
+                f'<noscript><img src="/img/{n}-full.jpg"></noscript><figcaption>{_sentence(rng)}</figcaption></figure>'
+            )
+        elif block < 0.9:
+            rows = "".join(
+                f"<tr><td>{rng.choice(_WORDS)}</td><td>{rng.randint(1, 999)}</td></tr>" for _ in range(rng.randint(3, 10))
+            )
+            chunk = f"<table><tbody>{rows}</tbody></table>"
+        elif block < 0.95:
+            chunk = f"<!-- block {n} --><div class=\"ad\"><script>render({n});</script><span>{_sentence(rng)}</span></div>"
+        else:
+            chunk = f"<div><div><section><p>{_sentence(rng)}<br>{_sentence(rng)}</p></section></div></div>"
+        parts.append(chunk)
+        total += len(chunk)
+    parts.append("<footer><p>&copy; Example &amp; Co &nbsp;All rights reserved.</p></footer></body></html>")
+    return "".join(parts)
+
+
+def load_corpus(directory: Optional[str], pages_per_size: int, seed: int = 7) -> List[Tuple[str, str]]:
+    if directory:
+        return [
+            (path.name, path.read_text(encoding="utf-8", errors="replace"))
+            for path in sorted(Path(directory).glob("*.htm*"))
+        ]
+    rng = random.Random(seed)
+    return [
+        (f"{label}-{i}", synthetic_page(rng, size))
+        for label, size in CORPUS_SIZES.items()
+        for i in range(pages_per_size)
+    ]
+
+
+def _bucket(name: str, html: str) -> str:
+    label = name.split("-")[0]
+    if label in CORPUS_SIZES:
+        return label
+    return next((label for label, size in CORPUS_SIZES.items() if len(html) <= size * 1.5), "huge")
+
+
+def benchmark(corpus: List[Tuple[str, str]], backends: List[str], workers: int) -> Dict[str, Any]:
+    base_url = "https://example.com/"
+    report: Dict[str, Any] = {"pages": len(corpus), "backends": {}}
+    reference = {name: parse_page(html, base_url, "html.parser") for name, html in corpus}
+    sizes: Dict[str, List[int]] = {}
+    for name, html in corpus:
+        sizes.setdefault(_bucket(name, html), []).append(len(html))
+    report["kb_mean"] = {bucket: round(statistics.mean(values) / 1000) for bucket, values in sizes.items()}
+    for backend in backends:
+        timings: Dict[str, List[float]] = {}
+        mismatches = []
+        for name, html in corpus:
+            start = time.perf_counter()
+            result = parse_page(html, base_url, backend)
+            timings.setdefault(_bucket(name, html), []).append((time.perf_counter() - start) * 1000)
+            if result != reference[name]:
+                mismatches.append(name)
+        report["backends"][backend] = {
+            "ms_median": {bucket: round(statistics.median(values), 2) for bucket, values in timings.items()},
+            "mismatches": mismatches[:20],
+            "mismatch_count": len(mismatches),
+        }
+    if workers > 0:
+        # Throughput with N concurrent callers: threads share the GIL, the pool does not.
+        for backend in backends:
+            pool = ParserPool(workers, len(corpus), 120, backend)
+            pool.parse(corpus[0][1], base_url)  # start the workers outside the timing
+            for label, parse in (
+                ("threads", lambda item, b=backend: parse_page(item[1], base_url, b)),
+                ("processes", lambda item: pool.parse(item[1], base_url)),
+            ):
+                with ThreadPoolExecutor(workers) as executor:
+                    start = time.perf_counter()
+                    list(executor.map(parse, corpus))
+                    elapsed = time.perf_counter() - start
+                report["backends"][backend][f"{label}_x{workers}_pages_per_second"] = round(len(corpus) / elapsed, 1)
+            pool.shutdown()
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark HTML parsing backends on a page corpus.")
+    parser.add_argument("--dir", default=None, help="Directory of saved .html pages (default: synthetic corpus)")
+    parser.add_argument("--pages", type=int, default=10, help="Synthetic pages per size bucket (default: 10)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent callers for the pool comparison (0 to skip)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    backends = [backend for backend in BACKENDS if backend != "lxml" or lxml_html is not None]
+    corpus = load_corpus(args.dir, args.pages)
+    print(json.dumps(benchmark(corpus, backends, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
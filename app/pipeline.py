@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Optional, Set
+
+from app.analysis import analyze_content_async
+from app.config import SETTINGS
+from app.http_clients import close_async_client
+from app.runner import (
+    batch_pending,
+    fail_run,
+    fetch_validators,
+    finish_unchanged,
+    image_alts_from,
+    image_urls_from,
+    load_job,
+    load_state,
+    plan_analysis,
+    queue_for_batch,
+    record_and_notify,
+    run_crawl,
+    start_run,
+)
+from app.routing import choose_route, record_route
+from app.scrapers import scrape_url_async
+from app.utils import block_hashes, content_hash
+
+
+class Pipeline:
+    """Runs scrape -> analyze -> record for many jobs on a single event loop.
+
+    Each I/O stage has its own semaphore so a slow stage (e.g. the LLM) can't
+    starve the others. SQLite calls run on a small dedicated thread pool.
+    """
+
+    def __init__(
+        self,
+        *,
+        scrape_concurrency: int = 32,
+        image_concurrency: int = 64,
+        llm_concurrency: int = 8,
+        db_threads: int = 4,
+    ) -> None:
+        self._limits = {
+            "scrape": scrape_concurrency,
+            "images": image_concurrency,
+            "llm": llm_concurrency,
+        }
+        self._db_threads = db_threads
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Set[str] = set()
+        self._inflight_lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(
+                ThreadPoolExecutor(max_workers=self._db_threads, thread_name_prefix="pipeline-db")
+            )
+            ready = threading.Event()
+
+            def _run() -> None:
+                asyncio.set_event_loop(loop)
+                self._semaphores = {
+                    stage: asyncio.Semaphore(max(1, limit)) for stage, limit in self._limits.items()
+                }
+                loop.call_soon(ready.set)
+                loop.run_forever()
+                loop.run_until_complete(close_async_client())
+
+            self._thread = threading.Thread(target=_run, name="pipeline", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    def submit(self, job_id: str) -> Optional[Future]:
+        with self._inflight_lock:
+            if job_id in self._inflight:
+                return None
+            self._inflight.add(job_id)
+        future = asyncio.run_coroutine_threadsafe(self.run_job(job_id), self._ensure_loop())
+        future.add_done_callback(lambda _: self._release(job_id))
+        return future
+
+    def _release(self, job_id: str) -> None:
+        with self._inflight_lock:
+            self._inflight.discard(job_id)
+
+    async def run_job(self, job_id: str) -> Dict[str, Any]:
+        job = await asyncio.to_thread(load_job, job_id)
+        if job["status"] != "active":
+            return {"status": "skipped", "reason": "paused"}
+        if job.get("llm_mode") == "batch" and await asyncio.to_thread(batch_pending, job_id):
+            return {"status": "skipped", "reason": "batch_pending"}
+
+        run_id = await asyncio.to_thread(start_run, job_id)
+        try:
+            state = await asyncio.to_thread(load_state, job_id)
+            if job["mode"] == "crawl":
+                # Crawls fan out on their own fetch pool; this loop only waits for them.
+                result = await asyncio.to_thread(run_crawl, job, run_id, state)
+                self.completed += 1
+                return result
+            route = await asyncio.to_thread(choose_route, job)
+            validators = None if route.path == "probe" else fetch_validators(state)
+            async with self._semaphores["scrape"]:
+                scraped = await scrape_url_async(job["url"], job["mode"], validators, route.path)
+            await asyncio.to_thread(record_route, job, run_id, route, scraped.pop("scrape", None))
+            if scraped.get("unchanged") and state:
+                result = await asyncio.to_thread(
+                    partial(finish_unchanged, fetch=scraped.get("fetch")),
+                    job_id,
+                    run_id,
+                    state["last_hash"],
+                    state,
+                )
+                self.completed += 1
+                return result
+
+            text_lines = scraped.get("text") or []
+            images = image_urls_from(scraped)
+
+            raw_hash = content_hash(text_lines, images)
+            if state and state["last_hash"] == raw_hash:
+                result = await asyncio.to_thread(
+                    partial(finish_unchanged, fetch=scraped.get("fetch")), job_id, run_id, raw_hash, state
+                )
+                self.completed += 1
+                return result
+
+            plan = await asyncio.to_thread(
+                plan_analysis, job_id, state, text_lines, images, image_alts_from(scraped)
+            )
+            snapshot = {"fetch": scraped.get("fetch"), "blocks": block_hashes(text_lines), "images": images}
+            if plan["mode"] == "reuse":
+                result = await asyncio.to_thread(
+                    partial(finish_unchanged, **snapshot), job_id, run_id, raw_hash, state, "reused"
+                )
+                self.completed += 1
+                return result
+
+            if plan["verdict"] is None and job.get("llm_mode") == "batch":
+                result = await asyncio.to_thread(
+                    queue_for_batch,
+                    job,
+                    run_id,
+                    raw_hash,
+                    plan,
+                    text_lines,
+                    images,
+                    scraped.get("fetch"),
+                )
+                self.completed += 1
+                return result
+
+            analysis = plan["verdict"] or await analyze_content_async(
+                job["url"],
+                plan["text"],
+                plan["images"],
+                plan["previous"],
+                plan["alts"],
+                image_limit=self._semaphores["images"],
+                llm_limit=self._semaphores["llm"],
+            )
+            await asyncio.to_thread(
+                partial(record_and_notify, **snapshot),
+                job,
+                run_id,
+                raw_hash,
+                analysis,
+                state,
+                plan["mode"],
+            )
+
+            self.completed += 1
+            return {"status": "success", "run_id": run_id, "risk_level": analysis.get("risk_level", "none")}
+        except Exception as exc:
+            self.failed += 1
+            return await asyncio.to_thread(fail_run, run_id, exc)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": len(self._inflight),
+            "completed": self.completed,
+            "failed": self.failed,
+            "stages": {
+                stage: {
+                    "limit": limit,
+                    "available": self._semaphores[stage]._value if stage in self._semaphores else limit,
+                }
+                for stage, limit in self._limits.items()
+            },
+        }
+
+    def shutdown(self) -> None:
+        if self._loop is None:
+            return
+        loop = self._loop
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._loop = None
+        self._thread = None
+
+
+_PIPELINE: Optional[Pipeline] = None
+_PIPELINE_LOCK = threading.Lock()
+
+
+def get_pipeline() -> Pipeline:
+    global _PIPELINE
+    with _PIPELINE_LOCK:
+        if _PIPELINE is None:
+            _PIPELINE = Pipeline(
+                scrape_concurrency=SETTINGS.pipeline_scrape_concurrency,
+                image_concurrency=SETTINGS.pipeline_image_concurrency,
+                llm_concurrency=SETTINGS.pipeline_llm_concurrency,
+            )
+        return _PIPELINE
+
+
+def shutdown_pipeline() -> None:
+    global _PIPELINE
+    with _PIPELINE_LOCK:
+        pipeline, _PIPELINE = _PIPELINE, None
+    if pipeline is not None:
+        pipeline.shutdown()
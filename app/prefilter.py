@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+from app.config import SETTINGS
+
+# term -> (category, weight). Weights are rough: ~1 ambiguous, ~3 strong signal.
+DEFAULT_RISK_TERMS: Dict[str, Tuple[str, float]] = {
+    "gun": ("weapons", 1.5),
+    "guns": ("weapons", 1.5),
+    "handgun": ("weapons", 2.5),
+    "pistol": ("weapons", 2.0),
+    "rifle": ("weapons", 2.0),
+    "shotgun": ("weapons", 2.0),
+    "firearm": ("weapons", 2.5),
+    "firearms": ("weapons", 2.5),
+    "ar-15": ("weapons", 3.0),
+    "ak-47": ("weapons", 3.0),
+    "ammo": ("weapons", 2.0),
+    "ammunition": ("weapons", 2.0),
+    "silencer": ("weapons", 3.0),
+    "suppressor": ("weapons", 2.5),
+    "ghost gun": ("weapons", 3.5),
+    "80% lower": ("weapons", 3.5),
+    "auto sear": ("weapons", 4.0),
+    "bump stock": ("weapons", 3.0),
+    "switchblade": ("weapons", 2.0),
+    "brass knuckles": ("weapons", 2.0),
+    "explosive": ("explosives", 2.5),
+    "explosives": ("explosives", 2.5),
+    "detonator": ("explosives", 3.5),
+    "pipe bomb": ("explosives", 4.0),
+    "thermite": ("explosives", 2.5),
+    "tannerite": ("explosives", 2.5),
+    "cocaine": ("drugs", 3.0),
+    "heroin": ("drugs", 3.0),
+    "fentanyl": ("drugs", 3.5),
+    "meth": ("drugs", 2.5),
+    "methamphetamine": ("drugs", 3.0),
+    "mdma": ("drugs", 3.0),
+    "ecstasy": ("drugs", 2.0),
+    "lsd": ("drugs", 2.5),
+    "ketamine": ("drugs", 2.5),
+    "xanax": ("drugs", 2.0),
+    "oxycodone": ("drugs", 2.5),
+    "oxycontin": ("drugs", 2.5),
+    "percocet": ("drugs", 2.5),
+    "adderall": ("drugs", 1.5),
+    "psilocybin": ("drugs", 2.5),
+    "magic mushrooms": ("drugs", 2.5),
+    "cannabis": ("drugs", 1.0),
+    "marijuana": ("drugs", 1.0),
+    "weed": ("drugs", 0.8),
+    "thc": ("drugs", 1.0),
+    "crack": ("drugs", 1.0),
+    "molly": ("drugs", 1.0),
+    "steroids": ("drugs", 1.5),
+    "counterfeit": ("fraud", 2.0),
+    "fake id": ("fraud", 3.0),
+    "fake ids": ("fraud", 3.0),
+    "cloned cards": ("fraud", 3.5),
+    "cvv dumps": ("fraud", 4.0),
+}
+
+# Terms that make a nearby risk term look promotional/transactional (>1) or
+# neutral (<1). Applied when within ``window`` characters of a risk match.
+DEFAULT_CONTEXT_TERMS: Dict[str, float] = {
+    "buy": 1.8,
+    "order": 1.5,
+    "for sale": 2.0,
+    "price": 1.6,
+    "shipping": 1.7,
+    "discreet": 2.5,
+    "stealth": 2.0,
+    "in stock": 1.8,
+    "add to cart": 2.2,
+    "checkout": 1.8,
+    "bitcoin": 1.8,
+    "no prescription": 2.5,
+    "how to make": 2.2,
+    "step by step": 1.6,
+    "recipe": 1.5,
+    "dm me": 2.0,
+    "telegram": 1.6,
+    "wickr": 2.2,
+    "history": 0.6,
+    "museum": 0.5,
+    "research": 0.6,
+    "study": 0.7,
+    "policy": 0.6,
+    "prevention": 0.5,
+    "treatment": 0.6,
+    "news": 0.7,
+    "court": 0.7,
+    "arrested": 0.6,
+}
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Compile literal words into one regex shaped like a trie.
+
+    Python's ``re`` tries alternatives one by one; sharing prefixes means each
+    position is rejected after a single character test in the common case,
+    which gives Aho-Corasick-like scanning cost in C.
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+def _compile(words: Iterable[str]) -> Optional[Pattern[str]]:
+    words = [word.lower() for word in words if word]
+    if not words:
+        return None
+    return re.compile(r"(?<![\w])" + "(?:" + _trie_pattern(words) + r")(?![\w])", re.IGNORECASE)
+
+
+@dataclass
+class Match:
+    term: str
+    category: str
+    start: int
+    end: int
+    weight: float
+
+
+@dataclass
+class PrefilterResult:
+    score: float
+    matches: List[Match] = field(default_factory=list)
+    windows: List[str] = field(default_factory=list)
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted({match.category for match in self.matches})
+
+
+class Prefilter:
+    def __init__(
+        self,
+        risk_terms: Dict[str, Tuple[str, float]],
+        context_terms: Dict[str, float],
+        *,
+        window: int = 160,
+        max_hits_per_term: int = 3,
+    ) -> None:
+        self.risk_terms = {term.lower(): value for term, value in risk_terms.items()}
+        self.context_terms = {term.lower(): value for term, value in context_terms.items()}
+        self.window = window
+        self.max_hits_per_term = max_hits_per_term
+        self._risk_re = _compile(self.risk_terms)
+        self._context_re = _compile(self.context_terms)
+
+    def _context_factor(self, start: int, end: int, positions: List[int], factors: List[float]) -> float:
+        lo = bisect.bisect_left(positions, start - self.window)
+        hi = bisect.bisect_right(positions, end + self.window)
+        if lo == hi:
+            return 1.0
+        nearby = factors[lo:hi]
+        # Strongest promotional and strongest neutralizing context both count.
+        return max(max(nearby), 1.0) * min(min(nearby), 1.0)
+
+    def _windows(self, text: str, matches: List[Match], limit: int) -> List[str]:
+        spans: List[Tuple[int, int]] = []
+        for match in matches:
+            start = max(0, match.start - self.window)
+            end = min(len(text), match.end + self.window)
+            if spans and start <= spans[-1][1]:
+                spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+            else:
+                spans.append((start, end))
+        return [" ".join(text[start:end].split()) for start, end in spans[:limit]]
+
+    def scan(self, text: str, *, max_windows: int = 12) -> PrefilterResult:
+        if self._risk_re is None or not text:
+            return PrefilterResult(score=0.0)
+        matches: List[Match] = []
+        for found in self._risk_re.finditer(text):
+            term = found.group(0).lower()
+            category, weight = self.risk_terms.get(term, ("other", 1.0))
+            matches.append(Match(term, category, found.start(), found.end(), weight))
+        if not matches:
+            return PrefilterResult(score=0.0)
+
+        positions: List[int] = []
+        factors: List[float] = []
+        if self._context_re is not None:
+            for found in self._context_re.finditer(text):
+                positions.append(found.start())
+                factors.append(self.context_terms.get(found.group(0).lower(), 1.0))
+
+        score = 0.0
+        hits: Dict[str, int] = {}
+        for match in matches:
+            hits[match.term] = hits.get(match.term, 0) + 1
+            if hits[match.term] > self.max_hits_per_term:
+                continue
+            factor = self._context_factor(match.start, match.end, positions, factors)
+            # Repeats of the same term add less each time.
+            score += match.weight * factor / math.sqrt(hits[match.term])
+        return PrefilterResult(
+            score=round(score, 3),
+            matches=matches,
+            windows=self._windows(text, matches, max_windows),
+        )
+
+    def scan_page(self, text_lines: List[str], alt_texts: Optional[List[str]] = None) -> PrefilterResult:
+        return self.scan("\n".join([*text_lines, *(alt_texts or [])]))
+
+
+def _load_terms(path: Optional[Path]) -> Tuple[Dict[str, Tuple[str, float]], Dict[str, float]]:
+    if not path:
+        return DEFAULT_RISK_TERMS, DEFAULT_CONTEXT_TERMS
+    data = json.loads(path.read_text(encoding="utf-8"))
+    risk = {term: (value[0], float(value[1])) for term, value in data.get("risk", {}).items()}
+    context = {term: float(value) for term, value in data.get("context", {}).items()}
+    return risk or DEFAULT_RISK_TERMS, context or DEFAULT_CONTEXT_TERMS
+
+
+@lru_cache(maxsize=1)
+def get_prefilter() -> Prefilter:
+    path = Path(SETTINGS.prefilter_terms_path) if SETTINGS.prefilter_terms_path else None
+    risk, context = _load_terms(path)
+    return Prefilter(risk, context, window=SETTINGS.prefilter_window_chars)
+
+
+_FILLER = (
+    "the quick brown fox jumps over the lazy dog while our team ships new features every week "
+    "read the documentation to learn about configuration deployment and monitoring of services "
+    "customers love the product because it is fast reliable and easy to integrate with existing tools"
+).split()
+
+
+def _synthetic_page(rng: random.Random, chars: int, risky: bool) -> List[str]:
+    terms = list(DEFAULT_RISK_TERMS) + list(DEFAULT_CONTEXT_TERMS)
+    lines: List[str] = []
+    size = 0
+    while size < chars:
+        words = [rng.choice(_FILLER) for _ in range(rng.randint(8, 30))]
+        if risky and rng.random() < 0.05:
+            words.insert(rng.randrange(len(words)), rng.choice(terms))
+        line = " ".join(words)
+        lines.append(line)
+        size += len(line) + 1
+    return lines
+
+
+def benchmark(pages: int, chars: int, risky_ratio: float, seed: int = 7) -> Dict[str, float]:
+    rng = random.Random(seed)
+    corpus = [_synthetic_page(rng, chars, rng.random() < risky_ratio) for _ in range(pages)]
+    prefilter = get_prefilter()
+    start = time.perf_counter()
+    flagged = 0
+    for lines in corpus:
+        if prefilter.scan_page(lines).score >= SETTINGS.prefilter_threshold:
+            flagged += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "pages": pages,
+        "chars_per_page": chars,
+        "seconds": round(elapsed, 3),
+        "pages_per_minute": round(pages / elapsed * 60) if elapsed else float("inf"),
+        "mb_per_second": round(pages * chars / elapsed / 1e6, 2) if elapsed else float("inf"),
+        "flagged": flagged,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the local risk pre-filter on one core.")
+    parser.add_argument("--pages", type=int, default=5000, help="Number of synthetic pages (default: 5000)")
+    parser.add_argument("--chars", type=int, default=12000, help="Characters per page (default: 12000)")
+    parser.add_argument(
+        "--risky-ratio", type=float, default=0.2, help="Share of pages with risk terms (default: 0.2)"
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    print(json.dumps(benchmark(args.pages, args.chars, args.risky_ratio), indent=2))
+
+
+if __name__ == "__main__":
+    main()
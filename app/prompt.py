@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import io
+import json
+import math
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import SETTINGS
+from app.image_cache import IMAGE_CACHE, CachedImage
+from app.prefilter import get_prefilter
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+SYSTEM_PROMPT = "You are a content safety classifier. Respond with JSON only."
+
+INSTRUCTIONS = (
+    "You are a content safety analyst. First infer the website context (e.g., portfolio, "
+    "e-commerce, news, documentation, hobby, research, community). Then assess risk ONLY "
+    "if the content is promotional, instructional, transactional, or directly depicting "
+    "harmful items. Do NOT flag neutral mentions in academic, historical, portfolio, or "
+    "news contexts unless there is clear promotion or instruction.\n\n"
+    "Return ONLY valid JSON with keys:\n"
+    "- site_context: short string\n"
+    "- risk_level: none|low|high\n"
+    "- flags: array of strings\n"
+    "- evidence: array of objects with fields {type, snippet, rationale}\n"
+    "- summary: 1-3 sentences explaining the decision in plain language\n\n"
+)
+
+# Anthropic only caches a prefix above a model-specific minimum and ignores the
+# cache_control marker below it. The stock system prompt and instructions are
+# far shorter, so PROMPT_CACHE only marks them once they grow past the minimum.
+CACHE_MIN_TOKENS = 1024
+CACHE_MIN_TOKENS_HAIKU = 2048
+
+IMAGE_MAX_EDGE = 1568
+IMAGE_MAX_PIXELS = 1_150_000
+DEFAULT_IMAGE_TOKENS = 1600
+MIN_CLIP_TOKENS = 24
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_GAP = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Claude token count: about one token per four word characters,
+    one per punctuation mark. Errs slightly high for English prose."""
+    count = 0
+    for piece in _PIECE_RE.findall(text):
+        count += math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == "_" else 1
+    return count
+
+
+def cache_min_tokens(model: str) -> int:
+    return CACHE_MIN_TOKENS_HAIKU if "haiku" in model else CACHE_MIN_TOKENS
+
+
+def prefix_tokens() -> int:
+    """Estimated size of the fixed prefix (system prompt plus instructions)."""
+    return estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(INSTRUCTIONS)
+
+
+def image_tokens(image: CachedImage) -> int:
+    """Tokens Claude bills for an image: pixels / 750 after its resize to fit
+    1568px on the long edge and ~1.15 megapixels."""
+    if Image is None:
+        return DEFAULT_IMAGE_TOKENS
+    try:
+        with Image.open(io.BytesIO(image.data)) as img:
+            width, height = img.size
+    except Exception:
+        return DEFAULT_IMAGE_TOKENS
+    if not width or not height:
+        return DEFAULT_IMAGE_TOKENS
+    scale = min(1.0, IMAGE_MAX_EDGE / max(width, height), math.sqrt(IMAGE_MAX_PIXELS / (width * height)))
+    return max(1, math.ceil((width * scale) * (height * scale) / 750))
+
+
+def _looks_like_heading(line: str) -> bool:
+    return len(line) <= 80 and len(line.split()) <= 12 and not line.rstrip().endswith((".", ",", ";", ":", "!", "?"))
+
+
+def block_salience(line: str) -> float:
+    score = 1.0
+    hit = get_prefilter().scan(line, max_windows=0).score
+    if hit:
+        score += 2.0 + hit
+    if _looks_like_heading(line):
+        score += 1.0
+    if len(line) < 20:
+        score -= 0.5
+    return score
+
+
+def _clip(text: str, budget: int) -> Tuple[str, int]:
+    """Longest prefix of whole sentences (or, failing that, words) within ``budget``."""
+    kept: List[str] = []
+    used = 0
+    for sentence in _SENTENCE_RE.split(text):
+        cost = estimate_tokens(sentence)
+        if used + cost > budget:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return " ".join(kept), used
+    for word in text.split():
+        cost = estimate_tokens(word)
+        if used + cost > budget:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept), used
+
+
+def select_text(blocks: List[str], budget: int) -> Tuple[str, int, int]:
+    """Pick blocks by salience until ``budget`` tokens are spent and return them
+    in page order with gaps marked. Returns (text, tokens, dropped_blocks)."""
+    costs = [estimate_tokens(block) for block in blocks]
+    if sum(costs) <= budget:
+        return "\n".join(blocks), sum(costs), 0
+
+    order = sorted(range(len(blocks)), key=lambda i: (-block_salience(blocks[i]), i))
+    chosen: Dict[int, str] = {}
+    used = 0
+    for index in order:
+        remaining = budget - used
+        if remaining < MIN_CLIP_TOKENS:
+            break
+        # +1 per block covers the gap marker that may precede it.
+        if costs[index] + 1 <= remaining:
+            chosen[index] = blocks[index]
+            used += costs[index] + 1
+            continue
+        clipped, cost = _clip(blocks[index], remaining - 2)
+        if clipped:
+            chosen[index] = clipped + " " + _GAP
+            used += cost + 2
+
+    lines: List[str] = []
+    last = -1
+    for index in sorted(chosen):
+        if index != last + 1:
+            lines.append(_GAP)
+        lines.append(chosen[index])
+        last = index
+    if last != len(blocks) - 1:
+        lines.append(_GAP)
+    text = "\n".join(lines)
+    return text, estimate_tokens(text), len(blocks) - len(chosen)
+
+
+def rank_image_urls(image_urls: List[str], alts: Optional[Dict[str, str]] = None) -> List[str]:
+    """Order image URLs so those with risky or descriptive alt text are fetched first."""
+    alts = alts or {}
+    prefilter = get_prefilter()
+
+    def score(item: Tuple[int, str]) -> Tuple[float, int]:
+        index, url = item
+        alt = alts.get(url, "")
+        value = prefilter.scan(alt, max_windows=0).score * 2 if alt else 0.0
+        if alt:
+            value += 1.0
+        return (-value, index)
+
+    return [url for _, url in sorted(enumerate(image_urls), key=score)]
+
+
+def select_images(images: List[CachedImage], budget: int) -> Tuple[List[CachedImage], int]:
+    chosen: List[CachedImage] = []
+    used = 0
+    for image in images:
+        cost = image_tokens(image)
+        if used + cost > budget:
+            continue
+        chosen.append(image)
+        used += cost
+    return chosen, used
+
+
+def _previous_section(previous: Optional[Dict[str, Any]]) -> str:
+    if not previous:
+        return ""
+    verdict = {
+        key: previous.get(key)
+        for key in ("site_context", "risk_level", "flags", "evidence", "summary")
+    }
+    return (
+        "This page was analyzed before. Previous verdict for the WHOLE page:\n"
+        f"{json.dumps(verdict, ensure_ascii=False)}\n"
+        "Only the text blocks and images below were added or changed since then; all other "
+        "content is unchanged. Return the updated verdict for the whole page: keep prior "
+        "flags and evidence that still apply and add anything new.\n\n"
+    )
+
+
+def _image_section(images: List[CachedImage], total_urls: int, alts: Dict[str, str]) -> str:
+    if not total_urls:
+        return ""
+    lines = [f"Images attached ({len(images)} of {total_urls} on the page):"]
+    for number, image in enumerate(images, start=1):
+        alt = alts.get(image.url)
+        lines.append(f"{number}. {image.url}" + (f" (alt: {alt})" if alt else ""))
+    return "\n".join(lines) + "\n"
+
+
+def _image_block(image: CachedImage) -> Dict[str, Any]:
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": image.media_type,
+            "data": base64.b64encode(image.data).decode("ascii"),
+        },
+    }
+
+
+def stash_images(params: Dict[str, Any], image_hashes: List[str]) -> Dict[str, Any]:
+    """Replace attached image data with references to the image cache.
+
+    Queued batch requests keep only these references; ``inline_images`` reads
+    the bytes back when the batch is submitted. ``image_hashes`` are in the
+    order ``build_params`` attached the images.
+    """
+    hashes = iter(image_hashes)
+    content = []
+    for block in params["messages"][0]["content"]:
+        if block["type"] == "image":
+            block = {
+                "type": "image",
+                "source": {
+                    "type": "image_cache",
+                    "media_type": block["source"]["media_type"],
+                    "content_hash": next(hashes),
+                },
+            }
+        content.append(block)
+    return {**params, "messages": [{"role": "user", "content": content}]}
+
+
+def inline_images(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Undo ``stash_images``. Images evicted from the cache meanwhile are dropped."""
+    content = []
+    for block in params["messages"][0]["content"]:
+        if block["type"] == "image" and block["source"]["type"] == "image_cache":
+            data = IMAGE_CACHE.read(block["source"]["content_hash"])
+            if data is None:
+                continue
+            block = {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": block["source"]["media_type"],
+                    "data": base64.b64encode(data).decode("ascii"),
+                },
+            }
+        content.append(block)
+    return {**params, "messages": [{"role": "user", "content": content}]}
+
+
+def build_params(
+    url: str,
+    text_lines: List[str],
+    image_urls: List[str],
+    images: List[CachedImage],
+    previous: Optional[Dict[str, Any]] = None,
+    alts: Optional[Dict[str, str]] = None,
+) -> Tuple[Dict[str, Any], List[CachedImage]]:
+    """Return ``messages.create`` kwargs and the images actually attached.
+
+    Images are fitted into PROMPT_IMAGE_TOKENS first; whatever they leave unused
+    is added to the PROMPT_TEXT_TOKENS budget for text blocks.
+    """
+    alts = alts or {}
+    attached, spent = select_images(images, SETTINGS.prompt_image_tokens)
+    text_budget = SETTINGS.prompt_text_tokens + max(0, SETTINGS.prompt_image_tokens - spent)
+    text, _, _ = select_text(text_lines, text_budget)
+
+    prompt = (
+        f"{_previous_section(previous)}"
+        f"URL: {url}\n"
+        f"{_image_section(attached, len(image_urls), alts)}"
+        f"Text:\n{text}"
+    )
+    if SETTINGS.prompt_cache and prefix_tokens() >= cache_min_tokens(SETTINGS.anthropic_model):
+        # The instructions get their own block so the breakpoint ends the fixed prefix.
+        content = [
+            {"type": "text", "text": INSTRUCTIONS, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt},
+        ]
+    else:
+        content = [{"type": "text", "text": INSTRUCTIONS + prompt}]
+    content.extend(_image_block(image) for image in attached)
+    params = {
+        "model": SETTINGS.anthropic_model,
+        "max_tokens": 512,
+        "system": SYSTEM_PROMPT,
+        "messages": [{"role": "user", "content": content}],
+    }
+    return params, attached
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Show how a scraped page (JSON from static/scrape.py) fits the prompt token budget."
+    )
+    parser.add_argument("path", help="Scraped JSON file with 'text' and 'images'")
+    parser.add_argument("--budget", type=int, default=None, help="Text token budget override")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    data = json.loads(Path(args.path).read_text(encoding="utf-8"))
+    blocks = data.get("text") or []
+    budget = args.budget or SETTINGS.prompt_text_tokens
+    text, tokens, dropped = select_text(blocks, budget)
+    report = {
+        "blocks": len(blocks),
+        "dropped_blocks": dropped,
+        "page_tokens": sum(estimate_tokens(block) for block in blocks),
+        "prompt_text_tokens": tokens,
+        "prefix_tokens": prefix_tokens(),
+        "cache_min_tokens": cache_min_tokens(SETTINGS.anthropic_model),
+        "preview": text[:600],
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
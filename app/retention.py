@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import SETTINGS
+from app.crawl import prune_pages
+from app.db import execute, fetch_all, fetch_one, init_db, parse_json, transaction
+from app.events import prune_events
+from app.notify import prune_outbox
+from app.utils import utc_now
+
+RISK_COLUMNS = {"none": "risk_none", "low": "risk_low", "high": "risk_high"}
+
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _percentile(sorted_values: List[int], pct: float) -> Optional[int]:
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _aggregate(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    by_job: Dict[str, Dict[str, Any]] = {}
+    latencies: Dict[str, List[int]] = {}
+    for row in rows:
+        agg = by_job.setdefault(
+            row["job_id"],
+            {"total": 0, "success": 0, "failed": 0, "risk_none": 0, "risk_low": 0, "risk_high": 0},
+        )
+        agg["total"] += 1
+        if row["status"] in ("success", "failed"):
+            agg[row["status"]] += 1
+        column = RISK_COLUMNS.get(row["risk_level"] or "")
+        if column and row["status"] == "success":
+            agg[column] += 1
+        started, finished = _parse_ts(row["started_at"]), _parse_ts(row["finished_at"])
+        if started and finished:
+            latencies.setdefault(row["job_id"], []).append(int((finished - started).total_seconds() * 1000))
+    for job_id, agg in by_job.items():
+        values = sorted(latencies.get(job_id, []))
+        agg["latency_p50_ms"] = _percentile(values, 0.5)
+        agg["latency_p95_ms"] = _percentile(values, 0.95)
+        agg["latency_max_ms"] = values[-1] if values else None
+    return by_job
+
+
+def _store_aggregates(day: str, aggregates: Dict[str, Dict[str, Any]]) -> None:
+    for job_id, agg in aggregates.items():
+        # A day is normally pruned once; if stragglers arrive later, counts add up
+        # and latency figures are taken from whichever batch was larger.
+        execute(
+            """
+            INSERT INTO run_daily (job_id, day, total, success, failed, risk_none, risk_low, risk_high,
+                                   latency_p50_ms, latency_p95_ms, latency_max_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(job_id, day) DO UPDATE SET
+                latency_p50_ms = CASE WHEN excluded.total > run_daily.total THEN excluded.latency_p50_ms ELSE run_daily.latency_p50_ms END,
+                latency_p95_ms = CASE WHEN excluded.total > run_daily.total THEN excluded.latency_p95_ms ELSE run_daily.latency_p95_ms END,
+                latency_max_ms = MAX(COALESCE(run_daily.latency_max_ms, 0), COALESCE(excluded.latency_max_ms, 0)),
+                total = run_daily.total + excluded.total,
+                success = run_daily.success + excluded.success,
+                failed = run_daily.failed + excluded.failed,
+                risk_none = run_daily.risk_none + excluded.risk_none,
+                risk_low = run_daily.risk_low + excluded.risk_low,
+                risk_high = run_daily.risk_high + excluded.risk_high
+            """,
+            (
+                job_id,
+                day,
+                agg["total"],
+                agg["success"],
+                agg["failed"],
+                agg["risk_none"],
+                agg["risk_low"],
+                agg["risk_high"],
+                agg["latency_p50_ms"],
+                agg["latency_p95_ms"],
+                agg["latency_max_ms"],
+            ),
+        )
+
+
+def _archive_rows(day: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Append rows to the day's segment. Each call adds a gzip member, which
+    readers see as one continuous stream; existing bytes are never rewritten."""
+    SETTINGS.archive_dir.mkdir(parents=True, exist_ok=True)
+    path = SETTINGS.archive_dir / f"runs-{day}.ndjson.gz"
+    payload = "".join(
+        json.dumps(
+            {**row, "flags": parse_json(row["flags"]), "evidence": parse_json(row["evidence"])},
+            ensure_ascii=False,
+        )
+        + "\n"
+        for row in rows
+    ).encode("utf-8")
+    with open(path, "ab") as handle:
+        before = handle.tell()
+        handle.write(gzip.compress(payload))
+        handle.flush()
+        os.fsync(handle.fileno())
+        written = handle.tell() - before
+    return {"path": str(path), "rows": len(rows), "bytes": written}
+
+
+def prune_day(day: str) -> int:
+    """Roll up, archive and delete one day of runs in chunks of whole jobs, so
+    memory and each write transaction stay bounded by RETENTION_CHUNK_ROWS
+    rather than by the size of the fleet."""
+    counts = fetch_all(
+        """
+        SELECT job_id, COUNT(*) AS runs FROM runs
+        WHERE started_at >= ? AND started_at < ?
+        GROUP BY job_id ORDER BY job_id
+        """,
+        (day, _next_day(day)),
+    )
+    pruned = 0
+    chunk: List[str] = []
+    size = 0
+    for row in counts:
+        chunk.append(row["job_id"])
+        size += row["runs"]
+        if size >= SETTINGS.retention_chunk_rows:
+            pruned += _prune_jobs(day, chunk)
+            chunk, size = [], 0
+    if chunk:
+        pruned += _prune_jobs(day, chunk)
+    return pruned
+
+
+def _prune_jobs(day: str, job_ids: List[str]) -> int:
+    marks = ", ".join("?" for _ in job_ids)
+    where = f"job_id IN ({marks}) AND started_at >= ? AND started_at < ?"
+    params = (*job_ids, day, _next_day(day))
+    rows = [dict(row) for row in fetch_all(f"SELECT * FROM run_details WHERE {where} ORDER BY started_at", params)]
+    if not rows:
+        return 0
+    # Written before the delete commits: a crash in between can duplicate rows in
+    # the archive, never lose them.
+    segment = _archive_rows(day, rows)
+    with transaction():
+        _store_aggregates(day, _aggregate(rows))
+        execute(
+            "INSERT INTO archive_segments (day, path, rows, bytes, created_at) VALUES (?, ?, ?, ?, ?)",
+            (day, segment["path"], segment["rows"], segment["bytes"], utc_now()),
+        )
+        execute(f"DELETE FROM llm_batch_requests WHERE run_id IN (SELECT id FROM runs WHERE {where})", params)
+        execute(f"DELETE FROM runs WHERE {where}", params)
+    return len(rows)
+
+
+def _next_day(day: str) -> str:
+    return (datetime.fromisoformat(day) + timedelta(days=1)).date().isoformat()
+
+
+def cutoff_day(days: int) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+
+
+def apply_retention(days: Optional[int] = None) -> Dict[str, int]:
+    """Downsample and archive whole UTC days of runs older than ``days``."""
+    days = SETTINGS.retention_days if days is None else days
+    if days <= 0:
+        return {"days": 0, "runs": 0}
+    cutoff = cutoff_day(days)
+    pending = fetch_all(
+        "SELECT DISTINCT substr(started_at, 1, 10) AS day FROM runs WHERE started_at < ? ORDER BY day",
+        (cutoff,),
+    )
+    pruned = sum(prune_day(row["day"]) for row in pending)
+    if pruned:
+        execute(
+            "DELETE FROM verdicts WHERE id NOT IN (SELECT verdict_id FROM runs WHERE verdict_id IS NOT NULL)"
+        )
+    return {"days": len(pending), "runs": pruned}
+
+
+def vacuum(pages: Optional[int] = None) -> Dict[str, int]:
+    """Return free pages to the filesystem. The first call switches the file to
+    incremental auto-vacuum, which needs one full VACUUM."""
+    pages = SETTINGS.vacuum_pages if pages is None else pages
+    freed_before = fetch_one("PRAGMA freelist_count")[0]
+    if fetch_one("PRAGMA auto_vacuum")[0] != 2:
+        execute("PRAGMA auto_vacuum = INCREMENTAL")
+        execute("VACUUM")
+    elif freed_before:
+        fetch_all(f"PRAGMA incremental_vacuum({int(pages)})")
+    fetch_all("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {"free_pages_before": freed_before, "free_pages_after": fetch_one("PRAGMA freelist_count")[0]}
+
+
+def compact() -> Dict[str, Any]:
+    retention = apply_retention()
+    events = prune_events()
+    webhooks = prune_outbox()
+    return {
+        "retention": retention,
+        "events_pruned": events,
+        "webhooks_pruned": webhooks,
+        "crawl_pages_pruned": prune_pages(),
+        "vacuum": vacuum(),
+    }
+
+
+def query_archive(
+    job_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    risk_level: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Stream archived runs, oldest first. ``since``/``until`` are ISO dates or timestamps."""
+    clauses, params = [], []
+    if since:
+        clauses.append("day >= ?")
+        params.append(since[:10])
+    if until:
+        clauses.append("day <= ?")
+        params.append(until[:10])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    paths = [
+        row["path"]
+        for row in fetch_all(f"SELECT DISTINCT day, path FROM archive_segments {where} ORDER BY day", tuple(params))
+    ]
+    # A bare date as ``until`` covers that whole day.
+    until_key = until + "\uffff" if until and len(until) == 10 else until
+    for path in paths:
+        if not Path(path).exists():
+            continue
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            for line in handle:
+                row = json.loads(line)
+                if job_id and row["job_id"] != job_id:
+                    continue
+                if risk_level and row["risk_level"] != risk_level:
+                    continue
+                if since and row["started_at"] < since:
+                    continue
+                if until_key and row["started_at"] > until_key:
+                    continue
+                yield row
+
+
+def daily_history(job_id: str, since: Optional[str] = None) -> List[Dict[str, Any]]:
+    rows = fetch_all(
+        "SELECT * FROM run_daily WHERE job_id = ? AND day >= ? ORDER BY day",
+        (job_id, since or ""),
+    )
+    return [dict(row) for row in rows]
+
+
+def storage_stats() -> Dict[str, Any]:
+    page_size = fetch_one("PRAGMA page_size")[0]
+    segments = fetch_one("SELECT COUNT(*) AS n, COALESCE(SUM(rows), 0) AS rows, COALESCE(SUM(bytes), 0) AS bytes FROM archive_segments")
+    return {
+        "db_bytes": fetch_one("PRAGMA page_count")[0] * page_size,
+        "free_bytes": fetch_one("PRAGMA freelist_count")[0] * page_size,
+        "runs": fetch_one("SELECT COUNT(*) FROM runs")[0],
+        "verdicts": fetch_one("SELECT COUNT(*) FROM verdicts")[0],
+        "daily_rows": fetch_one("SELECT COUNT(*) FROM run_daily")[0],
+        "archive_segments": segments["n"],
+        "archived_runs": segments["rows"],
+        "archive_bytes": segments["bytes"],
+        "retention_days": SETTINGS.retention_days,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run-history retention, archive queries and compaction.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compact_cmd = sub.add_parser("compact", help="Apply retention and vacuum now")
+    compact_cmd.add_argument("--days", type=int, default=None, help="Override RETENTION_DAYS")
+    query_cmd = sub.add_parser("query", help="Print archived runs as NDJSON")
+    query_cmd.add_argument("--job", default=None, help="Job id")
+    query_cmd.add_argument("--since", default=None, help="ISO date/timestamp (inclusive)")
+    query_cmd.add_argument("--until", default=None, help="ISO date/timestamp (inclusive)")
+    query_cmd.add_argument("--risk", default=None, help="Risk level filter")
+    sub.add_parser("stats", help="Show storage stats")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    init_db()
+    if args.command == "compact":
+        result = {
+            "retention": apply_retention(args.days),
+            "events_pruned": prune_events(),
+            "webhooks_pruned": prune_outbox(args.days),
+            "crawl_pages_pruned": prune_pages(),
+            "vacuum": vacuum(),
+        }
+        print(json.dumps(result, indent=2))
+    elif args.command == "query":
+        for row in query_archive(args.job, args.since, args.until, args.risk):
+            print(json.dumps(row, ensure_ascii=False))
+    else:
+        print(json.dumps(storage_stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+from app.config import SETTINGS
+from app.db import execute, fetch_all, fetch_one, transaction
+from app.utils import utc_now
+
+# Markers of a client-rendered shell: framework mount points, a <noscript>
+# asking for JavaScript, and the bundles it loads (with build hashes removed,
+# so a redeploy of the same app keeps its fingerprint).
+_MOUNT = re.compile(r"""id=["'](root|app|__next|__nuxt|___gatsby|svelte|ember-app|main-app)["']""", re.IGNORECASE)
+_NOSCRIPT_HINT = re.compile(
+    r"<noscript[^>]*>[^<]{0,300}?(?:enable|requires?|turn on|need)[^<]{0,40}javascript", re.IGNORECASE
+)
+_SCRIPT_SRC = re.compile(r"""<script[^>]+src=["']([^"']+)""", re.IGNORECASE)
+_BUILD_HASH = re.compile(r"[0-9a-f]{6,}|\d+", re.IGNORECASE)
+
+
+def shell_fingerprint(html: str) -> str:
+    mounts = sorted({mount.lower() for mount in _MOUNT.findall(html)})
+    scripts = sorted({_BUILD_HASH.sub("", src.split("?")[0]) for src in _SCRIPT_SRC.findall(html)})[:30]
+    payload = json.dumps([mounts, bool(_NOSCRIPT_HINT.search(html)), scripts])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class Route:
+    """How an auto-mode job is scraped this run.
+
+    ``path`` is "static" (fetch, render only if the HTML has too little content),
+    "browser" (render straight away) or "probe" (static without conditional
+    headers, to re-check whether the browser is still needed).
+    """
+
+    path: str
+    reason: str
+    previous: Optional[str] = None
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).hostname or ""
+
+
+def _stale(timestamp: Optional[str]) -> bool:
+    if not timestamp:
+        return True
+    return datetime.now(timezone.utc) - datetime.fromisoformat(timestamp) >= timedelta(
+        seconds=SETTINGS.route_reprobe_seconds
+    )
+
+
+def choose_route(job: Dict[str, Any]) -> Route:
+    if job["mode"] != "auto":
+        return Route(job["mode"], "fixed")
+    if not SETTINGS.auto_routing:
+        return Route("static", "disabled")
+    row = fetch_one("SELECT path, runs_since_probe, probed_at FROM scrape_routes WHERE key = ?", (f"job:{job['id']}",))
+    if row is None or row["path"] is None:
+        host = fetch_one(
+            "SELECT static_count, browser_count FROM scrape_routes WHERE key = ?", (f"host:{_host(job['url'])}",)
+        )
+        if host and host["browser_count"] > host["static_count"]:
+            return Route("browser", "host")
+        return Route("static", "new")
+    if row["path"] == "browser":
+        if row["runs_since_probe"] >= SETTINGS.route_reprobe_runs or _stale(row["probed_at"]):
+            return Route("probe", "reprobe", "browser")
+        return Route("browser", "learned", "browser")
+    return Route("static", "learned", row["path"])
+
+
+def _learn(job: Dict[str, Any], route: Route, used: str, fingerprint: Optional[str]) -> None:
+    now = utc_now()
+    key = f"job:{job['id']}"
+    if used == "browser":
+        # Rendered without looking at the static HTML. If the shell the browser
+        # received looks different from the one we learned on, re-probe next run.
+        execute(
+            """
+            INSERT INTO scrape_routes (key, path, shell_fingerprint, runs_since_probe, probed_at, updated_at)
+            VALUES (?, 'browser', ?, 1, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                runs_since_probe = CASE
+                    WHEN excluded.shell_fingerprint IS NOT NULL AND shell_fingerprint IS NOT NULL
+                         AND excluded.shell_fingerprint != shell_fingerprint THEN ?
+                    ELSE runs_since_probe + 1 END,
+                updated_at = excluded.updated_at
+            """,
+            (key, fingerprint, now, now, SETTINGS.route_reprobe_runs),
+        )
+        learned = "browser"
+    else:
+        learned = "browser" if used == "static+browser" else "static"
+        execute(
+            """
+            INSERT INTO scrape_routes (key, path, shell_fingerprint, runs_since_probe, probed_at, updated_at)
+            VALUES (?, ?, ?, 0, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                path = excluded.path, shell_fingerprint = COALESCE(excluded.shell_fingerprint, shell_fingerprint),
+                runs_since_probe = 0, probed_at = excluded.probed_at, updated_at = excluded.updated_at
+            """,
+            (key, learned, fingerprint, now, now),
+        )
+    if learned != route.previous:
+        # Host counts are per job: a job moving between paths moves its vote.
+        column = "browser_count" if learned == "browser" else "static_count"
+        previous = {"browser": "browser_count", "static": "static_count"}.get(route.previous or "")
+        execute(
+            f"""
+            INSERT INTO scrape_routes (key, {column}, updated_at) VALUES (?, 1, ?)
+            ON CONFLICT(key) DO UPDATE SET {column} = {column} + 1, updated_at = excluded.updated_at
+            """,
+            (f"host:{_host(job['url'])}", now),
+        )
+        if previous:
+            execute(
+                f"UPDATE scrape_routes SET {previous} = MAX(0, {previous} - 1) WHERE key = ?",
+                (f"host:{_host(job['url'])}",),
+            )
+
+
+def record_route(job: Dict[str, Any], run_id: str, route: Route, info: Optional[Dict[str, Any]]) -> None:
+    """Store how this run was scraped and, for auto jobs, what it taught us."""
+    if not info:
+        return
+    with transaction():
+        execute(
+            "UPDATE runs SET scrape_path = ?, route_reason = ?, static_ms = ?, browser_ms = ? WHERE id = ?",
+            (info["path"], route.reason, info.get("static_ms"), info.get("browser_ms"), run_id),
+        )
+        if job["mode"] == "auto" and SETTINGS.auto_routing and not info.get("unchanged"):
+            _learn(job, route, info["path"], info.get("fingerprint"))
+
+
+def route_stats(hours: int = 24) -> Dict[str, Any]:
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+    rows = fetch_all(
+        """
+        SELECT scrape_path, COUNT(*) AS runs, AVG(static_ms) AS static_ms, AVG(browser_ms) AS browser_ms,
+               SUM(COALESCE(static_ms, 0)) AS static_total, SUM(COALESCE(browser_ms, 0)) AS browser_total
+        FROM runs WHERE started_at >= ? AND scrape_path IS NOT NULL
+        GROUP BY scrape_path
+        """,
+        (cutoff,),
+    )
+    paths = {
+        row["scrape_path"]: {
+            "runs": row["runs"],
+            "static_ms_avg": round(row["static_ms"]) if row["static_ms"] is not None else None,
+            "browser_ms_avg": round(row["browser_ms"]) if row["browser_ms"] is not None else None,
+            "static_ms_total": row["static_total"],
+            "browser_ms_total": row["browser_total"],
+        }
+        for row in rows
+    }
+    reasons = {
+        row["route_reason"]: row["runs"]
+        for row in fetch_all(
+            """
+            SELECT route_reason, COUNT(*) AS runs FROM runs
+            WHERE started_at >= ? AND route_reason IS NOT NULL GROUP BY route_reason
+            """,
+            (cutoff,),
+        )
+    }
+    jobs = {
+        row["path"]: row["jobs"]
+        for row in fetch_all(
+            "SELECT path, COUNT(*) AS jobs FROM scrape_routes WHERE key LIKE 'job:%' GROUP BY path"
+        )
+    }
+    # Browser-routed runs used to fetch and parse the static HTML first; price
+    # that at the static cost measured on runs that still do both.
+    direct = paths.get("browser", {}).get("runs", 0)
+    both = paths.get("static+browser", {})
+    return {
+        "hours": hours,
+        "paths": paths,
+        "reasons": reasons,
+        "jobs_by_route": jobs,
+        "static_ms_skipped_estimate": round(direct * (both.get("static_ms_avg") or 0)),
+    }
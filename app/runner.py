@@ -1,147 +1,322 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import uuid
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
-from app.analysis import analyze_content
-from app.db import execute, fetch_one, insert_json, parse_json
-from app.notify import send_webhook
+from app.adaptive import adapt_interval
+from app.alerts import evaluate_alerts
+from app.analysis import analyze_content, build_request
+from app.config import SETTINGS
+from app.crawl import crawl_site, site_verdict
+from app.db import execute, fetch_one, insert_json, parse_json, transaction, verdict_fingerprint
+from app.diff import decide, diff_blocks
+from app.events import publish_run
+from app.notify import enqueue_webhook
+from app.prefilter import get_prefilter
+from app.prompt import stash_images
+from app.routing import choose_route, record_route
 from app.scrapers import scrape_url
-from app.utils import content_hash, utc_now
+from app.utils import block_hashes, content_hash, utc_now
+
+RISKY_LEVELS = ("low", "high")
 
 
 def _row_to_dict(row) -> Dict[str, Any]:
     return dict(row) if row else {}
 
 
-def run_job(job_id: str) -> Dict[str, Any]:
+def load_job(job_id: str) -> Dict[str, Any]:
     job_row = fetch_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
     if not job_row:
         raise ValueError(f"Job {job_id} not found")
+    return _row_to_dict(job_row)
 
-    job = _row_to_dict(job_row)
-    if job["status"] != "active":
-        return {"status": "skipped", "reason": "paused"}
 
+def start_run(job_id: str) -> str:
     run_id = str(uuid.uuid4())
-    started_at = utc_now()
+    with transaction():
+        execute(
+            """
+            INSERT INTO runs (id, job_id, started_at, status)
+            VALUES (?, ?, ?, ?)
+            """,
+            (run_id, job_id, utc_now(), "running"),
+        )
+        publish_run(run_id, "run.started")
+    return run_id
+
+
+def image_urls_from(scraped: Dict[str, Any]) -> List[str]:
+    images_raw = scraped.get("images") or []
+    if not isinstance(images_raw, list):
+        return []
+    if images_raw and isinstance(images_raw[0], dict):
+        return [img.get("src") for img in images_raw if img.get("src")]
+    return [img for img in images_raw if isinstance(img, str)]
+
+
+def load_state(job_id: str) -> Optional[Dict[str, Any]]:
+    row = fetch_one("SELECT * FROM job_state WHERE job_id = ?", (job_id,))
+    return dict(row) if row else None
+
+
+def fetch_validators(state: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not state or not state.get("last_hash"):
+        return None
+    validators = {
+        "etag": state.get("last_etag"),
+        "last_modified": state.get("last_modified"),
+        "body_hash": state.get("last_body_hash"),
+    }
+    return validators if any(validators.values()) else None
+
+
+def store_validators(job_id: str, fetch: Optional[Dict[str, Any]]) -> None:
+    # No validators means the page was rendered: forget the old ones, or the
+    # next static fetch would match an unchanged SPA shell and skip the render.
+    fetch = fetch or {}
+    execute(
+        "UPDATE job_state SET last_etag = ?, last_modified = ?, last_body_hash = ? WHERE job_id = ?",
+        (fetch.get("etag"), fetch.get("last_modified"), fetch.get("body_hash"), job_id),
+    )
+
+
+def store_snapshot(
+    job_id: str,
+    raw_hash: str,
+    blocks: List[str],
+    images: List[str],
+    fetch: Optional[Dict[str, Any]] = None,
+) -> None:
+    with transaction():
+        execute(
+            "UPDATE job_state SET last_hash = ?, last_blocks = ?, last_images = ? WHERE job_id = ?",
+            (raw_hash, insert_json(blocks), insert_json(images), job_id),
+        )
+        store_validators(job_id, fetch)
+
+
+def _previous_verdict(job_id: str, state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    verdict = {
+        "site_context": state["last_site_context"] if state else None,
+        "risk_level": state["last_risk_level"] if state else None,
+        "flags": parse_json(state["last_flags"]) if state else [],
+        "evidence": parse_json(state["last_evidence"]) if state else [],
+        "risk_at": state["last_risk_at"] if state else None,
+        "summary": state["last_summary"] if state else None,
+    }
+    if not verdict["risk_level"]:
+        recent = fetch_one(
+            """
+            SELECT site_context, risk_level, flags, evidence, risk_at, summary
+            FROM run_details
+            WHERE job_id = ? AND status = ?
+            ORDER BY finished_at DESC
+            LIMIT 1
+            """,
+            (job_id, "success"),
+        )
+        if recent:
+            verdict = {
+                "site_context": recent["site_context"],
+                "risk_level": recent["risk_level"],
+                "flags": parse_json(recent["flags"]) if recent["flags"] else [],
+                "evidence": parse_json(recent["evidence"]) if recent["evidence"] else [],
+                "risk_at": recent["risk_at"],
+                "summary": recent["summary"],
+            }
+    verdict["risk_level"] = verdict["risk_level"] or "none"
+    return verdict
+
+
+def image_alts_from(scraped: Dict[str, Any]) -> Dict[str, str]:
+    images_raw = scraped.get("images") or []
+    return {
+        img["src"]: img.get("alt") or ""
+        for img in images_raw
+        if isinstance(img, dict) and img.get("src")
+    }
+
+
+def plan_analysis(
+    job_id: str,
+    state: Optional[Dict[str, Any]],
+    text_lines: List[str],
+    images: List[str],
+    alts: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Decide how much of the page the LLM needs to see.
+
+    Returns the mode ("reuse", "prefilter", "incremental" or "full") plus the
+    text/images/previous verdict to analyze, or a ready ``verdict`` when no
+    LLM call is needed.
+    """
+    plan: Dict[str, Any] = {
+        "mode": "full",
+        "text": text_lines,
+        "images": images,
+        "previous": None,
+        "verdict": None,
+        "alts": alts or {},
+    }
+    if SETTINGS.incremental_analysis and state:
+        previous = _previous_verdict(job_id, state)
+        diff = diff_blocks(
+            parse_json(state.get("last_blocks")),
+            parse_json(state.get("last_images")),
+            text_lines,
+            images,
+        )
+        plan["mode"] = decide(diff, previous["risk_level"])
+        if plan["mode"] == "reuse":
+            return plan
+        if plan["mode"] == "incremental":
+            plan.update(text=diff.added, images=diff.new_images, previous=previous)
+
+    if not SETTINGS.prefilter_enabled:
+        return plan
+    wanted = set(plan["images"])
+    alt_texts = [alt for url, alt in (alts or {}).items() if alt and url in wanted]
+    result = get_prefilter().scan_page(plan["text"], alt_texts)
+    plan["prefilter_score"] = result.score
+    if result.score >= SETTINGS.prefilter_threshold:
+        plan["text"] = result.windows
+        return plan
+    if plan["images"] and not SETTINGS.prefilter_gate_images:
+        return plan
+    plan["verdict"] = plan["previous"] or {
+        "site_context": "",
+        "risk_level": "none",
+        "flags": [],
+        "evidence": [],
+        "summary": "No risk terms found by the local pre-filter.",
+    }
+    plan["mode"] = "prefilter"
+    return plan
+
+
+def _store_fetch(
+    job_id: str,
+    raw_hash: str,
+    fetch: Optional[Dict[str, Any]],
+    blocks: Optional[List[str]],
+    images: Optional[List[str]],
+) -> None:
+    if blocks is None:
+        store_validators(job_id, fetch)
+    else:
+        store_snapshot(job_id, raw_hash, blocks, images or [], fetch)
+
+
+def store_verdict(
+    site_context: Optional[str],
+    risk_level: Optional[str],
+    flags: Optional[str],
+    evidence: Optional[str],
+    summary: Optional[str],
+) -> int:
+    """Return the id of the matching ``verdicts`` row, inserting it if new.
+
+    ``flags``/``evidence`` are the JSON strings as stored.
+    """
+    fingerprint = verdict_fingerprint(site_context, risk_level, flags, evidence, summary)
     execute(
         """
-        INSERT INTO runs (id, job_id, started_at, status)
-        VALUES (?, ?, ?, ?)
+        INSERT OR IGNORE INTO verdicts (fingerprint, site_context, risk_level, flags, evidence, summary, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
         """,
-        (run_id, job_id, started_at, "running"),
+        (fingerprint, site_context, risk_level, flags, evidence, summary, utc_now()),
     )
+    return fetch_one("SELECT id FROM verdicts WHERE fingerprint = ?", (fingerprint,))["id"]
 
-    try:
-        scraped = scrape_url(job["url"], job["mode"])
-        text_lines = scraped.get("text") or []
-        images_raw = scraped.get("images") or []
-        images = []
-        if isinstance(images_raw, list):
-            if images_raw and isinstance(images_raw[0], dict):
-                images = [img.get("src") for img in images_raw if img.get("src")]
-            else:
-                images = [img for img in images_raw if isinstance(img, str)]
 
-        raw_hash = content_hash(text_lines, images)
-        state_row = fetch_one("SELECT * FROM job_state WHERE job_id = ?", (job_id,))
-        last_hash = state_row["last_hash"] if state_row else None
-
-        if last_hash == raw_hash:
-            finished_at = utc_now()
-            last_site_context = state_row["last_site_context"] if state_row else None
-            last_risk_level = state_row["last_risk_level"] if state_row else None
-            last_flags = parse_json(state_row["last_flags"]) if state_row else []
-            last_evidence = parse_json(state_row["last_evidence"]) if state_row else []
-            last_risk_at = state_row["last_risk_at"] if state_row else None
-            last_summary = state_row["last_summary"] if state_row else None
-            if not last_risk_level:
-                recent = fetch_one(
-                    """
-                    SELECT site_context, risk_level, flags, evidence, risk_at, summary
-                    FROM runs
-                    WHERE job_id = ? AND status = ?
-                    ORDER BY finished_at DESC
-                    LIMIT 1
-                    """,
-                    (job_id, "success"),
-                )
-                if recent:
-                    last_site_context = recent["site_context"]
-                    last_risk_level = recent["risk_level"]
-                    last_flags = parse_json(recent["flags"]) if recent["flags"] else []
-                    last_evidence = parse_json(recent["evidence"]) if recent["evidence"] else []
-                    last_risk_at = recent["risk_at"]
-                    last_summary = recent["summary"]
-            risk_level = last_risk_level or "none"
-            execute(
-                """
-                UPDATE runs
-                SET finished_at = ?, status = ?, site_context = ?, risk_level = ?, flags = ?, evidence = ?, raw_hash = ?, risk_at = ?, summary = ?
-                WHERE id = ?
-                """,
-                (
-                    finished_at,
-                    "success",
-                    last_site_context,
-                    risk_level,
-                    insert_json(last_flags or []),
-                    insert_json(last_evidence or []),
-                    raw_hash,
-                    last_risk_at,
-                    last_summary,
-                    run_id,
-                ),
-            )
-            return {"status": "success", "run_id": run_id, "risk_level": risk_level}
+def finish_unchanged(
+    job_id: str,
+    run_id: str,
+    raw_hash: str,
+    state: Optional[Dict[str, Any]],
+    mode: str = "unchanged",
+    *,
+    fetch: Optional[Dict[str, Any]] = None,
+    blocks: Optional[List[str]] = None,
+    images: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    verdict = _previous_verdict(job_id, state)
+    with transaction():
+        verdict_id = store_verdict(
+            verdict["site_context"],
+            verdict["risk_level"],
+            insert_json(verdict["flags"] or []),
+            insert_json(verdict["evidence"] or []),
+            verdict["summary"],
+        )
+        execute(
+            """
+            UPDATE runs
+            SET finished_at = ?, status = ?, risk_level = ?, verdict_id = ?, raw_hash = ?, risk_at = ?, analysis_mode = ?
+            WHERE id = ?
+            """,
+            (utc_now(), "success", verdict["risk_level"], verdict_id, raw_hash, verdict["risk_at"], mode, run_id),
+        )
+        _store_fetch(job_id, raw_hash, fetch, blocks, images)
+        # "reused" means the content changed but the old verdict still applies.
+        adapt_interval(job_id, mode == "reused", verdict["risk_level"])
+        publish_run(run_id, "run.finished")
+    return {"status": "success", "run_id": run_id, "risk_level": verdict["risk_level"]}
+
 
-        analysis = analyze_content(job["url"], text_lines, images)
-        site_context = analysis.get("site_context", "")
-        risk_level = analysis.get("risk_level", "none")
-        flags = analysis.get("flags", [])
-        evidence = analysis.get("evidence", [])
-        summary = analysis.get("summary", "")
+def record_analysis(
+    job_id: str,
+    run_id: str,
+    raw_hash: str,
+    analysis: Dict[str, Any],
+    state: Optional[Dict[str, Any]],
+    mode: str = "full",
+    *,
+    fetch: Optional[Dict[str, Any]] = None,
+    blocks: Optional[List[str]] = None,
+    images: Optional[List[str]] = None,
+) -> str:
+    site_context = analysis.get("site_context", "")
+    risk_level = analysis.get("risk_level", "none")
+    flags = analysis.get("flags", [])
+    evidence = analysis.get("evidence", [])
+    summary = analysis.get("summary", "")
+    risky = risk_level in RISKY_LEVELS
 
-        finished_at = utc_now()
-        risk_at = finished_at if risk_level in ("low", "high") else None
+    finished_at = utc_now()
+    risk_at = finished_at if risky else None
+    state_values = (
+        raw_hash,
+        site_context if risky else None,
+        risk_level if risky else None,
+        insert_json(flags) if risky else None,
+        insert_json(evidence) if risky else None,
+        risk_at,
+        summary if risky else None,
+    )
+    with transaction():
+        verdict_id = store_verdict(
+            site_context, risk_level, insert_json(flags), insert_json(evidence), summary
+        )
         execute(
             """
             UPDATE runs
-            SET finished_at = ?, status = ?, site_context = ?, risk_level = ?, flags = ?, evidence = ?, raw_hash = ?, risk_at = ?, summary = ?
+            SET finished_at = ?, status = ?, risk_level = ?, verdict_id = ?, raw_hash = ?, risk_at = ?, analysis_mode = ?
             WHERE id = ?
             """,
-            (
-                finished_at,
-                "success",
-                site_context,
-                risk_level,
-                insert_json(flags),
-                insert_json(evidence),
-                raw_hash,
-                risk_at,
-                summary,
-                run_id,
-            ),
+            (finished_at, "success", risk_level, verdict_id, raw_hash, risk_at, mode, run_id),
         )
-
-        if state_row:
+        if state:
             execute(
                 """
                 UPDATE job_state
                 SET last_hash = ?, last_site_context = ?, last_risk_level = ?, last_flags = ?, last_evidence = ?, last_risk_at = ?, last_summary = ?
                 WHERE job_id = ?
                 """,
-                (
-                    raw_hash,
-                    site_context if risk_level in ("low", "high") else None,
-                    risk_level if risk_level in ("low", "high") else None,
-                    insert_json(flags) if risk_level in ("low", "high") else None,
-                    insert_json(evidence) if risk_level in ("low", "high") else None,
-                    risk_at,
-                    summary if risk_level in ("low", "high") else None,
-                    job_id,
-                ),
+                (*state_values, job_id),
             )
         else:
             execute(
@@ -149,44 +324,171 @@ def run_job(job_id: str) -> Dict[str, Any]:
                 INSERT INTO job_state (job_id, last_hash, last_site_context, last_risk_level, last_flags, last_evidence, last_risk_at, last_summary, last_notified_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                (
-                    job_id,
-                    raw_hash,
-                    site_context if risk_level in ("low", "high") else None,
-                    risk_level if risk_level in ("low", "high") else None,
-                    insert_json(flags) if risk_level in ("low", "high") else None,
-                    insert_json(evidence) if risk_level in ("low", "high") else None,
-                    risk_at,
-                    summary if risk_level in ("low", "high") else None,
-                    None,
-                ),
+                (job_id, *state_values, None),
             )
+        _store_fetch(job_id, raw_hash, fetch, blocks, images)
+        adapt_interval(job_id, True, risk_level)
+        publish_run(run_id, "run.finished")
+    return finished_at
 
-        if risk_level in ("low", "high") and job.get("webhook_url"):
-            payload = {
-                "job_id": job_id,
-                "run_id": run_id,
-                "url": job["url"],
-                "risk_level": risk_level,
-                "flags": flags,
-                "evidence": evidence,
-                "timestamp": finished_at,
-            }
-            send_webhook(job["webhook_url"], payload)
-            execute(
-                "UPDATE job_state SET last_notified_at = ? WHERE job_id = ?",
-                (utc_now(), job_id),
-            )
 
-        return {"status": "success", "run_id": run_id, "risk_level": risk_level}
-    except Exception as exc:
-        finished_at = utc_now()
+def notify(job: Dict[str, Any], run_id: str, analysis: Dict[str, Any], finished_at: str) -> None:
+    """Update the job's alerts and queue whatever they say to send; the webhook
+    worker delivers it (and sets last_notified_at)."""
+    payloads = evaluate_alerts(job, run_id, analysis, finished_at)
+    if job.get("webhook_url"):
+        for payload in payloads:
+            enqueue_webhook(job["webhook_url"], payload, job["id"], run_id)
+
+
+def record_and_notify(
+    job: Dict[str, Any],
+    run_id: str,
+    raw_hash: str,
+    analysis: Dict[str, Any],
+    state: Optional[Dict[str, Any]],
+    mode: str = "full",
+    **snapshot: Any,
+) -> str:
+    """``record_analysis`` and ``notify`` in one transaction: a stored verdict always has its alert queued."""
+    with transaction():
+        finished_at = record_analysis(job["id"], run_id, raw_hash, analysis, state, mode, **snapshot)
+        notify(job, run_id, analysis, finished_at)
+    return finished_at
+
+
+def batch_pending(job_id: str) -> bool:
+    row = fetch_one("SELECT id FROM runs WHERE job_id = ? AND status = ? LIMIT 1", (job_id, "queued"))
+    return row is not None
+
+
+def queue_for_batch(
+    job: Dict[str, Any],
+    run_id: str,
+    raw_hash: str,
+    plan: Dict[str, Any],
+    text_lines: List[str],
+    images: List[str],
+    fetch: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    params, image_hashes = build_request(
+        job["url"], plan["text"], plan["images"], plan["previous"], plan["alts"]
+    )
+    if SETTINGS.image_cache_enabled:
+        # The blobs are already on disk; don't keep a base64 copy in SQLite.
+        params = stash_images(params, image_hashes)
+    context = {
+        "raw_hash": raw_hash,
+        "mode": plan["mode"],
+        "blocks": block_hashes(text_lines),
+        "images": images,
+        "fetch": fetch,
+        "image_hashes": image_hashes,
+    }
+    with transaction():
+        execute(
+            """
+            INSERT INTO llm_batch_requests (run_id, job_id, params, context, state, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (run_id, job["id"], insert_json(params), insert_json(context), "pending", utc_now()),
+        )
+        execute("UPDATE runs SET status = ?, analysis_mode = ? WHERE id = ?", ("queued", plan["mode"], run_id))
+        publish_run(run_id, "run.updated")
+    return {"status": "queued", "run_id": run_id}
+
+
+def fail_run(run_id: str, exc: Exception) -> Dict[str, Any]:
+    with transaction():
         execute(
             """
             UPDATE runs
             SET finished_at = ?, status = ?, error = ?
             WHERE id = ?
             """,
-            (finished_at, "failed", str(exc), run_id),
+            (utc_now(), "failed", str(exc), run_id),
         )
-        return {"status": "failed", "run_id": run_id, "error": str(exc)}
+        publish_run(run_id, "run.finished")
+    return {"status": "failed", "run_id": run_id, "error": str(exc)}
+
+
+def run_crawl(job: Dict[str, Any], run_id: str, state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Crawl mode: analyze the site's changed pages, then record one verdict for the site."""
+    stats, changes = crawl_site(job)
+    execute("UPDATE runs SET crawl = ? WHERE id = ?", (json.dumps(stats), run_id))
+    if stats["pages"] and stats["errors"] == stats["pages"]:
+        raise RuntimeError(f"crawl fetched no pages ({stats.get('last_error')})")
+    previous = state["last_hash"] if state else None
+    if previous and not changes:
+        return finish_unchanged(job["id"], run_id, previous, state)
+    # Chained, so the site hash moves whenever any page changes without rereading every page.
+    raw_hash = hashlib.sha256(json.dumps([previous, sorted(changes)]).encode("utf-8")).hexdigest()
+    analysis = site_verdict(job)
+    record_and_notify(job, run_id, raw_hash, analysis, state, "crawl")
+    return {"status": "success", "run_id": run_id, "risk_level": analysis["risk_level"]}
+
+
+def run_job(job_id: str) -> Dict[str, Any]:
+    job = load_job(job_id)
+    if job["status"] != "active":
+        return {"status": "skipped", "reason": "paused"}
+    if job.get("llm_mode") == "batch" and batch_pending(job_id):
+        return {"status": "skipped", "reason": "batch_pending"}
+
+    run_id = start_run(job_id)
+    try:
+        state = load_state(job_id)
+        if job["mode"] == "crawl":
+            return run_crawl(job, run_id, state)
+        route = choose_route(job)
+        validators = None if route.path == "probe" else fetch_validators(state)
+        scraped = scrape_url(job["url"], job["mode"], validators, route.path)
+        record_route(job, run_id, route, scraped.pop("scrape", None))
+        if scraped.get("unchanged") and state:
+            return finish_unchanged(
+                job_id, run_id, state["last_hash"], state, fetch=scraped.get("fetch")
+            )
+
+        text_lines = scraped.get("text") or []
+        images = image_urls_from(scraped)
+
+        raw_hash = content_hash(text_lines, images)
+        if state and state["last_hash"] == raw_hash:
+            return finish_unchanged(job_id, run_id, raw_hash, state, fetch=scraped.get("fetch"))
+
+        plan = plan_analysis(job_id, state, text_lines, images, image_alts_from(scraped))
+        if plan["mode"] == "reuse":
+            return finish_unchanged(
+                job_id,
+                run_id,
+                raw_hash,
+                state,
+                mode="reused",
+                fetch=scraped.get("fetch"),
+                blocks=block_hashes(text_lines),
+                images=images,
+            )
+
+        if plan["verdict"] is None and job.get("llm_mode") == "batch":
+            return queue_for_batch(
+                job, run_id, raw_hash, plan, text_lines, images, scraped.get("fetch")
+            )
+
+        analysis = plan["verdict"] or analyze_content(
+            job["url"], plan["text"], plan["images"], plan["previous"], plan["alts"]
+        )
+        record_and_notify(
+            job,
+            run_id,
+            raw_hash,
+            analysis,
+            state,
+            plan["mode"],
+            fetch=scraped.get("fetch"),
+            blocks=block_hashes(text_lines),
+            images=images,
+        )
+
+        return {"status": "success", "run_id": run_id, "risk_level": analysis.get("risk_level", "none")}
+    except Exception as exc:
+        return fail_run(run_id, exc)
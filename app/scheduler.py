@@ -1,43 +1,319 @@
 from __future__ import annotations
 
+import argparse
+import hashlib
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
-from app.db import fetch_all
-from app.runner import run_job
+from app.adaptive import adaptive_stats, effective_interval, interval_for
+from app.analysis import shutdown_image_pool
+from app.batching import process_batches
+from app.config import SETTINGS
+from app.crawl import shutdown_crawl_pool
+from app.db import fetch_all, init_db
+from app.dispatch import get_dispatcher, shutdown_dispatcher
+from app.leases import Claim, LeaseStore, get_lease_store, next_run_after
+from app.notify import get_webhook_worker, shutdown_webhook_worker
+from app.retention import compact
+
+logger = logging.getLogger(__name__)
+
+
+def dispatch_job(job_id: str, on_done: Optional[Callable[[], None]] = None) -> None:
+    get_dispatcher().submit(job_id, on_done=on_done)
+
+
+def first_run_at(job_id: str, interval_seconds: int) -> datetime:
+    """Next slot on the job's own phase within its interval.
+
+    The phase comes from the job id, so jobs created or rescheduled together
+    (e.g. after a restart) spread evenly over the interval and each job keeps
+    the same slot across restarts.
+    """
+    now = datetime.now(timezone.utc)
+    if not SETTINGS.schedule_jitter or interval_seconds <= 1:
+        return now + timedelta(seconds=interval_seconds)
+    phase = int(hashlib.sha1(job_id.encode("utf-8")).hexdigest()[:8], 16) % interval_seconds
+    elapsed = (now.timestamp() - phase) % interval_seconds
+    return now + timedelta(seconds=interval_seconds - elapsed)
+
+
+class LeasedWorker:
+    """Claims due jobs from a LeaseStore, runs them and keeps their leases alive.
+
+    Any number of these can share one store; a job is only run by the worker
+    holding its lease, and leases of a worker that stops heartbeating expire.
+    Claimed jobs go through the dispatcher, so host limits apply per worker.
+    """
+
+    def __init__(self, store: LeaseStore, owner: str) -> None:
+        self.store = store
+        self.owner = owner
+        self.capacity = max(1, SETTINGS.scheduler_capacity)
+        self.lease_seconds = max(3.0, SETTINGS.lease_seconds)
+        self._inflight: Dict[str, Claim] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_renew = 0.0
+        self.claimed = 0
+        self.lost = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="lease-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop claiming and renewing; call before shutting the dispatcher down."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+    def release_unstarted(self, job_ids: Sequence[str]) -> None:
+        """Hand back claims the dispatcher never started, still due, so another
+        worker can pick them up now. Jobs that are running keep their leases:
+        they are released when they finish, or expire if this process exits first."""
+        with self._lock:
+            held = [self._inflight.pop(job_id) for job_id in job_ids if job_id in self._inflight]
+        for claim in held:
+            self.store.release(self.owner, claim.job_id, claim.due_at)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._heartbeat()
+                self.poll()
+            except Exception:
+                logger.exception("lease worker %s: heartbeat or claim failed", self.owner)
+            self._stop.wait(SETTINGS.scheduler_poll_seconds)
+
+    def _heartbeat(self) -> None:
+        if time.monotonic() - self._last_renew < self.lease_seconds / 3:
+            return
+        self._last_renew = time.monotonic()
+        with self._lock:
+            held = list(self._inflight)
+        kept = set(self.store.renew(self.owner, held, self.lease_seconds))
+        # A lease can only be lost if this process stalled past expiry; another
+        # worker may already be running the job, so stop renewing it.
+        lost = [job_id for job_id in held if job_id not in kept]
+        if lost:
+            with self._lock:
+                for job_id in lost:
+                    self._inflight.pop(job_id, None)
+            self.lost += len(lost)
+
+    def poll(self) -> int:
+        with self._lock:
+            free = self.capacity - len(self._inflight)
+        claims = self.store.claim_due(self.owner, free, self.lease_seconds)
+        for claim in claims:
+            with self._lock:
+                self._inflight[claim.job_id] = claim
+            self._dispatch(claim)
+        self.claimed += len(claims)
+        return len(claims)
+
+    def run_now(self, job_id: str, host: Optional[str] = None) -> bool:
+        """Run a job outside its schedule under this worker's lease, so no other
+        worker claims it meanwhile. False if it is leased (queued or running) elsewhere."""
+        claim = self.store.claim_one(self.owner, job_id, self.lease_seconds)
+        if claim is None:
+            return False
+        with self._lock:
+            self._inflight[job_id] = claim
+        if not get_dispatcher().submit(job_id, on_done=lambda: self._done(claim, manual=True), host=host):
+            self._done(claim, manual=True)
+            return False
+        return True
+
+    def _dispatch(self, claim: Claim) -> None:
+        due = datetime.fromisoformat(claim.due_at).timestamp()
+        if not get_dispatcher().submit(claim.job_id, due, lambda: self._done(claim)):
+            self._done(claim)
+
+    def _done(self, claim: Claim, manual: bool = False) -> None:
+        with self._lock:
+            held = self._inflight.pop(claim.job_id, None) is not None
+        if not held:
+            return
+        if manual:
+            # A manual run leaves the schedule as it was, as in local mode.
+            self.store.release(self.owner, claim.job_id, claim.due_at)
+            return
+        # The run may have adapted the job's interval.
+        interval = interval_for(claim.job_id) or claim.interval_seconds
+        self.store.release(self.owner, claim.job_id, next_run_after(replace(claim, interval_seconds=interval)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            inflight = len(self._inflight)
+        return {
+            "owner": self.owner,
+            "capacity": self.capacity,
+            "inflight": inflight,
+            "claimed": self.claimed,
+            "lost_leases": self.lost,
+            **self.store.stats(),
+        }
 
 
 class SchedulerManager:
-    def __init__(self) -> None:
+    """``SCHEDULER_MODE=local`` keeps one APScheduler timer per job in this process.
+    ``leased`` stores ``next_run_at`` in the database and lets any number of API
+    processes or ``python -m app.scheduler`` workers share the jobs."""
+
+    def __init__(self, mode: Optional[str] = None, owner: Optional[str] = None) -> None:
+        self.mode = mode or SETTINGS.scheduler_mode
         self._scheduler = BackgroundScheduler()
+        self._store: Optional[LeaseStore] = None
+        self._worker: Optional[LeasedWorker] = None
+        if self.mode == "leased":
+            self.owner = owner or SETTINGS.scheduler_worker_id or f"{socket.gethostname()}-{os.getpid()}"
+            self._store = get_lease_store()
+            self._worker = LeasedWorker(self._store, self.owner)
 
     def start(self) -> None:
         self._scheduler.start()
-        self._schedule_existing_jobs()
+        get_webhook_worker().start()
+        if self._worker is not None:
+            self._worker.start()
+        else:
+            self._schedule_existing_jobs()
+        self._add_periodic("llm-batches", process_batches, max(1, SETTINGS.batch_flush_seconds))
+        self._add_periodic("compactor", compact, max(60, SETTINGS.compact_interval_seconds))
 
     def shutdown(self) -> None:
         self._scheduler.shutdown(wait=False)
+        if self._worker is not None:
+            self._worker.stop()
+        unstarted = shutdown_dispatcher()
+        if self._worker is not None:
+            self._worker.release_unstarted(unstarted)
+        shutdown_webhook_worker()
+        shutdown_crawl_pool()
+        shutdown_image_pool()
+
+    def _add_periodic(self, name: str, func: Callable[[], Any], seconds: int) -> None:
+        if self._store is not None:
+            func = self._singleton(name, func, seconds)
+        self._scheduler.add_job(
+            func,
+            trigger=IntervalTrigger(seconds=seconds),
+            id=name,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+    def _singleton(self, name: str, func: Callable[[], Any], seconds: int) -> Callable[[], Any]:
+        # Whoever holds the named lease runs the task; it passes to another
+        # worker if the holder misses a few ticks.
+        def run() -> Any:
+            if self._store.acquire(name, self.owner, seconds * 3):
+                return func()
+            return None
+
+        return run
 
     def _schedule_existing_jobs(self) -> None:
-        rows = fetch_all("SELECT id, interval_seconds, status FROM jobs")
+        rows = fetch_all("SELECT id, interval_seconds, adaptive, current_interval_seconds, status FROM jobs")
         for row in rows:
             if row["status"] != "active":
                 continue
-            self.schedule_job(row["id"], row["interval_seconds"])
+            self.schedule_job(row["id"], effective_interval(row))
 
     def schedule_job(self, job_id: str, interval_seconds: int) -> None:
+        if self._store is not None:
+            self._store.schedule(job_id, first_run_at(job_id, interval_seconds).isoformat())
+            return
+        self._add_timer(job_id, interval_seconds, first_run_at(job_id, interval_seconds))
+
+    def schedule_jobs(self, jobs: Sequence[Tuple[str, int]]) -> None:
+        """``schedule_job`` for many (job_id, interval) pairs; one write in leased mode."""
+        if self._store is not None:
+            self._store.schedule_many(
+                [(job_id, first_run_at(job_id, interval).isoformat()) for job_id, interval in jobs]
+            )
+            return
+        for job_id, interval in jobs:
+            self._add_timer(job_id, interval, first_run_at(job_id, interval))
+
+    def _add_timer(self, job_id: str, interval_seconds: int, start: datetime) -> None:
         self._scheduler.add_job(
-            run_job,
-            trigger=IntervalTrigger(seconds=interval_seconds),
+            dispatch_job,
+            trigger=IntervalTrigger(seconds=interval_seconds, start_date=start),
             id=f"job-{job_id}",
-            args=[job_id],
+            args=[job_id, lambda: self._after_run(job_id, interval_seconds)],
             replace_existing=True,
             max_instances=1,
             coalesce=True,
         )
 
+    def _after_run(self, job_id: str, interval_seconds: int) -> None:
+        # Adaptive jobs may come back with a new interval; re-arm the timer from now.
+        interval = interval_for(job_id)
+        if interval and interval != interval_seconds:
+            self._add_timer(job_id, interval, datetime.now(timezone.utc) + timedelta(seconds=interval))
+
+    def run_now(self, job_id: str, host: Optional[str] = None) -> bool:
+        """Queue a run now; False if the job is already queued or running."""
+        if self._worker is not None:
+            return self._worker.run_now(job_id, host)
+        return get_dispatcher().submit(job_id, host=host)
+
     def remove_job(self, job_id: str) -> None:
+        if self._store is not None:
+            self._store.schedule(job_id, None)
+            return
         try:
             self._scheduler.remove_job(f"job-{job_id}")
         except Exception:
             return
+
+    def remove_jobs(self, job_ids: Sequence[str]) -> None:
+        if self._store is not None:
+            self._store.schedule_many([(job_id, None) for job_id in job_ids])
+            return
+        for job_id in job_ids:
+            self.remove_job(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        extra = {"dispatcher": get_dispatcher().stats(), "intervals": adaptive_stats()}
+        if self._worker is not None:
+            return {"mode": self.mode, **self._worker.stats(), **extra}
+        return {"mode": self.mode, "scheduled": len(self._scheduler.get_jobs()), **extra}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run a leased scheduler worker without the API (SCHEDULER_MODE=leased)."
+    )
+    parser.add_argument("--worker-id", default=None, help="Lease owner name (default: host-pid)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    init_db()
+    manager = SchedulerManager("leased", args.worker_id)
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    manager.start()
+    stop.wait()
+    manager.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,160 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional
 
 from app.config import SETTINGS
-from dynamic.scrape import scrape_page_sync
-from static.scrape import scrape_static
+from app.http_clients import get_async_client, get_client
+from dynamic.pool import BrowserPool
+from app.parsing import parse_html
+from app.routing import shell_fingerprint
+from static.scrape import fetch_page, fetch_page_async, normalize_url
 
+_POOL: Optional[BrowserPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = BrowserPool(
+                size=SETTINGS.browser_pool_size,
+                max_pages=SETTINGS.browser_max_pages,
+                profile=SETTINGS.render_profile,
+                block_hosts=SETTINGS.render_block_hosts,
+            )
+        return _POOL
+
+
+def browser_stats() -> dict:
+    return get_browser_pool().stats()
+
+
+def shutdown_browser_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.close()
 
-def scrape_url(url: str, mode: str) -> Dict[str, Any]:
-    if mode == "static":
-        return scrape_static(url)
-    if mode == "dynamic":
-        return scrape_page_sync(url)
 
-    static_data = scrape_static(url)
+def _static_scrape(url: str, validators: Optional[Dict[str, Any]], fingerprint: bool = False) -> Dict[str, Any]:
+    normalized = normalize_url(url)
+    fetched = fetch_page(normalized, client=get_client(), validators=validators)
+    if fetched["not_modified"]:
+        return {"url": normalized, "unchanged": True, "fetch": fetched["validators"]}
+    data = parse_html(fetched["html"], normalized)
+    data["fetch"] = fetched["validators"]
+    if fingerprint:
+        data["fingerprint"] = shell_fingerprint(fetched["html"])
+    return data
+
+
+async def _static_scrape_async(
+    url: str, validators: Optional[Dict[str, Any]], fingerprint: bool = False
+) -> Dict[str, Any]:
+    normalized = normalize_url(url)
+    fetched = await fetch_page_async(normalized, client=get_async_client(), validators=validators)
+    if fetched["not_modified"]:
+        return {"url": normalized, "unchanged": True, "fetch": fetched["validators"]}
+    data = await asyncio.to_thread(parse_html, fetched["html"], normalized)
+    data["fetch"] = fetched["validators"]
+    if fingerprint:
+        data["fingerprint"] = shell_fingerprint(fetched["html"])
+    return data
+
+
+def _needs_browser(static_data: Dict[str, Any]) -> bool:
+    if static_data.get("unchanged"):
+        return False
     text_lines = static_data.get("text") or []
     images = static_data.get("images") or []
-    if len(text_lines) >= SETTINGS.auto_min_text_lines or images:
+    return len(text_lines) < SETTINGS.auto_min_text_lines and not images
+
+
+def _elapsed_ms(started: float) -> int:
+    return round((time.perf_counter() - started) * 1000)
+
+
+def _rendered(rendered: Dict[str, Any], info: Dict[str, Any]) -> Dict[str, Any]:
+    shell = rendered.pop("shell_html", None)
+    if info.get("fingerprint") is None and shell:
+        info["fingerprint"] = shell_fingerprint(shell)
+    rendered["scrape"] = info
+    return rendered
+
+
+def scrape_url(
+    url: str, mode: str, validators: Optional[Dict[str, Any]] = None, path: Optional[str] = None
+) -> Dict[str, Any]:
+    """Scrape ``url``. For static/auto modes ``validators`` (etag, last_modified,
+    body_hash from the previous run) make the fetch conditional; an unchanged
+    page comes back as ``{"unchanged": True}`` without being parsed or rendered.
+
+    ``path`` (see ``app.routing.Route``) picks how an auto job is scraped; the
+    result's ``scrape`` entry says which path ran and how long each step took.
+    """
+    if not SETTINGS.conditional_fetch:
+        validators = None
+    if mode == "static":
+        path = "static"
+    elif mode == "dynamic":
+        path = "browser"
+    path = path or "static"
+    if path == "browser":
+        started = time.perf_counter()
+        rendered = get_browser_pool().scrape_sync(url)
+        return _rendered(rendered, {"path": "browser", "browser_ms": _elapsed_ms(started)})
+
+    started = time.perf_counter()
+    static_data = _static_scrape(url, validators, fingerprint=mode == "auto")
+    info = {
+        "path": "static",
+        "static_ms": _elapsed_ms(started),
+        "fingerprint": static_data.pop("fingerprint", None),
+        "unchanged": bool(static_data.get("unchanged")),
+    }
+    if mode == "static" or not _needs_browser(static_data):
+        static_data["scrape"] = info
+        return static_data
+    started = time.perf_counter()
+    rendered = get_browser_pool().scrape_sync(url)
+    # The shell's validators would make the next fetch "unchanged" without rendering.
+    rendered["fetch"] = None
+    return _rendered(rendered, {**info, "path": "static+browser", "browser_ms": _elapsed_ms(started)})
+
+
+async def scrape_url_async(
+    url: str, mode: str, validators: Optional[Dict[str, Any]] = None, path: Optional[str] = None
+) -> Dict[str, Any]:
+    if not SETTINGS.conditional_fetch:
+        validators = None
+    if mode == "static":
+        path = "static"
+    elif mode == "dynamic":
+        path = "browser"
+    path = path or "static"
+    if path == "browser":
+        started = time.perf_counter()
+        rendered = await get_browser_pool().scrape_async(url)
+        return _rendered(rendered, {"path": "browser", "browser_ms": _elapsed_ms(started)})
+
+    started = time.perf_counter()
+    static_data = await _static_scrape_async(url, validators, fingerprint=mode == "auto")
+    info = {
+        "path": "static",
+        "static_ms": _elapsed_ms(started),
+        "fingerprint": static_data.pop("fingerprint", None),
+        "unchanged": bool(static_data.get("unchanged")),
+    }
+    if mode == "static" or not _needs_browser(static_data):
+        static_data["scrape"] = info
         return static_data
-    return scrape_page_sync(url)
+    started = time.perf_counter()
+    rendered = await get_browser_pool().scrape_async(url)
+    # The shell's validators would make the next fetch "unchanged" without rendering.
+    rendered["fetch"] = None
+    return _rendered(rendered, {**info, "path": "static+browser", "browser_ms": _elapsed_ms(started)})
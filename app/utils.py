@@ -1,18 +1,68 @@
 from __future__ import annotations
 
 import hashlib
+import re
 from datetime import datetime, timezone
-from typing import List
+from functools import lru_cache
+from typing import List, Pattern, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from app.config import SETTINGS
 
 
 def utc_now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def content_hash(text_lines: List[str], image_urls: List[str]) -> str:
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def url_key(url: str) -> str:
+    """Form of ``url`` used to detect duplicate jobs: lower-case scheme and host,
+    no default port, no fragment, ``/`` for an empty path."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if ":" in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+@lru_cache(maxsize=8)
+def _volatile_regexes(patterns: Tuple[str, ...]) -> List[Pattern[str]]:
+    return [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+
+
+def normalize_block(text: str, patterns: Sequence[str] | None = None) -> str:
+    """Strip volatile fragments (timestamps, counters, tokens) and collapse whitespace.
+    Case is kept, so a change in letter case still counts as a change."""
+    patterns = SETTINGS.volatile_patterns if patterns is None else patterns
+    for regex in _volatile_regexes(tuple(patterns)):
+        text = regex.sub("#", text)
+    return " ".join(text.split())
+
+
+def block_hash(text: str) -> str:
+    return hashlib.sha256(normalize_block(text).encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+
+def block_hashes(text_lines: List[str]) -> List[str]:
+    return [block_hash(line) for line in text_lines]
+
+
+def content_hash(text_lines: List[str], image_urls: List[str], normalize: bool = False) -> str:
+    """Hash of the page as scraped, comparable with ``last_hash`` values stored by
+    earlier versions. Volatile fragments are handled by the block diff that runs
+    when this changes; ``normalize`` hashes normalized blocks instead, for
+    callers that have no block diff."""
     hasher = hashlib.sha256()
     for line in text_lines:
-        hasher.update(line.encode("utf-8", errors="ignore"))
+        hasher.update((normalize_block(line) if normalize else line).encode("utf-8", errors="ignore"))
         hasher.update(b"\n")
     for url in image_urls:
         hasher.update(url.encode("utf-8", errors="ignore"))
@@ -0,0 +1,253 @@
+"""Long-lived Chromium pool shared by dynamic scrapes."""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
+
+from dynamic.profiles import RenderProfile, get_profile
+from dynamic.scrape import scrape_in_context
+
+# Allowed on top of the navigation timeout for waiting on a browser, launching
+# it, settling the DOM and reading the page, before a caller gives up.
+RESULT_MARGIN_SECONDS = 30.0
+
+
+class _PooledBrowser:
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.browser: Optional[Browser] = None
+        self.pages_served = 0
+        self.crashed = False
+
+    def needs_recycle(self, max_pages: int) -> bool:
+        if self.browser is None:
+            return False
+        if self.crashed or not self.browser.is_connected():
+            return True
+        return max_pages > 0 and self.pages_served >= max_pages
+
+
+class BrowserPool:
+    """Keeps ``size`` warm Chromium instances on a dedicated event loop thread.
+
+    Each job gets a fresh ``BrowserContext`` (isolated cookies/storage) on a
+    borrowed browser. Browsers are relaunched after ``max_pages`` contexts or
+    as soon as they disconnect.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_pages: int = 100,
+        *,
+        headless: bool = True,
+        profile: Optional[str] = None,
+        block_hosts: Iterable[str] = (),
+    ) -> None:
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.headless = headless
+        self.block_hosts = tuple(block_hosts)
+        self.profile = get_profile(profile, self.block_hosts)
+        self._renders: Dict[str, Dict[str, float]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._playwright: Optional[Playwright] = None
+        self._slots: List[_PooledBrowser] = []
+        self._idle: Optional[asyncio.Queue[_PooledBrowser]] = None
+        self._started: Optional[asyncio.Future] = None
+        self.launches = 0
+        self.recycles = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self._ensure_loop()
+        assert self._loop is not None
+        return self._loop
+
+    def _ensure_loop(self) -> None:
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run() -> None:
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=_run, name="browser-pool", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+
+    async def _ensure_started(self) -> None:
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._start())
+        started = self._started
+        try:
+            # Shielded: a scrape that times out must not cancel the start others wait on.
+            await asyncio.shield(started)
+        except BaseException:
+            # Don't cache a failed start (e.g. Chromium missing); the next scrape retries.
+            if self._started is started and started.done():
+                self._started = None
+            raise
+
+    async def _start(self) -> None:
+        self._playwright = await async_playwright().start()
+        self._slots = [_PooledBrowser(i) for i in range(self.size)]
+        self._idle = asyncio.Queue()
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+
+    async def _launch(self, slot: _PooledBrowser) -> None:
+        assert self._playwright is not None
+        if slot.browser is not None:
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+            self.recycles += 1
+        slot.browser = await self._playwright.chromium.launch(headless=self.headless)
+        slot.browser.on("disconnected", lambda _: setattr(slot, "crashed", True))
+        slot.pages_served = 0
+        slot.crashed = False
+        self.launches += 1
+
+    @asynccontextmanager
+    async def context(self) -> AsyncIterator[BrowserContext]:
+        await self._ensure_started()
+        assert self._idle is not None
+        slot = await self._idle.get()
+        try:
+            if slot.browser is None or slot.needs_recycle(self.max_pages):
+                await self._launch(slot)
+            assert slot.browser is not None
+            context = await slot.browser.new_context()
+            slot.pages_served += 1
+            try:
+                yield context
+            finally:
+                try:
+                    await context.close()
+                except Exception:
+                    if not slot.browser.is_connected():
+                        slot.crashed = True
+        finally:
+            self._idle.put_nowait(slot)
+
+    def _profile(self, profile: Optional[str]) -> RenderProfile:
+        return self.profile if profile is None else get_profile(profile, self.block_hosts)
+
+    def _record(self, profile: str, render: Optional[dict]) -> None:
+        # Only touched from the pool's loop thread.
+        totals = self._renders.setdefault(
+            profile,
+            dict.fromkeys(("renders", "failed", "unsettled", "goto_ms", "settle_ms", "total_ms", "requests", "blocked"), 0),
+        )
+        if render is None:
+            totals["failed"] += 1
+            return
+        totals["renders"] += 1
+        totals["unsettled"] += not render["settled"]
+        for key in ("goto_ms", "settle_ms", "total_ms", "requests", "blocked"):
+            totals[key] += render[key]
+
+    async def scrape(self, url: str, *, timeout_ms: int = 45000, profile: Optional[str] = None) -> dict:
+        chosen = self._profile(profile)
+        try:
+            async with self.context() as context:
+                data = await scrape_in_context(context, url, timeout_ms=timeout_ms, profile=chosen)
+        except Exception:
+            self._record(chosen.name, None)
+            raise
+        self._record(chosen.name, data.get("render"))
+        return data
+
+    def scrape_sync(self, url: str, *, timeout_ms: int = 45000, profile: Optional[str] = None) -> dict:
+        future = asyncio.run_coroutine_threadsafe(
+            self.scrape(url, timeout_ms=timeout_ms, profile=profile), self.loop
+        )
+        try:
+            return future.result(timeout=timeout_ms / 1000 + RESULT_MARGIN_SECONDS)
+        except concurrent.futures.TimeoutError:
+            # Cancels the coroutine on the pool loop, which closes the context and frees the browser.
+            future.cancel()
+            raise TimeoutError(f"browser scrape of {url} did not finish") from None
+
+    async def scrape_async(self, url: str, *, timeout_ms: int = 45000, profile: Optional[str] = None) -> dict:
+        future = asyncio.run_coroutine_threadsafe(
+            self.scrape(url, timeout_ms=timeout_ms, profile=profile), self.loop
+        )
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout_ms / 1000 + RESULT_MARGIN_SECONDS)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"browser scrape of {url} did not finish") from None
+
+    def render_stats(self) -> Dict[str, dict]:
+        stats = {}
+        for name, totals in list(self._renders.items()):
+            renders = totals["renders"] or 1
+            stats[name] = {
+                "renders": totals["renders"],
+                "failed": totals["failed"],
+                "unsettled": totals["unsettled"],
+                "goto_ms_avg": round(totals["goto_ms"] / renders),
+                "settle_ms_avg": round(totals["settle_ms"] / renders),
+                "total_ms_avg": round(totals["total_ms"] / renders),
+                "requests_avg": round(totals["requests"] / renders, 1),
+                "blocked_avg": round(totals["blocked"] / renders, 1),
+            }
+        return stats
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "max_pages": self.max_pages,
+            "launches": self.launches,
+            "recycles": self.recycles,
+            "profile": self.profile.name,
+            "profiles": self.render_stats(),
+            "browsers": [
+                {
+                    "index": slot.index,
+                    "connected": bool(slot.browser and slot.browser.is_connected()),
+                    "pages_served": slot.pages_served,
+                }
+                for slot in self._slots
+            ],
+        }
+
+    async def _close(self) -> None:
+        for slot in self._slots:
+            if slot.browser is not None:
+                try:
+                    await slot.browser.close()
+                except Exception:
+                    pass
+                slot.browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        self._idle = None
+        self._started = None
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout=30)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+            self._loop = None
+            self._thread = None
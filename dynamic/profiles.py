@@ -0,0 +1,174 @@
+"""Render profiles: what a dynamic scrape loads and how it decides the page is ready."""
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Dict, FrozenSet, Iterable, Union
+from urllib.parse import urlsplit
+
+from playwright.async_api import Page, Route
+
+# Analytics, ad and session-replay hosts; none of them change what the page says.
+TRACKER_HOSTS = frozenset(
+    {
+        "google-analytics.com",
+        "googletagmanager.com",
+        "googlesyndication.com",
+        "googleadservices.com",
+        "doubleclick.net",
+        "adservice.google.com",
+        "connect.facebook.net",
+        "analytics.tiktok.com",
+        "static.ads-twitter.com",
+        "snap.licdn.com",
+        "bat.bing.com",
+        "clarity.ms",
+        "hotjar.com",
+        "fullstory.com",
+        "mouseflow.com",
+        "segment.io",
+        "segment.com",
+        "mixpanel.com",
+        "amplitude.com",
+        "heap.io",
+        "newrelic.com",
+        "nr-data.net",
+        "sentry.io",
+        "optimizely.com",
+        "criteo.com",
+        "criteo.net",
+        "taboola.com",
+        "outbrain.com",
+        "adnxs.com",
+        "amazon-adsystem.com",
+        "scorecardresearch.com",
+        "quantserve.com",
+        "chartbeat.com",
+        "intercom.io",
+        "onetrust.com",
+        "cookielaw.org",
+    }
+)
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    """``settle`` is "fixed" (sleep ``settle_ms``), "stable" (until the DOM has not
+    changed for ``settle_ms``) or "content" (as "stable", but a quiet page with less
+    than ``min_text_chars`` of text gets longer to fill in, as SPAs fetching their
+    data do); the latter two give up after ``max_settle_ms``."""
+
+    name: str
+    block_types: FrozenSet[str] = frozenset()
+    block_hosts: FrozenSet[str] = frozenset()
+    wait_until: str = "load"
+    settle: str = "stable"
+    settle_ms: int = 500
+    max_settle_ms: int = 5000
+    min_text_chars: int = 200
+
+    def blocks(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.block_types:
+            return True
+        if not self.block_hosts:
+            return False
+        host = urlsplit(url).hostname or ""
+        while host:
+            if host in self.block_hosts:
+                return True
+            host = host.partition(".")[2]
+        return False
+
+
+PROFILES: Dict[str, RenderProfile] = {
+    # What dynamic scrapes always did: everything loads, then a fixed pause.
+    "full": RenderProfile("full", wait_until="networkidle", settle="fixed", settle_ms=1500),
+    # Images are listed from the DOM, never downloaded; stylesheets stay so
+    # hidden text stays hidden. Waits for text to appear, then for it to settle.
+    "balanced": RenderProfile(
+        "balanced",
+        block_types=frozenset({"image", "media", "font"}),
+        block_hosts=TRACKER_HOSTS,
+        wait_until="load",
+        settle="content",
+        settle_ms=400,
+        max_settle_ms=6000,
+    ),
+    # Only the document, scripts and their data requests.
+    "lite": RenderProfile(
+        "lite",
+        block_types=frozenset(
+            {"image", "media", "font", "stylesheet", "texttrack", "manifest", "eventsource", "websocket"}
+        ),
+        block_hosts=TRACKER_HOSTS,
+        wait_until="domcontentloaded",
+        settle="stable",
+        settle_ms=300,
+        max_settle_ms=3000,
+    ),
+}
+DEFAULT_PROFILE = "full"
+
+
+def get_profile(profile: Union[str, RenderProfile, None] = None, extra_hosts: Iterable[str] = ()) -> RenderProfile:
+    if isinstance(profile, RenderProfile):
+        return profile
+    name = profile or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"unknown render profile {name!r}; expected one of {', '.join(PROFILES)}")
+    hosts = frozenset(host.strip().lower() for host in extra_hosts if host.strip())
+    base = PROFILES[name]
+    return replace(base, block_hosts=base.block_hosts | hosts) if hosts else base
+
+
+class RequestFilter:
+    """Aborts the requests ``profile`` doesn't need and counts what it saw."""
+
+    def __init__(self, profile: RenderProfile) -> None:
+        self.profile = profile
+        self.requests = 0
+        self.blocked = 0
+
+    async def __call__(self, route: Route) -> None:
+        request = route.request
+        self.requests += 1
+        if self.profile.blocks(request.resource_type, request.url):
+            self.blocked += 1
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+
+# Resolves true once the DOM has been quiet for quietMs with at least minChars of
+# text (or quiet three times as long, for pages that are simply short), false at maxMs.
+_SETTLE = """([quietMs, maxMs, minChars]) => new Promise((resolve) => {
+  const started = performance.now();
+  let last = started;
+  const observer = new MutationObserver(() => { last = performance.now(); });
+  observer.observe(document, {subtree: true, childList: true, characterData: true});
+  const done = (ready) => { observer.disconnect(); resolve(ready); };
+  const tick = () => {
+    const now = performance.now();
+    const quiet = now - last;
+    if (quiet >= quietMs * 3) return done(true);
+    if (quiet >= quietMs) {
+      const chars = document.body ? document.body.innerText.trim().length : 0;
+      if (chars >= minChars) return done(true);
+    }
+    if (now - started >= maxMs) return done(false);
+    setTimeout(tick, 50);
+  };
+  setTimeout(tick, 50);
+})"""
+
+
+async def settle(page: Page, profile: RenderProfile) -> bool:
+    """Wait until the page looks rendered; returns False if it gave up at the deadline."""
+    if profile.settle == "fixed":
+        await page.wait_for_timeout(profile.settle_ms)
+        return True
+    min_chars = profile.min_text_chars if profile.settle == "content" else 0
+    try:
+        return bool(await page.evaluate(_SETTLE, [profile.settle_ms, profile.max_settle_ms, min_chars]))
+    except Exception:
+        # A client-side redirect replaced the document mid-wait; take what is there.
+        return False
@@ -1,10 +1,14 @@
 import argparse
 import asyncio
 import json
+import time
 from pathlib import Path
+from typing import Union
 from urllib.parse import urlparse
 
-from playwright.async_api import async_playwright
+from playwright.async_api import BrowserContext, async_playwright
+
+from dynamic.profiles import PROFILES, RenderProfile, RequestFilter, get_profile, settle
 
 
 def _normalize_url(raw: str) -> str:
@@ -15,44 +19,113 @@ def _normalize_url(raw: str) -> str:
     return f"https://{raw}"
 
 
-async def scrape_page(url: str, *, timeout_ms: int = 45000) -> dict:
+# Image URLs come from the DOM, not from responses: profiles that block image
+# downloads still list every <img> (and lazy-loading data-src/srcset candidates).
+_IMAGE_URLS = """() => {
+  const urls = [];
+  const seen = new Set();
+  const add = (raw) => {
+    if (!raw) return;
+    let abs;
+    try { abs = new URL(raw.trim(), document.baseURI).href; } catch { return; }
+    if (!/^https?:/i.test(abs) || seen.has(abs)) return;
+    seen.add(abs);
+    urls.push(abs);
+  };
+  const first = (srcset) => srcset ? srcset.split(",")[0].trim().split(/\\s+/)[0] : "";
+  for (const img of document.images) {
+    add(img.currentSrc || img.getAttribute("src") || img.dataset.src || img.dataset.lazySrc
+        || first(img.getAttribute("srcset") || img.dataset.srcset));
+  }
+  for (const source of document.querySelectorAll("picture source[srcset]")) {
+    add(first(source.getAttribute("srcset")));
+  }
+  return urls;
+}"""
+
+
+def _ms(started: float) -> int:
+    return round((time.perf_counter() - started) * 1000)
+
+
+async def scrape_in_context(
+    context: BrowserContext,
+    url: str,
+    *,
+    timeout_ms: int = 45000,
+    profile: Union[str, RenderProfile, None] = None,
+) -> dict:
+    profile = get_profile(profile)
+    requests = RequestFilter(profile)
+    if profile.block_types or profile.block_hosts:
+        await context.route("**/*", requests)
+    page = await context.new_page()
+    started = time.perf_counter()
+    response = await page.goto(url, wait_until=profile.wait_until, timeout=timeout_ms)
+    loaded = time.perf_counter()
+    settled = await settle(page, profile)
+    settle_ms = _ms(loaded)
+
+    text = await page.locator("body").inner_text()
+    text_lines = [line.strip() for line in text.splitlines() if line.strip()]
+    images = await page.evaluate(_IMAGE_URLS)
+
+    data = {
+        "url": url,
+        "text": text_lines,
+        "images": images,
+        "render": {
+            "profile": profile.name,
+            "goto_ms": round((loaded - started) * 1000),
+            "settle_ms": settle_ms,
+            "total_ms": _ms(started),
+            "settled": settled,
+            "requests": requests.requests,
+            "blocked": requests.blocked,
+        },
+    }
+    if response is not None:
+        # The HTML as served, before scripts ran; lets the caller tell a client-rendered shell.
+        try:
+            data["shell_html"] = await response.text()
+        except Exception:
+            pass
+    return data
+
+
+async def scrape_page(url: str, *, timeout_ms: int = 45000, profile: Union[str, RenderProfile, None] = None) -> dict:
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
         try:
             context = await browser.new_context()
-            page = await context.new_page()
-
-            await page.goto(url, wait_until="networkidle", timeout=timeout_ms)
-            await page.wait_for_timeout(1500)
-
-            text = await page.locator("body").inner_text()
-            text_lines = [line.strip() for line in text.splitlines() if line.strip()]
-
-            images = await page.evaluate(
-                """() => {
-                  const urls = [];
-                  const seen = new Set();
-                  for (const img of document.images) {
-                    const raw = img.currentSrc || img.src || "";
-                    if (!raw) continue;
-                    let abs;
-                    try { abs = new URL(raw, document.baseURI).href; } catch { continue; }
-                    if (!/^https?:/i.test(abs)) continue;
-                    if (seen.has(abs)) continue;
-                    seen.add(abs);
-                    urls.push(abs);
-                  }
-                  return urls;
-                }"""
-            )
-
-            return {"url": url, "text": text_lines, "images": images}
+            return await scrape_in_context(context, url, timeout_ms=timeout_ms, profile=profile)
         finally:
             await browser.close()
 
 
-def scrape_page_sync(url: str, *, timeout_ms: int = 45000) -> dict:
-    return asyncio.run(scrape_page(url, timeout_ms=timeout_ms))
+def scrape_page_sync(url: str, *, timeout_ms: int = 45000, profile: Union[str, RenderProfile, None] = None) -> dict:
+    return asyncio.run(scrape_page(url, timeout_ms=timeout_ms, profile=profile))
+
+
+async def compare_profiles(url: str, *, timeout_ms: int = 45000, rounds: int = 1) -> list:
+    """Render ``url`` with every profile on one browser; what each one costs and finds."""
+    results = []
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            for name in PROFILES:
+                for _ in range(rounds):
+                    context = await browser.new_context()
+                    try:
+                        data = await scrape_in_context(context, url, timeout_ms=timeout_ms, profile=name)
+                    finally:
+                        await context.close()
+                    results.append(
+                        {**data["render"], "text_lines": len(data["text"]), "images": len(data["images"])}
+                    )
+        finally:
+            await browser.close()
+    return results
 
 
 def parse_args() -> argparse.Namespace:
@@ -72,6 +145,14 @@ def parse_args() -> argparse.Namespace:
         default=45000,
         help="Navigation timeout in milliseconds (default: 45000)",
     )
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=None, help="Render profile")
+    parser.add_argument(
+        "--compare",
+        type=int,
+        default=0,
+        metavar="ROUNDS",
+        help="Instead of writing JSON, render ROUNDS times per profile and print the timings",
+    )
     return parser.parse_args()
 
 
@@ -80,8 +161,12 @@ def main() -> None:
     url = _normalize_url(args.url)
     out_path = Path(args.out)
 
+    if args.compare:
+        for row in asyncio.run(compare_profiles(url, timeout_ms=args.timeout_ms, rounds=args.compare)):
+            print(json.dumps(row))
+        return
     try:
-        data = asyncio.run(scrape_page(url, timeout_ms=args.timeout_ms))
+        data = asyncio.run(scrape_page(url, timeout_ms=args.timeout_ms, profile=args.profile))
     except Exception as exc:
         raise SystemExit(f"Failed to scrape '{url}': {exc}")
 
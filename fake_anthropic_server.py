@@ -0,0 +1,238 @@
+"""Local stand-in for the Anthropic Messages + Message Batches API.
+
+Run it and point the app at it:
+    python fake_anthropic_server.py --rpm 50 --latency 0.8
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8002 CLAUDE_API_KEY=fake ...
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RISKY_WORDS = ("ammo", "gun", "cocaine", "fentanyl", "explosive", "fake id", "discreet")
+
+BATCHES = {}
+BATCHES_LOCK = threading.Lock()
+# Cached prompt prefixes: hash -> expiry. Like the real API, a prefix is only
+# cached above a minimum size and each hit refreshes its 5 minute lifetime.
+PROMPT_CACHE = {}
+PROMPT_CACHE_LOCK = threading.Lock()
+CACHE_TTL_SECONDS = 300
+CACHE_MIN_TOKENS = 1024
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, per_minute)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """Returns 0 when allowed, else seconds until a token is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+def _iso(ts: datetime) -> str:
+    return ts.isoformat().replace("+00:00", "Z")
+
+
+def _prompt_text(params: dict) -> str:
+    parts = []
+    for message in params.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+            continue
+        for block in content or []:
+            if block.get("type") == "text":
+                parts.append(block.get("text", ""))
+    return "\n".join(parts).lower()
+
+
+def _usage(params: dict) -> dict:
+    system = params.get("system") or []
+    blocks = [{"type": "text", "text": system}] if isinstance(system, str) else list(system)
+    for message in params.get("messages", []):
+        content = message.get("content")
+        blocks.extend([{"type": "text", "text": content}] if isinstance(content, str) else content or [])
+    tokens = {"input_tokens": sum(len(block.get("text", "")) for block in blocks) // 4, "output_tokens": 60}
+    marked = [index for index, block in enumerate(blocks) if block.get("cache_control")]
+    if not marked:
+        return tokens
+    # Everything up to and including the last breakpoint is the cached prefix.
+    prefix = "".join(block.get("text", "") for block in blocks[: marked[-1] + 1])
+    if len(prefix) // 4 < CACHE_MIN_TOKENS:
+        return tokens
+    key = hashlib.sha256(f"{params.get('model')}\0{prefix}".encode("utf-8")).hexdigest()
+    now = time.monotonic()
+    with PROMPT_CACHE_LOCK:
+        hit = PROMPT_CACHE.get(key, 0) > now
+        PROMPT_CACHE[key] = now + CACHE_TTL_SECONDS
+    tokens["input_tokens"] -= len(prefix) // 4
+    tokens["cache_read_input_tokens" if hit else "cache_creation_input_tokens"] = len(prefix) // 4
+    return tokens
+
+
+def _message(params: dict) -> dict:
+    text = _prompt_text(params)
+    hits = [word for word in RISKY_WORDS if word in text]
+    verdict = {
+        "site_context": "fake",
+        "risk_level": "high" if len(hits) > 1 else "low" if hits else "none",
+        "flags": hits,
+        "evidence": [{"type": "text", "snippet": word, "rationale": "keyword"} for word in hits],
+        "summary": "Canned verdict from the fake server.",
+    }
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "fake"),
+        "content": [{"type": "text", "text": json.dumps(verdict)}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": _usage(params),
+    }
+
+
+def _batch_view(batch: dict, base_url: str) -> dict:
+    done = time.time() >= batch["ready_at"]
+    count = len(batch["requests"])
+    return {
+        "id": batch["id"],
+        "type": "message_batch",
+        "processing_status": "ended" if done else "in_progress",
+        "request_counts": {
+            "processing": 0 if done else count,
+            "succeeded": count if done else 0,
+            "errored": 0,
+            "canceled": 0,
+            "expired": 0,
+        },
+        "created_at": _iso(batch["created_at"]),
+        "expires_at": _iso(batch["created_at"] + timedelta(hours=24)),
+        "ended_at": _iso(batch["created_at"] + timedelta(seconds=batch["ready_at"] - batch["t0"])) if done else None,
+        "archived_at": None,
+        "cancel_initiated_at": None,
+        "results_url": f"{base_url}/v1/messages/batches/{batch['id']}/results" if done else None,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = None
+    bucket = None
+
+    def log_message(self, fmt, *args) -> None:
+        if self.options.verbose:
+            super().log_message(fmt, *args)
+
+    def _base_url(self) -> str:
+        return f"http://{self.headers.get('Host', 'localhost')}"
+
+    def _send(self, status: int, body, content_type="application/json", headers=None) -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _rate_limited(self) -> bool:
+        wait = self.bucket.take()
+        if not wait:
+            return False
+        self._send(
+            429,
+            {"type": "error", "error": {"type": "rate_limit_error", "message": "rate limited"}},
+            headers={"retry-after": str(max(1, round(wait)))},
+        )
+        return True
+
+    def do_POST(self) -> None:
+        body = self._read_json()
+        if self.path == "/v1/messages":
+            if self._rate_limited():
+                return
+            time.sleep(self.options.latency)
+            self._send(200, _message(body))
+        elif self.path == "/v1/messages/batches":
+            if self._rate_limited():
+                return
+            now = datetime.now(timezone.utc)
+            t0 = time.time()
+            batch = {
+                "id": f"msgbatch_{uuid.uuid4().hex[:24]}",
+                "requests": body.get("requests", []),
+                "created_at": now,
+                "t0": t0,
+                "ready_at": t0 + self.options.batch_delay,
+            }
+            with BATCHES_LOCK:
+                BATCHES[batch["id"]] = batch
+            self._send(200, _batch_view(batch, self._base_url()))
+        else:
+            self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+    def do_GET(self) -> None:
+        parts = self.path.rstrip("/").split("/")
+        if len(parts) >= 5 and parts[1:4] == ["v1", "messages", "batches"]:
+            with BATCHES_LOCK:
+                batch = BATCHES.get(parts[4])
+            if batch is None:
+                self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": parts[4]}})
+                return
+            if len(parts) == 5:
+                self._send(200, _batch_view(batch, self._base_url()))
+                return
+            if parts[5] == "results" and time.time() >= batch["ready_at"]:
+                lines = [
+                    json.dumps(
+                        {
+                            "custom_id": item["custom_id"],
+                            "result": {"type": "succeeded", "message": _message(item["params"])},
+                        }
+                    )
+                    for item in batch["requests"]
+                ]
+                self._send(200, ("\n".join(lines) + "\n").encode("utf-8"), "application/binary")
+                return
+        self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Anthropic API for offline throughput tests.")
+    parser.add_argument("--port", type=int, default=8002, help="Port (default: 8002)")
+    parser.add_argument("--rpm", type=int, default=50, help="Requests per minute before 429s (default: 50)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per message (default: 0.5)")
+    parser.add_argument(
+        "--batch-delay", type=float, default=5.0, help="Seconds until a batch ends (default: 5)"
+    )
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    Handler.options = args
+    Handler.bucket = TokenBucket(args.rpm)
+    ThreadingHTTPServer(("0.0.0.0", args.port), Handler).serve_forever()
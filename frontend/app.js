@@ -45,14 +45,28 @@ async function api(path, options = {}) {
   return res.text();
 }
 
-async function loadRuns(jobId) {
-  const runs = await api(`/jobs/${jobId}/runs`);
-  return runs[0] || null;
+async function apiList(path) {
+  const items = [];
+  let cursor = null;
+  do {
+    const sep = path.includes("?") ? "&" : "?";
+    const url = cursor ? `${path}${sep}cursor=${encodeURIComponent(cursor)}` : path;
+    const res = await fetch(url);
+    if (!res.ok) {
+      const text = await res.text();
+      throw new Error(text || `HTTP ${res.status}`);
+    }
+    items.push(...(await res.json()));
+    cursor = res.headers.get("X-Next-Cursor");
+  } while (cursor);
+  return items;
 }
 
+const JOB_LIST_PATH = "/jobs?limit=500&fields=id,url,interval_seconds,status,latest_run";
+
 function renderResult(run) {
   if (!run) return { html: '<span class="empty">No runs yet</span>', risk: null };
-  if (run.status === "running") {
+  if (run.status === "running" || run.status === "queued") {
     return { html: '<span class="result">Loading</span>', risk: "loading" };
   }
   const risk = run.risk_level || "none";
@@ -111,75 +125,160 @@ function titleize(value) {
     .join(" ");
 }
 
+// Jobs shown in the list, keyed by id, newest first (same order as GET /jobs).
+let jobs = new Map();
+let live = false;
+let renderTimer = null;
+
 async function loadJobs() {
   showError("");
+  try {
+    const items = await apiList(JOB_LIST_PATH);
+    jobs = new Map(items.map((job) => [job.id, job]));
+    render();
+  } catch (e) {
+    showError("Failed to load jobs: " + e.message);
+    document.getElementById("jobList").innerHTML = "";
+  }
+}
+
+function scheduleRender() {
+  if (renderTimer) return;
+  renderTimer = setTimeout(() => {
+    renderTimer = null;
+    render();
+  }, 100);
+}
+
+function render() {
   const listEl = document.getElementById("jobList");
   const alertsEl = document.getElementById("alerts");
   const alertListEl = document.getElementById("alertList");
-  try {
-    const jobs = await api("/jobs");
-    if (jobs.length === 0) {
-      listEl.innerHTML = '<li class="empty">No jobs yet. Add one above.</li>';
-      alertsEl.style.display = "none";
-      return;
-    }
-    const alerts = [];
-    const html = await Promise.all(
-      jobs.map(async (job) => {
-        const run = await loadRuns(job.id);
-        if (run && run.risk_level && run.risk_level !== "none") {
-          const flags = (run.flags && run.flags.length)
-            ? run.flags.map((flag) => titleize(flag.replace(/_/g, " "))).join(", ")
-            : "Risk detected";
-          alerts.push({
-            url: job.url,
-            flags,
-            finished_at: run.finished_at || "",
-            risk_at: run.risk_at || "",
-            site_context: run.site_context ? titleize(run.site_context) : "",
-            summary: run.summary || ""
-          });
-        }
-        return renderJob(job, run);
-      })
-    );
-    listEl.innerHTML = html.join("");
-    if (alerts.length) {
-      alertListEl.innerHTML = alerts
-        .map(
-          (item) =>
-            `<li>
-              <strong>${escapeHtml(item.url)}</strong>
-              <div>Flagged content: ${escapeHtml(item.flags)}</div>
-              ${item.site_context ? `<div>Context: ${escapeHtml(item.site_context)}</div>` : ""}
-              ${item.summary ? `<div>Summary: ${escapeHtml(item.summary)}</div>` : ""}
-              ${item.risk_at ? `<div>Detected: ${escapeHtml(formatTimestamp(item.risk_at))}</div>` : ""}
-              ${item.finished_at ? `<div>Last checked: ${escapeHtml(formatTimestamp(item.finished_at))}</div>` : ""}
-            </li>`
-        )
-        .join("");
-      alertsEl.style.display = "block";
-    } else {
-      alertsEl.style.display = "none";
-      alertListEl.innerHTML = "";
+  if (jobs.size === 0) {
+    listEl.innerHTML = '<li class="empty">No jobs yet. Add one above.</li>';
+    alertsEl.style.display = "none";
+    return;
+  }
+  const alerts = [];
+  const html = [...jobs.values()].map((job) => {
+    const run = job.latest_run;
+    if (run && run.risk_level && run.risk_level !== "none") {
+      const flags = (run.flags && run.flags.length)
+        ? run.flags.map((flag) => titleize(flag.replace(/_/g, " "))).join(", ")
+        : "Risk detected";
+      alerts.push({
+        url: job.url,
+        flags,
+        finished_at: run.finished_at || "",
+        risk_at: run.risk_at || "",
+        site_context: run.site_context ? titleize(run.site_context) : "",
+        summary: run.summary || ""
+      });
     }
-    listEl.querySelectorAll(".job").forEach((node) => {
-      const jobId = node.dataset.jobId;
-      node.querySelector('[data-action="run"]').addEventListener("click", () => runNow(jobId));
-      node.querySelector('[data-action="toggle"]').addEventListener("click", () => toggleJob(jobId, node));
-      node.querySelector('[data-action="delete"]').addEventListener("click", () => deleteJob(jobId));
-    });
-  } catch (e) {
-    showError("Failed to load jobs: " + e.message);
-    listEl.innerHTML = "";
+    return renderJob(job, run);
+  });
+  listEl.innerHTML = html.join("");
+  if (alerts.length) {
+    alertListEl.innerHTML = alerts
+      .map(
+        (item) =>
+          `<li>
+            <strong>${escapeHtml(item.url)}</strong>
+            <div>Flagged content: ${escapeHtml(item.flags)}</div>
+            ${item.site_context ? `<div>Context: ${escapeHtml(item.site_context)}</div>` : ""}
+            ${item.summary ? `<div>Summary: ${escapeHtml(item.summary)}</div>` : ""}
+            ${item.risk_at ? `<div>Detected: ${escapeHtml(formatTimestamp(item.risk_at))}</div>` : ""}
+            ${item.finished_at ? `<div>Last checked: ${escapeHtml(formatTimestamp(item.finished_at))}</div>` : ""}
+          </li>`
+      )
+      .join("");
+    alertsEl.style.display = "block";
+  } else {
+    alertsEl.style.display = "none";
+    alertListEl.innerHTML = "";
+  }
+  listEl.querySelectorAll(".job").forEach((node) => {
+    const jobId = node.dataset.jobId;
+    node.querySelector('[data-action="run"]').addEventListener("click", () => runNow(jobId));
+    node.querySelector('[data-action="toggle"]').addEventListener("click", () => toggleJob(jobId, node));
+    node.querySelector('[data-action="delete"]').addEventListener("click", () => deleteJob(jobId));
+  });
+}
+
+function applyJob(type, job) {
+  if (type === "job.deleted") {
+    jobs.delete(job.id);
+  } else if (jobs.has(job.id)) {
+    jobs.set(job.id, { ...job, latest_run: jobs.get(job.id).latest_run });
+  } else {
+    jobs = new Map([[job.id, { ...job, latest_run: null }], ...jobs]);
+  }
+  scheduleRender();
+}
+
+function applyRun(run) {
+  const job = jobs.get(run.job_id);
+  if (!job) return;
+  const current = job.latest_run;
+  // Events can arrive for an older run (e.g. a batch result landing late).
+  if (current && current.id !== run.id && current.started_at > run.started_at) return;
+  job.latest_run = run;
+  scheduleRender();
+}
+
+// Reload the list after an action only when the event stream isn't delivering the change.
+async function refresh() {
+  if (!live) await loadJobs();
+}
+
+function connectEvents() {
+  if (!window.EventSource) {
+    loadJobs();
+    setInterval(loadJobs, 15000);
+    return;
   }
+  let loaded = false;
+  let failures = 0;
+  let pollTimer = null;
+  const source = new EventSource("/events");
+  source.addEventListener("ready", () => {
+    live = true;
+    failures = 0;
+    if (pollTimer) {
+      clearInterval(pollTimer);
+      pollTimer = null;
+    }
+    if (!loaded) {
+      loaded = true;
+      loadJobs();
+    }
+  });
+  source.addEventListener("reset", () => loadJobs());
+  source.addEventListener("jobs.bulk", () => loadJobs());
+  ["job.created", "job.updated", "job.deleted"].forEach((type) =>
+    source.addEventListener(type, (e) => applyJob(type, JSON.parse(e.data)))
+  );
+  ["run.started", "run.updated", "run.finished"].forEach((type) =>
+    source.addEventListener(type, (e) => applyRun(JSON.parse(e.data)))
+  );
+  source.onerror = () => {
+    // The browser reconnects on its own and resumes from the last event id;
+    // poll meanwhile if the stream keeps failing.
+    live = false;
+    failures += 1;
+    if (!loaded) {
+      loaded = true;
+      loadJobs();
+    }
+    if (failures >= 3 && !pollTimer) pollTimer = setInterval(loadJobs, 15000);
+  };
 }
 
 async function runNow(jobId) {
   showError("");
   try {
     await api(`/jobs/${jobId}/run`, { method: "POST" });
-    await loadJobs();
+    await refresh();
   } catch (e) {
     showError("Run now failed: " + e.message);
   }
@@ -189,7 +288,7 @@ async function deleteJob(jobId) {
   showError("");
   try {
     await api(`/jobs/${jobId}`, { method: "DELETE" });
-    await loadJobs();
+    await refresh();
   } catch (e) {
     showError("Delete failed: " + e.message);
   }
@@ -201,7 +300,7 @@ async function toggleJob(jobId, node) {
   const nextStatus = isActive ? "paused" : "active";
   try {
     await api(`/jobs/${jobId}`, { method: "PATCH", body: { status: nextStatus } });
-    await loadJobs();
+    await refresh();
   } catch (e) {
     showError("Update status failed: " + e.message);
   }
@@ -222,7 +321,7 @@ document.getElementById("createForm").addEventListener("submit", async (e) => {
       }
     });
     document.getElementById("url").value = "";
-    await loadJobs();
+    await refresh();
   } catch (e) {
     showError("Failed to create job: " + e.message);
   }
@@ -232,13 +331,11 @@ document.getElementById("clearAll").addEventListener("click", async () => {
   showError("");
   if (!confirm("Clear all jobs? This cannot be undone.")) return;
   try {
-    const jobs = await api("/jobs");
-    await Promise.all(jobs.map((job) => api(`/jobs/${job.id}`, { method: "DELETE" })));
-    await loadJobs();
+    await api("/jobs/bulk", { method: "POST", body: { action: "delete", all: true } });
+    await refresh();
   } catch (e) {
     showError("Clear all failed: " + e.message);
   }
 });
 
-loadJobs();
-setInterval(loadJobs, 15000);
+connectEvents();
@@ -1,12 +1,23 @@
 import argparse
+import asyncio
+import hashlib
 import json
 from pathlib import Path
 from typing import Any, Dict, List
 from urllib.parse import urljoin, urlparse
 
-import requests
+import httpx
 from bs4 import BeautifulSoup
 
+try:
+    import lxml.html as lxml_html
+except ImportError:
+    lxml_html = None
+
+
+BACKENDS = ("html.parser", "lxml")
+TEXT_TAGS = ("p", "h1", "h2", "h3", "li")
+SKIP_TAGS = ("script", "style", "noscript")
 
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; URLValidatorBot/1.0; +https://example.com/bot)"
@@ -21,18 +32,103 @@ def normalize_url(raw: str) -> str:
     return f"https://{raw}"
 
 
-def fetch_html(url: str, timeout: int = 15, headers: Dict[str, str] | None = None) -> str:
-    response = requests.get(url, timeout=timeout, headers=headers or DEFAULT_HEADERS)
+def conditional_headers(validators: Dict[str, Any] | None) -> Dict[str, str]:
+    headers = dict(DEFAULT_HEADERS)
+    if not validators:
+        return headers
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def _page_result(response: httpx.Response, validators: Dict[str, Any] | None) -> Dict[str, Any]:
+    previous = validators or {}
+    if response.status_code == 304:
+        return {
+            "not_modified": True,
+            "html": None,
+            "validators": {
+                "etag": response.headers.get("etag") or previous.get("etag"),
+                "last_modified": response.headers.get("last-modified") or previous.get("last_modified"),
+                "body_hash": previous.get("body_hash"),
+            },
+        }
+    response.raise_for_status()
+    body_hash = hashlib.sha256(response.content).hexdigest()
+    return {
+        "not_modified": bool(previous.get("body_hash")) and body_hash == previous.get("body_hash"),
+        "html": response.text,
+        "validators": {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "body_hash": body_hash,
+        },
+    }
+
+
+def fetch_page(
+    url: str,
+    timeout: int = 15,
+    client: httpx.Client | None = None,
+    validators: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    """Fetch ``url``; ``not_modified`` is set on a 304 or a byte-identical body."""
+    if client is None:
+        with httpx.Client(follow_redirects=True) as own_client:
+            return fetch_page(url, timeout, own_client, validators)
+    response = client.get(url, timeout=timeout, headers=conditional_headers(validators))
+    return _page_result(response, validators)
+
+
+async def fetch_page_async(
+    url: str,
+    timeout: int = 15,
+    client: httpx.AsyncClient | None = None,
+    validators: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    if client is None:
+        async with httpx.AsyncClient(follow_redirects=True) as own_client:
+            return await fetch_page_async(url, timeout, own_client, validators)
+    response = await client.get(url, timeout=timeout, headers=conditional_headers(validators))
+    return _page_result(response, validators)
+
+
+def fetch_html(
+    url: str,
+    timeout: int = 15,
+    headers: Dict[str, str] | None = None,
+    client: httpx.Client | None = None,
+) -> str:
+    if client is None:
+        with httpx.Client(follow_redirects=True) as own_client:
+            return fetch_html(url, timeout, headers, own_client)
+    response = client.get(url, timeout=timeout, headers=headers or DEFAULT_HEADERS)
+    response.raise_for_status()
+    return response.text
+
+
+async def fetch_html_async(
+    url: str,
+    timeout: int = 15,
+    headers: Dict[str, str] | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> str:
+    if client is None:
+        async with httpx.AsyncClient(follow_redirects=True) as own_client:
+            return await fetch_html_async(url, timeout, headers, own_client)
+    response = await client.get(url, timeout=timeout, headers=headers or DEFAULT_HEADERS)
     response.raise_for_status()
     return response.text
 
 
 def extract_text(soup: BeautifulSoup) -> List[str]:
-    for tag in soup(["script", "style", "noscript"]):
+    for tag in soup(list(SKIP_TAGS)):
         tag.decompose()
 
     texts: List[str] = []
-    for element in soup.find_all(["p", "h1", "h2", "h3", "li"]):
+    for element in soup.find_all(list(TEXT_TAGS)):
         text = element.get_text(separator=" ", strip=True)
         if text:
             texts.append(text)
@@ -51,7 +147,126 @@ def extract_images(soup: BeautifulSoup, base_url: str) -> List[Dict[str, str]]:
     return images
 
 
-def parse_page(html: str, base_url: str) -> Dict[str, Any]:
+def _follow(rel: str | None) -> bool:
+    return "nofollow" not in (rel or "").lower()
+
+
+def _meta_nofollow(content: str | None) -> bool:
+    return any(token.strip() in ("nofollow", "none") for token in (content or "").lower().split(","))
+
+
+def _join_links(base_url: str, base_href: str | None, hrefs: List[str]) -> List[str]:
+    base = urljoin(base_url, base_href) if base_href else base_url
+    links = []
+    for href in hrefs:
+        href = href.strip()
+        if href and not href.startswith("#"):
+            links.append(urljoin(base, href))
+    return links
+
+
+def extract_links(soup: BeautifulSoup, base_url: str) -> List[str]:
+    """Absolute targets of followable ``<a href>``s (none if the page says nofollow)."""
+    meta = soup.find("meta", attrs={"name": lambda value: value and value.lower() == "robots"})
+    if meta is not None and _meta_nofollow(meta.get("content")):
+        return []
+    base = soup.find("base", href=True)
+    hrefs = [a["href"] for a in soup.find_all("a", href=True) if _follow(" ".join(a.get("rel") or []))]
+    return _join_links(base_url, base["href"] if base else None, hrefs)
+
+
+def _lxml_links(root: Any, base_url: str) -> List[str]:
+    for meta in root.iter("meta"):
+        if (meta.get("name") or "").lower() == "robots" and _meta_nofollow(meta.get("content")):
+            return []
+    base = next((el.get("href") for el in root.iter("base") if el.get("href")), None)
+    hrefs = [a.get("href") for a in root.iter("a") if a.get("href") and _follow(a.get("rel"))]
+    return _join_links(base_url, base, hrefs)
+
+
+def _lxml_root(html: str) -> Any:
+    try:
+        return lxml_html.document_fromstring(html)
+    except ValueError:
+        # Strings with an XML encoding declaration must be parsed as bytes.
+        return lxml_html.document_fromstring(html.encode("utf-8"), parser=lxml_html.HTMLParser(encoding="utf-8"))
+
+
+def page_links(html: str, base_url: str, backend: str = "html.parser") -> List[str]:
+    """Only the links of a page; cheaper than ``parse_page`` when its content is known."""
+    if backend == "lxml" and lxml_html is not None:
+        try:
+            return _lxml_links(_lxml_root(html), base_url)
+        except Exception:
+            pass
+    return extract_links(BeautifulSoup(html, "html.parser"), base_url)
+
+
+def _lxml_strings(root: Any) -> List[str]:
+    """Text nodes under ``root`` in document order, like BeautifulSoup's
+    ``_all_strings``: comments and script/style/noscript content are skipped."""
+    strings: List[str] = []
+    stack: List[Any] = [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            strings.append(item)
+            continue
+        if not isinstance(item.tag, str) or item.tag in SKIP_TAGS:
+            continue
+        pending: List[Any] = [item.text] if item.text else []
+        for child in item:
+            pending.append(child)
+            if child.tail:
+                pending.append(child.tail)
+        stack.extend(reversed(pending))
+    return strings
+
+
+def _lxml_get_text(element: Any, separator: str = "") -> str:
+    return separator.join(s.strip() for s in _lxml_strings(element) if s.strip())
+
+
+_NOT_SKIPPED = "[not(" + " or ".join(f"ancestor::{tag}" for tag in SKIP_TAGS) + ")]"
+_TEXT_XPATH = "//*[" + " or ".join(f"self::{tag}" for tag in TEXT_TAGS) + "]" + _NOT_SKIPPED
+_IMG_XPATH = "//img" + _NOT_SKIPPED
+
+
+def _parse_page_lxml(html: str, base_url: str, links: bool = False) -> Dict[str, Any]:
+    root = _lxml_root(html)
+    title_tag = next(root.iter("title"), None)
+    texts = [text for text in (_lxml_get_text(el, " ") for el in root.xpath(_TEXT_XPATH)) if text]
+    images = [
+        {"src": urljoin(base_url, img.get("src")), "alt": img.get("alt") or ""}
+        for img in root.xpath(_IMG_XPATH)
+        if img.get("src")
+    ]
+    data = {
+        "url": base_url,
+        "title": _lxml_get_text(title_tag) if title_tag is not None else "",
+        "text": texts,
+        "images": images,
+    }
+    if links:
+        data["links"] = _lxml_links(root, base_url)
+    return data
+
+
+def parse_page(html: str, base_url: str, backend: str = "html.parser", links: bool = False) -> Dict[str, Any]:
+    """Extract title, text blocks and images.
+
+    ``backend="lxml"`` walks the lxml tree directly and is several times faster.
+    For well-formed pages it returns the same result as ``html.parser``. On broken
+    markup the parsers can repair the tree differently, e.g. lxml closes an
+    unclosed ``<p>`` where html.parser nests the next one inside it.
+
+    ``links=True`` adds the page's followable links as ``links``.
+    """
+    if backend == "lxml" and lxml_html is not None:
+        try:
+            return _parse_page_lxml(html, base_url, links)
+        except Exception:
+            pass
     soup = BeautifulSoup(html, "html.parser")
     title_tag = soup.find("title")
     title = title_tag.get_text(strip=True) if title_tag else ""
@@ -59,20 +274,31 @@ def parse_page(html: str, base_url: str) -> Dict[str, Any]:
     text_blocks = extract_text(soup)
     images = extract_images(soup, base_url)
 
-    return {
+    data = {
         "url": base_url,
         "title": title,
         "text": text_blocks,
         "images": images,
     }
+    if links:
+        data["links"] = extract_links(soup, base_url)
+    return data
 
 
-def scrape_static(url: str, timeout: int = 15) -> Dict[str, Any]:
+def scrape_static(url: str, timeout: int = 15, client: httpx.Client | None = None) -> Dict[str, Any]:
     normalized = normalize_url(url)
-    html = fetch_html(normalized, timeout=timeout)
+    html = fetch_html(normalized, timeout=timeout, client=client)
     return parse_page(html, normalized)
 
 
+async def scrape_static_async(
+    url: str, timeout: int = 15, client: httpx.AsyncClient | None = None
+) -> Dict[str, Any]:
+    normalized = normalize_url(url)
+    html = await fetch_html_async(normalized, timeout=timeout, client=client)
+    return await asyncio.to_thread(parse_page, html, normalized)
+
+
 def derive_output_filename(url: str) -> Path:
     parsed = urlparse(url)
     host = parsed.netloc or "output"
@@ -102,7 +328,7 @@ def main() -> None:
 
     try:
         data = scrape_static(url)
-    except requests.RequestException as exc:
+    except httpx.HTTPError as exc:
         raise SystemExit(f"Failed to fetch '{url}': {exc}")
 
     if args.output:
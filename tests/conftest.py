@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+# Settings are read once at import; keep a stray import away from data/app.db.
+os.environ.setdefault("DB_PATH", str(Path(tempfile.mkdtemp()) / "import.db"))
+
+from app import config  # noqa: E402
+from app.db import close_connections, init_db  # noqa: E402
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Call with overrides to swap SETTINGS in every loaded module that imported it."""
+
+    def override(**values):
+        current = config.SETTINGS
+        updated = replace(current, **values)
+        for name, module in list(sys.modules.items()):
+            if name.split(".")[0] in ("app", "static", "dynamic") and getattr(module, "SETTINGS", None) is current:
+                monkeypatch.setattr(module, "SETTINGS", updated)
+        return updated
+
+    return override
+
+
+@pytest.fixture
+def db(settings, tmp_path):
+    """A fresh, fully migrated database for the test."""
+    close_connections()
+    settings(db_path=tmp_path / "app.db", archive_dir=tmp_path / "archive", image_cache_dir=tmp_path / "images")
+    init_db()
+    yield tmp_path / "app.db"
+    close_connections()
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.alerts import alert_fingerprint, evaluate_alerts
+from app.db import execute, fetch_all
+
+A = {"risk_level": "high", "flags": ["weapons"], "evidence": ["Sells pistols"]}
+# A reworded by the model: same incident.
+A2 = {"risk_level": "high", "flags": ["Weapons "], "evidence": ["sells  pistols!"]}
+# Same flags as A, different evidence.
+A3 = {"risk_level": "high", "flags": ["weapons"], "evidence": ["Ammunition in bulk"]}
+B = {"risk_level": "high", "flags": ["weapons", "drugs"], "evidence": ["Pills shipped discreetly"]}
+CLEAN = {"risk_level": "none", "flags": [], "evidence": []}
+
+HOUR = 3600
+CASES = {
+    # The flip sequence from the original change: three messages, not one per risky run.
+    "flip": (
+        {},
+        HOUR,
+        [A, A2, B, A, B, CLEAN],
+        [["alert.opened"], [], ["alert.opened+replaces"], [], [], ["alert.resolved"]],
+    ),
+    "clean_without_alert": ({}, HOUR, [CLEAN, CLEAN], [[], []]),
+    "reopen_within_renotify_window_is_silent": ({}, HOUR, [A, CLEAN, A], [["alert.opened"], ["alert.resolved"], []]),
+    "reopen_after_renotify_window": (
+        {"alert_renotify_seconds": 1800},
+        HOUR,
+        [A, CLEAN, A],
+        [["alert.opened"], ["alert.resolved"], ["alert.opened"]],
+    ),
+    "reminders": (
+        {"alert_remind_seconds": 60},
+        HOUR,
+        [A, A2, A],
+        [["alert.opened"], ["alert.ongoing"], ["alert.ongoing"]],
+    ),
+    "no_reminder_before_interval": ({"alert_remind_seconds": 2 * HOUR}, HOUR, [A, A], [["alert.opened"], []]),
+    # Never told it resolved, so its return is not news either.
+    "resolved_notifications_off": (
+        {"alert_notify_resolved": False},
+        HOUR,
+        [A, CLEAN, A],
+        [["alert.opened"], [], []],
+    ),
+    "new_evidence_is_a_new_alert": ({}, HOUR, [A, A3], [["alert.opened"], ["alert.opened+replaces"]]),
+    "evidence_not_keyed": ({"alert_key_evidence": False}, HOUR, [A, A3], [["alert.opened"], []]),
+    "low_then_high_is_a_new_alert": (
+        {},
+        HOUR,
+        [dict(A, risk_level="low"), A],
+        [["alert.opened"], ["alert.opened+replaces"]],
+    ),
+}
+
+
+def _events(payloads):
+    return [payload["event"] + ("+replaces" if payload["alert"].get("replaces") else "") for payload in payloads]
+
+
+@pytest.fixture
+def job(db):
+    execute(
+        """
+        INSERT INTO jobs (id, url, interval_seconds, mode, webhook_url, status, created_at, updated_at)
+        VALUES ('job', 'http://site.test/', 300, 'static', '', 'active', '2026-01-01', '2026-01-01')
+        """
+    )
+    execute("INSERT INTO job_state (job_id) VALUES ('job')")
+    return {"id": "job", "url": "http://site.test/"}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_alert_sequences(job, settings, name):
+    overrides, age, verdicts, expected = CASES[name]
+    settings(**{"alert_renotify_seconds": 6 * HOUR, "alert_remind_seconds": 0, **overrides})
+    # Runs finished ``age`` ago, a minute apart; reminder and renotify windows are
+    # measured from then to the wall clock.
+    start = datetime.now(timezone.utc) - timedelta(seconds=age)
+    seen = []
+    for step, verdict in enumerate(verdicts):
+        finished_at = (start + timedelta(minutes=step)).isoformat()
+        seen.append(_events(evaluate_alerts(job, f"run-{step}", verdict, finished_at)))
+    assert seen == expected
+
+
+def test_flip_sequence_leaves_every_alert_resolved(job, settings):
+    settings(alert_renotify_seconds=6 * HOUR, alert_remind_seconds=0)
+    replaces = []
+    for step, verdict in enumerate([A, A2, B, A, B, CLEAN]):
+        for payload in evaluate_alerts(job, f"run-{step}", verdict, datetime.now(timezone.utc).isoformat()):
+            replaces.extend(payload["alert"].get("replaces", []))
+    rows = fetch_all("SELECT id, fingerprint, state, notified_state FROM alerts ORDER BY id")
+    assert [row["fingerprint"] for row in rows] == [alert_fingerprint(A), alert_fingerprint(B)]
+    assert [(row["state"], row["notified_state"]) for row in rows] == [("resolved", "resolved")] * 2
+    assert replaces == [rows[0]["id"]]
@@ -0,0 +1,48 @@
+import time
+
+import httpx
+
+from app import analysis
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def _trickle():
+    while True:
+        time.sleep(0.05)
+        yield b"\x00" * 16
+
+
+def _images(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/slow.png":
+        return httpx.Response(200, content=_trickle(), headers={"content-type": "image/png"})
+    return httpx.Response(200, content=PNG + request.url.path.encode(), headers={"content-type": "image/png"})
+
+
+def test_image_fetches_stop_at_the_deadline(settings, monkeypatch):
+    settings(image_fetch_deadline_seconds=0.5, image_fetch_concurrency=2, image_cache_enabled=False)
+    client = httpx.Client(transport=httpx.MockTransport(_images))
+    monkeypatch.setattr(analysis, "get_client", lambda: client)
+    finished = {}
+    fetch = analysis._fetch_image
+
+    def timed(url, deadline):
+        try:
+            return fetch(url, deadline)
+        finally:
+            finished[url] = time.monotonic()
+
+    monkeypatch.setattr(analysis, "_fetch_image", timed)
+
+    started = time.monotonic()
+    urls = ["http://img.test/slow.png", "http://img.test/a.png", "http://img.test/b.png"]
+    images = analysis._collect_images(urls)
+    assert time.monotonic() - started < 1.0
+    assert sorted(image.url for image in images) == urls[1:]
+
+    # The slow download gives up by itself rather than running on in the pool.
+    for _ in range(20):
+        if urls[0] in finished:
+            break
+        time.sleep(0.05)
+    assert finished[urls[0]] - started < 1.0
@@ -0,0 +1,147 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app import batching
+from app.db import execute, fetch_one
+from app.image_cache import IMAGE_CACHE
+from app.prompt import build_params, inline_images, stash_images
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+class FakeBatches:
+    def __init__(self, results, before=None):
+        self._results = results
+        self._before = before
+
+    def retrieve(self, batch_id):
+        return SimpleNamespace(processing_status="ended")
+
+    def results(self, batch_id):
+        if self._before:
+            # Another poller closes the rows after ours has read them.
+            self._before()
+        yield from self._results
+
+
+def _item(run_id, kind="succeeded"):
+    result = SimpleNamespace(type=kind, message="message", error="overloaded")
+    return SimpleNamespace(custom_id=run_id, result=result)
+
+
+@pytest.fixture
+def submitted(db, monkeypatch):
+    execute(
+        """
+        INSERT INTO jobs (id, url, interval_seconds, mode, webhook_url, status, created_at, updated_at)
+        VALUES ('job', 'http://site.test/', 300, 'static', '', 'active', '2026-01-01', '2026-01-01')
+        """
+    )
+    for run_id in ("r1", "r2"):
+        execute(
+            "INSERT INTO runs (id, job_id, started_at, status) VALUES (?, 'job', '2026-01-01', 'queued')",
+            (run_id,),
+        )
+        execute(
+            """
+            INSERT INTO llm_batch_requests (run_id, job_id, params, context, state, batch_id, created_at)
+            VALUES (?, 'job', '{}', ?, 'submitted', 'batch', '2026-01-01')
+            """,
+            (run_id, json.dumps({})),
+        )
+    finished = []
+    monkeypatch.setattr(batching, "_finish", lambda row, message: finished.append(row["run_id"]))
+
+    def poll(results, before=None):
+        client = SimpleNamespace(messages=SimpleNamespace(batches=FakeBatches(results, before)))
+        monkeypatch.setattr(batching, "get_anthropic_client", lambda: client)
+        return batching.poll_submitted()
+
+    return poll, finished
+
+
+def _state(run_id):
+    row = fetch_one(
+        "SELECT b.state, r.status, r.error FROM llm_batch_requests b JOIN runs r ON r.id = b.run_id WHERE r.id = ?",
+        (run_id,),
+    )
+    return tuple(row)
+
+
+def test_results_close_each_request_once(submitted):
+    poll, finished = submitted
+    assert poll([_item("r1"), _item("r2", "errored")]) == 2
+    assert finished == ["r1"]
+    assert _state("r1")[0] == "done"
+    assert _state("r2") == ("failed", "failed", "batch request errored: overloaded")
+    stored = fetch_one("SELECT COUNT(*) FROM llm_batch_requests WHERE params != '' OR context != ''")
+    assert stored[0] == 0
+
+
+def test_rows_closed_by_another_poller_are_skipped(submitted):
+    poll, finished = submitted
+
+    def other_poller():
+        execute("UPDATE llm_batch_requests SET state = 'done'")
+        execute("UPDATE runs SET status = 'success'")
+
+    assert poll([_item("r1"), _item("r2", "errored")], before=other_poller) == 0
+    assert finished == []
+    assert _state("r1") == _state("r2") == ("done", "success", None)
+
+
+def test_missing_results_are_not_failed_twice(submitted):
+    poll, _ = submitted
+    assert poll([], before=lambda: execute("UPDATE llm_batch_requests SET state = 'done' WHERE run_id = 'r1'")) == 1
+    assert _state("r1")[:2] == ("done", "queued")
+    assert _state("r2") == ("failed", "failed", "missing from batch results")
+
+
+def test_a_failed_finish_rolls_back_the_claim(submitted, monkeypatch):
+    poll, _ = submitted
+
+    def broken(row, message):
+        execute("UPDATE runs SET status = 'success' WHERE id = ?", (row["run_id"],))
+        raise ValueError("bad verdict")
+
+    monkeypatch.setattr(batching, "_finish", broken)
+    assert poll([_item("r1")], before=lambda: execute("DELETE FROM llm_batch_requests WHERE run_id = 'r2'")) == 1
+    assert _state("r1") == ("failed", "failed", "bad verdict")
+
+
+def test_queued_params_reference_cached_images(db, monkeypatch, tmp_path):
+    monkeypatch.setattr(IMAGE_CACHE, "root", tmp_path / "images")
+    image = IMAGE_CACHE.store("http://img.test/a.png", "image/png", PNG)
+    params, _ = build_params("http://site.test/", ["Some text."], [image.url], [image])
+    stashed = stash_images(params, [image.content_hash])
+    assert params["messages"][0]["content"][-1]["source"]["data"] not in json.dumps(stashed)
+    assert inline_images(stashed) == params
+
+    # Evicted before the batch went out: sent without the image rather than failing.
+    IMAGE_CACHE._blob_path(image.content_hash).unlink()
+    assert [block["type"] for block in inline_images(stashed)["messages"][0]["content"]] == ["text"]
+
+
+def test_flush_inlines_images(db, monkeypatch, tmp_path):
+    monkeypatch.setattr(IMAGE_CACHE, "root", tmp_path / "images")
+    image = IMAGE_CACHE.store("http://img.test/a.png", "image/png", PNG)
+    params, _ = build_params("http://site.test/", ["Some text."], [image.url], [image])
+    execute(
+        """
+        INSERT INTO llm_batch_requests (run_id, job_id, params, context, state, created_at)
+        VALUES ('r1', 'job', ?, '{}', 'pending', '2026-01-01')
+        """,
+        (json.dumps(stash_images(params, [image.content_hash])),),
+    )
+    sent = []
+
+    def create(requests):
+        sent.extend(requests)
+        return SimpleNamespace(id="batch")
+
+    client = SimpleNamespace(messages=SimpleNamespace(batches=SimpleNamespace(create=create)))
+    monkeypatch.setattr(batching, "get_anthropic_client", lambda: client)
+    assert batching.flush_pending() == 1
+    assert sent == [{"custom_id": "r1", "params": params}]
@@ -0,0 +1,57 @@
+import httpx
+import pytest
+
+from app import crawl
+from app.db import fetch_all
+
+PAGES = [f"p{number}" for number in range(1, 6)]
+SITEMAP = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+    + "".join(f"<url><loc>http://site.test/{page}</loc><lastmod>2020-01-01</lastmod></url>" for page in PAGES)
+    + "</urlset>"
+)
+
+
+def _site(request: httpx.Request) -> httpx.Response:
+    path = request.url.path.strip("/")
+    if path == "sitemap.xml":
+        return httpx.Response(200, text=SITEMAP, headers={"content-type": "application/xml"})
+    if path in PAGES:
+        body = f"<html><body><p>Page {path} has its own text.</p></body></html>"
+        return httpx.Response(200, text=body, headers={"content-type": "text/html"})
+    return httpx.Response(404)
+
+
+@pytest.fixture
+def crawler(db, settings, monkeypatch):
+    settings(crawl_max_analyses=1, prefilter_enabled=False, parse_workers=0, crawl_max_delay_seconds=0)
+    analyzed = []
+
+    def analyze(url, text, images, site_context, alts):
+        analyzed.append(url)
+        return {"risk_level": "none", "flags": [], "evidence": [], "summary": ""}
+
+    monkeypatch.setattr(crawl, "analyze_content", analyze)
+    client = httpx.Client(transport=httpx.MockTransport(_site), follow_redirects=True)
+    job = {"id": "job-1", "url": "http://site.test/p1", "mode": "crawl"}
+    yield lambda: crawl.Crawler(job, client).run(), analyzed
+    client.close()
+
+
+def test_deferred_pages_are_not_fresh_by_sitemap(crawler):
+    run, analyzed = crawler
+
+    first = run()
+    assert (first["changed"], first["deferred"], first["sitemap_fresh"]) == (1, 4, 0)
+
+    second = run()
+    # Only the analyzed page counts as seen since its sitemap lastmod.
+    assert (second["changed"], second["deferred"], second["sitemap_fresh"]) == (1, 3, 1)
+
+    for _ in range(3):
+        run()
+    assert sorted(analyzed) == [f"http://site.test/{page}" for page in PAGES]
+    rows = fetch_all("SELECT content_hash FROM crawl_pages WHERE job_id = 'job-1'")
+    assert len(rows) == len(PAGES) and all(row["content_hash"] for row in rows)
+    assert run()["sitemap_fresh"] == len(PAGES)
@@ -0,0 +1,28 @@
+import hashlib
+
+from app.diff import decide, diff_blocks
+from app.utils import block_hashes, content_hash
+
+PAGE = ["Welcome to the shop", "Updated 2026-01-01 10:00", "Cheap parts for sale"]
+
+
+def test_content_hash_matches_hashes_stored_before_block_diffing():
+    legacy = hashlib.sha256()
+    for part in PAGE + ["http://site.test/a.png"]:
+        legacy.update(part.encode("utf-8") + b"\n")
+    assert content_hash(PAGE, ["http://site.test/a.png"]) == legacy.hexdigest()
+
+
+def test_volatile_only_change_reuses_the_verdict():
+    later = [PAGE[0], "Updated 2026-03-04 18:22", PAGE[2]]
+    assert content_hash(later, []) != content_hash(PAGE, [])
+    assert content_hash(later, [], normalize=True) == content_hash(PAGE, [], normalize=True)
+    diff = diff_blocks(block_hashes(PAGE), [], later, [])
+    assert not diff.has_additions and decide(diff, "none") == "reuse"
+
+
+def test_case_only_change_is_analyzed():
+    later = [PAGE[0], PAGE[1], "CHEAP PARTS FOR SALE"]
+    diff = diff_blocks(block_hashes(PAGE), [], later, [])
+    assert diff.added == ["CHEAP PARTS FOR SALE"]
+    assert decide(diff, "none") != "reuse"
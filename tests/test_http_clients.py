@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import httpcore
+import httpx
+import pytest
+
+from app import http_clients
+from app.pipeline import Pipeline
+
+
+async def _client():
+    return http_clients.get_async_client()
+
+
+def test_short_lived_loops_do_not_keep_clients():
+    clients = [asyncio.run(_client()) for _ in range(5)]
+    assert len({id(client) for client in clients}) == 5
+
+    async def live_loops():
+        http_clients.get_async_client()
+        return list(http_clients._ASYNC_CLIENTS)
+
+    # Clients of the five closed loops are gone once another loop asks for one.
+    assert len(asyncio.run(live_loops())) == 1
+
+
+def test_pipeline_closes_its_client_on_shutdown():
+    pipeline = Pipeline(scrape_concurrency=1, image_concurrency=1, llm_concurrency=1)
+    loop = pipeline._ensure_loop()
+    client = asyncio.run_coroutine_threadsafe(_client(), loop).result(5)
+    pipeline.shutdown()
+    assert client.is_closed
+    assert loop not in http_clients._ASYNC_CLIENTS
+
+
+def test_transports_build_one_pool(monkeypatch):
+    built = []
+
+    class Counting(httpcore.ConnectionPool):
+        def __init__(self, *args, **kwargs):
+            built.append(kwargs.get("network_backend"))
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(httpcore, "ConnectionPool", Counting)
+    http_clients.PooledTransport(2).close()
+    assert len(built) == 1 and isinstance(built[0], http_clients._CachingBackend)
+
+
+def test_environment_proxies_are_honored(monkeypatch):
+    for name in ("ALL_PROXY", "all_proxy", "HTTP_PROXY", "http_proxy", "NO_PROXY"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HTTPS_PROXY", "proxy.test:3128")
+    monkeypatch.setenv("no_proxy", "internal.test,127.0.0.1")
+    monkeypatch.setattr(http_clients, "_CLIENT", None)
+    client = http_clients.get_client()
+    try:
+        proxied = client._transport_for_url(httpx.URL("https://site.test/"))
+        assert isinstance(proxied, http_clients.PooledTransport)
+        assert isinstance(proxied._pool, httpcore.HTTPProxy)
+        for direct in ("https://api.internal.test/", "https://127.0.0.1/", "http://site.test/"):
+            assert client._transport_for_url(httpx.URL(direct)) is client._transport
+    finally:
+        http_clients.close_clients()
+
+
+def test_per_host_slot_wait_is_bounded():
+    transport = http_clients.PooledTransport(1)
+    transport._host_limit("site.test").acquire()
+    request = httpx.Request("GET", "http://site.test/", extensions={"timeout": httpx.Timeout(5, pool=0.1).as_dict()})
+    started = time.monotonic()
+    with pytest.raises(httpx.PoolTimeout):
+        transport.handle_request(request)
+    assert time.monotonic() - started < 1
+    transport.close()
+
+
+def test_async_per_host_slot_wait_is_bounded():
+    async def wait():
+        transport = http_clients.AsyncPooledTransport(1)
+        await transport._host_limit("site.test").acquire()
+        timeout = httpx.Timeout(5, pool=0.1).as_dict()
+        with pytest.raises(httpx.PoolTimeout):
+            await transport.handle_async_request(
+                httpx.Request("GET", "http://site.test/", extensions={"timeout": timeout})
+            )
+        await transport.aclose()
+
+    asyncio.run(wait())
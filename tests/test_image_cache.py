@@ -0,0 +1,35 @@
+import pytest
+
+from app.db import execute
+from app.image_cache import MAX_PHASH_DISTANCE, ImageCache, _bands
+
+
+def _flip(phash, *bits):
+    value = int(phash, 16)
+    for bit in bits:
+        value ^= 1 << bit
+    return f"{value:016x}"
+
+
+@pytest.mark.parametrize("distance", [-1, MAX_PHASH_DISTANCE + 1, 10])
+def test_distances_the_bands_cannot_cover_are_rejected(tmp_path, distance):
+    with pytest.raises(ValueError):
+        ImageCache(tmp_path, 0, distance)
+
+
+def test_max_distance_match_spread_over_bands_is_found(db, tmp_path):
+    cache = ImageCache(tmp_path, 0, MAX_PHASH_DISTANCE)
+    phash = "0123456789abcdef"
+    image = cache.store("http://img.test/a.png", "image/png", b"a")
+    # Bypass decoding: give the stored blob a known hash and a verdict.
+    execute(
+        """
+        UPDATE image_blobs SET phash = ?, phash_b0 = ?, phash_b1 = ?, phash_b2 = ?, phash_b3 = ?,
+                               classified_risk = 'none'
+        WHERE content_hash = ?
+        """,
+        (phash, *_bands(phash), image.content_hash),
+    )
+    # One flipped bit in each of three bands: only the fourth band still matches.
+    assert cache._similar_risks(_flip(phash, 0, 16, 32)) == ["none"]
+    assert cache._similar_risks(_flip(phash, 0, 16, 32, 48)) == []
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from app.db import execute
+from app.listing import decode_cursor, encode_cursor, jobs_listing
+
+
+def _job(job_id, created_at, adaptive=0):
+    execute(
+        """
+        INSERT INTO jobs (id, url, interval_seconds, mode, webhook_url, status, created_at, updated_at, adaptive)
+        VALUES (?, ?, 300, 'static', '', 'active', ?, ?, ?)
+        """,
+        (job_id, f"http://site.test/{job_id}", created_at, created_at, adaptive),
+    )
+
+
+def _pages(listing, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        body, cursor = listing.page(cursor, limit)
+        ids.extend(row["id"] for row in json.loads(body))
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+
+def test_empty_listing(db):
+    assert jobs_listing().page(None, 10) == ("[]", None)
+
+
+def test_exactly_one_full_page_has_no_next_cursor(db):
+    for number in range(3):
+        _job(f"j{number}", f"2026-01-0{number + 1}T00:00:00+00:00")
+    body, cursor = jobs_listing().page(None, 3)
+    assert [row["id"] for row in json.loads(body)] == ["j2", "j1", "j0"]
+    assert cursor is None
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_ties_on_the_sort_key_are_neither_skipped_nor_repeated(db, limit):
+    # Same created_at for most rows: the id tiebreak must carry across pages.
+    for number in range(7):
+        _job(f"j{number}", "2026-01-01T00:00:00+00:00" if number < 5 else f"2026-01-0{number}T00:00:00+00:00")
+    ids, pages = _pages(jobs_listing(), limit)
+    assert ids == ["j6", "j5", "j4", "j3", "j2", "j1", "j0"]
+    assert pages == -(-7 // limit)
+
+
+def test_rows_added_between_pages_do_not_shift_the_cursor(db):
+    for number in range(4):
+        _job(f"j{number}", f"2026-01-0{number + 1}T00:00:00+00:00")
+    listing = jobs_listing()
+    body, cursor = listing.page(None, 2)
+    _job("newest", "2026-02-01T00:00:00+00:00")
+    body, cursor = listing.page(cursor, 2)
+    assert [row["id"] for row in json.loads(body)] == ["j1", "j0"]
+    assert cursor is None
+
+
+def test_filters_apply_with_the_cursor(db):
+    for number in range(6):
+        _job(f"j{number}", f"2026-01-0{number + 1}T00:00:00+00:00", adaptive=number % 2)
+    execute("UPDATE jobs SET status = 'paused' WHERE adaptive = 1")
+    ids, _ = _pages(jobs_listing(status="paused"), 1)
+    assert ids == ["j5", "j3", "j1"]
+
+
+def test_adaptive_is_a_boolean(db):
+    _job("on", "2026-01-02T00:00:00+00:00", adaptive=1)
+    _job("off", "2026-01-01T00:00:00+00:00")
+    body, _ = jobs_listing("id,adaptive").page(None, 10)
+    assert json.loads(body) == [{"id": "on", "adaptive": True}, {"id": "off", "adaptive": False}]
+
+
+def test_stream_respects_limit_and_cursor(db):
+    for number in range(5):
+        _job(f"j{number}", f"2026-01-0{number + 1}T00:00:00+00:00")
+    cursor = encode_cursor("2026-01-04T00:00:00+00:00", "j3")
+    lines = "".join(jobs_listing("id").stream(cursor, 2)).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["j2", "j1"]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor("x", "y")[:-3], "W10"])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError):
+        jobs_listing("id,password")
@@ -0,0 +1,118 @@
+import json
+import shutil
+import sqlite3
+
+import pytest
+
+from app.db import MIGRATIONS, close_connections, fetch_all, fetch_one, init_db, schema_version
+from app.listing import RUN_FIELDS, jobs_listing, runs_listing
+from app.utils import url_key
+from tests.conftest import ROOT
+
+# Before versioned migrations some databases also lacked these later-added columns.
+OLDEST_SCHEMA = """
+CREATE TABLE jobs (
+    id TEXT PRIMARY KEY, url TEXT NOT NULL, interval_seconds INTEGER NOT NULL, mode TEXT NOT NULL,
+    webhook_url TEXT NOT NULL, status TEXT NOT NULL, created_at TEXT NOT NULL, updated_at TEXT NOT NULL
+);
+CREATE TABLE runs (
+    id TEXT PRIMARY KEY, job_id TEXT NOT NULL, started_at TEXT NOT NULL, finished_at TEXT,
+    status TEXT NOT NULL, risk_level TEXT, flags TEXT, evidence TEXT, raw_hash TEXT, error TEXT
+);
+CREATE TABLE job_state (job_id TEXT PRIMARY KEY, last_hash TEXT, last_notified_at TEXT);
+"""
+
+RISKY = ("shop", "high", json.dumps(["weapons"]), json.dumps([{"type": "text", "snippet": "ammo"}]), "Sells ammo.")
+SAFE = ("blog", "none", "[]", "[]", "Nothing found.")
+
+
+def _pre_series_db(path, schema):
+    if schema == "baseline":
+        # The database file as shipped before the series (PRAGMA user_version = 0).
+        shutil.copy(ROOT / "data" / "app.db", path)
+    conn = sqlite3.connect(path)
+    if schema == "oldest":
+        conn.executescript(OLDEST_SCHEMA)
+    full = schema == "baseline"
+    conn.executemany(
+        "INSERT INTO jobs VALUES (?, ?, 300, 'static', '', ?, '2025-01-01T00:00:00+00:00', '2025-01-01T00:00:00+00:00')",
+        [("j1", "https://www.Shop.test/a", "active"), ("j2", "https://blog.test/", "paused")],
+    )
+    runs = [("r1", "j1", RISKY), ("r2", "j1", RISKY), ("r3", "j1", RISKY), ("r4", "j2", SAFE)]
+    for number, (run_id, job_id, verdict) in enumerate(runs):
+        started = f"2025-01-01T00:0{number}:00+00:00"
+        site_context, risk_level, flags, evidence, summary = verdict
+        if full:
+            conn.execute(
+                """
+                INSERT INTO runs (id, job_id, started_at, finished_at, status, site_context, risk_level,
+                                  flags, evidence, raw_hash, risk_at, summary, error)
+                VALUES (?, ?, ?, ?, 'success', ?, ?, ?, ?, 'hash', NULL, ?, NULL)
+                """,
+                (run_id, job_id, started, started, site_context, risk_level, flags, evidence, summary),
+            )
+        else:
+            conn.execute(
+                """
+                INSERT INTO runs (id, job_id, started_at, finished_at, status, risk_level, flags, evidence, raw_hash)
+                VALUES (?, ?, ?, ?, 'success', ?, ?, ?, 'hash')
+                """,
+                (run_id, job_id, started, started, risk_level, flags, evidence),
+            )
+    conn.execute(
+        """
+        INSERT INTO runs (id, job_id, started_at, finished_at, status, error)
+        VALUES ('r5', 'j2', '2025-01-01T00:09:00+00:00', NULL, 'failed', 'timeout')
+        """
+    )
+    conn.execute("INSERT INTO job_state (job_id, last_hash) VALUES ('j1', 'hash')")
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(params=["baseline", "oldest"])
+def migrated(request, settings, tmp_path):
+    path = tmp_path / "old.db"
+    _pre_series_db(path, request.param)
+    close_connections()
+    settings(db_path=path, archive_dir=tmp_path / "archive")
+    init_db()
+    yield request.param
+    close_connections()
+
+
+def test_replay_reaches_the_latest_version(migrated):
+    assert schema_version() == MIGRATIONS[-1][0]
+
+
+def test_verdicts_are_deduplicated_and_readable(migrated):
+    assert fetch_one("SELECT COUNT(*) FROM verdicts")[0] == 2
+    assert fetch_one("SELECT COUNT(*) FROM runs WHERE flags IS NOT NULL AND verdict_id IS NOT NULL")[0] == 0
+    rows = {row["id"]: row for row in fetch_all("SELECT * FROM run_details")}
+    assert rows["r1"]["verdict_id"] == rows["r3"]["verdict_id"] != rows["r4"]["verdict_id"]
+    expected = RISKY if migrated == "baseline" else (None, *RISKY[1:4], None)
+    assert tuple(rows["r2"][column] for column in ("site_context", "risk_level", "flags", "evidence", "summary")) == expected
+    assert rows["r5"]["verdict_id"] is None and rows["r5"]["error"] == "timeout"
+
+
+def test_listings_work_on_a_migrated_database(migrated):
+    body, _ = runs_listing(job_id="j1").page(None, 10)
+    runs = json.loads(body)
+    assert [run["id"] for run in runs] == ["r3", "r2", "r1"]
+    assert set(runs[0]) == set(RUN_FIELDS)
+    assert runs[0]["flags"] == ["weapons"]
+    jobs = {job["id"]: job for job in json.loads(jobs_listing().page(None, 10)[0])}
+    assert jobs["j1"]["llm_mode"] == "realtime" and jobs["j1"]["adaptive"] is False
+
+
+def test_backfilled_job_columns(migrated):
+    rows = {row["id"]: row for row in fetch_all("SELECT id, url, url_key, next_run_at FROM jobs")}
+    assert rows["j1"]["url_key"] == url_key(rows["j1"]["url"])
+    assert rows["j1"]["next_run_at"] is not None and rows["j2"]["next_run_at"] is None
+
+
+def test_init_db_again_is_a_no_op(migrated):
+    before = [tuple(row) for row in fetch_all("SELECT * FROM run_details ORDER BY id")]
+    init_db()
+    assert schema_version() == MIGRATIONS[-1][0]
+    assert [tuple(row) for row in fetch_all("SELECT * FROM run_details ORDER BY id")] == before
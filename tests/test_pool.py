@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from dynamic import pool as pool_module
+from dynamic.pool import BrowserPool
+
+
+class _Context:
+    async def close(self):
+        pass
+
+
+class _Browser:
+    def on(self, event, handler):
+        pass
+
+    def is_connected(self):
+        return True
+
+    async def new_context(self):
+        return _Context()
+
+    async def close(self):
+        pass
+
+
+class _Playwright:
+    class chromium:
+        @staticmethod
+        async def launch(headless=True):
+            return _Browser()
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    starts = []
+
+    class _Starter:
+        async def start(self):
+            starts.append(1)
+            if len(starts) == 1:
+                raise RuntimeError("chromium failed to launch")
+            return _Playwright()
+
+    monkeypatch.setattr(pool_module, "async_playwright", _Starter)
+    browser_pool = BrowserPool(size=1)
+    yield browser_pool
+    browser_pool.close()
+
+
+def test_failed_start_is_retried(pool, monkeypatch):
+    async def scrape_in_context(context, url, timeout_ms, profile):
+        return {"url": url, "text": ["ok"], "images": []}
+
+    monkeypatch.setattr(pool_module, "scrape_in_context", scrape_in_context)
+    with pytest.raises(RuntimeError):
+        pool.scrape_sync("http://site.test/")
+    assert pool.scrape_sync("http://site.test/")["text"] == ["ok"]
+
+
+def test_hung_scrape_times_out_and_frees_the_browser(pool, monkeypatch):
+    monkeypatch.setattr(pool_module, "RESULT_MARGIN_SECONDS", 0.2)
+    calls = []
+
+    async def scrape_in_context(context, url, timeout_ms, profile):
+        calls.append(url)
+        if len(calls) == 1:
+            await asyncio.sleep(60)
+        return {"url": url, "text": ["ok"], "images": []}
+
+    monkeypatch.setattr(pool_module, "scrape_in_context", scrape_in_context)
+    # Get past the fixture's failed first start.
+    with pytest.raises(RuntimeError):
+        pool.scrape_sync("http://site.test/start")
+    with pytest.raises(TimeoutError):
+        pool.scrape_sync("http://site.test/hung", timeout_ms=100)
+    # The only browser went back to the pool when the hung scrape was cancelled.
+    assert pool.scrape_sync("http://site.test/next", timeout_ms=100)["text"] == ["ok"]
@@ -0,0 +1,32 @@
+import fake_anthropic_server
+from app.prompt import INSTRUCTIONS, SYSTEM_PROMPT, build_params, cache_min_tokens, prefix_tokens
+
+
+def test_short_prefix_is_sent_as_one_unmarked_block(settings):
+    settings(prompt_cache=True, anthropic_model="claude-sonnet-4-5")
+    assert prefix_tokens() < cache_min_tokens("claude-sonnet-4-5")
+    params, _ = build_params("http://site.test/", ["Some text."], [], [])
+    assert params["system"] == SYSTEM_PROMPT
+    assert params["messages"][0]["content"] == [
+        {"type": "text", "text": INSTRUCTIONS + "URL: http://site.test/\nText:\nSome text."}
+    ]
+    assert "cache_read_input_tokens" not in fake_anthropic_server._usage(params)
+
+
+def test_large_enough_prefix_is_marked_and_read_back(settings, monkeypatch):
+    settings(prompt_cache=True, anthropic_model="claude-sonnet-4-5")
+    monkeypatch.setattr("app.prompt.INSTRUCTIONS", "x " * 3000)
+    params, _ = build_params("http://site.test/", ["Some text."], [], [])
+    first, text = params["messages"][0]["content"]
+    assert first == {"type": "text", "text": "x " * 3000, "cache_control": {"type": "ephemeral"}}
+    assert text["text"].startswith("URL: http://site.test/")
+    fake_anthropic_server.PROMPT_CACHE.clear()
+    assert "cache_creation_input_tokens" in fake_anthropic_server._usage(params)
+    assert fake_anthropic_server._usage(params)["cache_read_input_tokens"] == len(SYSTEM_PROMPT + "x " * 3000) // 4
+
+
+def test_prompt_cache_off_never_marks(settings, monkeypatch):
+    settings(prompt_cache=False)
+    monkeypatch.setattr("app.prompt.INSTRUCTIONS", "x " * 3000)
+    params, _ = build_params("http://site.test/", ["Some text."], [], [])
+    assert len(params["messages"][0]["content"]) == 1
@@ -0,0 +1,64 @@
+import pytest
+
+from app import retention
+from app.db import execute, fetch_all
+from app.retention import _percentile
+
+
+@pytest.mark.parametrize(
+    "values, pct, expected",
+    [
+        ([], 0.5, None),
+        ([7], 0.95, 7),
+        # Nearest rank: ceil(0.5 * 2) = 1, the first value. Round-half-even put 1.5 at rank 2.
+        ([10, 20], 0.5, 10),
+        ([10, 20, 30], 0.5, 20),
+        ([10, 20, 30, 40], 0.5, 20),
+        (list(range(1, 11)), 0.95, 10),
+        (list(range(1, 21)), 0.95, 19),
+        (list(range(1, 101)), 0.95, 95),
+        (list(range(1, 101)), 0.0, 1),
+    ],
+)
+def test_percentile_is_nearest_rank(values, pct, expected):
+    assert _percentile(values, pct) == expected
+
+
+def test_prune_day_works_in_chunks_of_whole_jobs(db, settings, monkeypatch):
+    settings(retention_chunk_rows=3)
+    runs = {"a": 2, "b": 4, "c": 1, "d": 1}
+    for job_id, count in runs.items():
+        execute(
+            """
+            INSERT INTO jobs (id, url, interval_seconds, mode, webhook_url, status, created_at, updated_at)
+            VALUES (?, 'http://site.test/', 300, 'static', '', 'active', '2026-01-01', '2026-01-01')
+            """,
+            (job_id,),
+        )
+        for number in range(count):
+            started = f"2026-01-01T0{number}:00:00+00:00"
+            execute(
+                """
+                INSERT INTO runs (id, job_id, started_at, finished_at, status)
+                VALUES (?, ?, ?, ?, 'failed')
+                """,
+                (f"{job_id}{number}", job_id, started, started),
+            )
+    execute("INSERT INTO runs (id, job_id, started_at, status) VALUES ('next', 'a', '2026-01-02T00:00', 'failed')")
+    chunks = []
+    prune_jobs = retention._prune_jobs
+
+    def spy(day, job_ids):
+        chunks.append(list(job_ids))
+        return prune_jobs(day, job_ids)
+
+    monkeypatch.setattr(retention, "_prune_jobs", spy)
+
+    assert retention.prune_day("2026-01-01") == 8
+    assert chunks == [["a", "b"], ["c", "d"]]
+    totals = {row["job_id"]: row["total"] for row in fetch_all("SELECT job_id, total FROM run_daily")}
+    assert totals == runs
+    assert [row["id"] for row in fetch_all("SELECT id FROM runs")] == ["next"]
+    assert sorted(row["id"] for row in retention.query_archive()) == sorted(
+        f"{job_id}{number}" for job_id, count in runs.items() for number in range(count)
+    )
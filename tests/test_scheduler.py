@@ -0,0 +1,89 @@
+import threading
+
+from app import dispatch
+from app.db import execute, fetch_one
+from app.leases import Claim, SQLiteLeaseStore
+from app.scheduler import LeasedWorker
+
+
+class _Store:
+    def __init__(self, claims):
+        self.claims = claims
+        self.released = []
+
+    def claim_due(self, owner, limit, lease_seconds):
+        claims, self.claims = self.claims[:limit], self.claims[limit:]
+        return claims
+
+    def renew(self, owner, job_ids, lease_seconds):
+        return list(job_ids)
+
+    def release(self, owner, job_id, next_run_at):
+        self.released.append((job_id, next_run_at))
+
+
+def test_shutdown_releases_only_unstarted_claims(db, settings, monkeypatch):
+    settings(scheduler_capacity=2, host_max_concurrency=1, host_min_interval_seconds=0, execution_engine="threads")
+    started, finish = threading.Event(), threading.Event()
+
+    def run_job(job_id):
+        started.set()
+        finish.wait(5)
+
+    monkeypatch.setattr(dispatch, "run_job", run_job)
+    monkeypatch.setattr(dispatch, "job_host", lambda job_id: "site.test")
+    monkeypatch.setattr(dispatch, "_DISPATCHER", None)
+    due = "2026-01-01T00:00:00+00:00"
+    store = _Store([Claim("running", due, 60), Claim("queued", due, 60)])
+    worker = LeasedWorker(store, "w1")
+    assert worker.poll() == 2
+    assert started.wait(5)
+
+    worker.stop()
+    worker.release_unstarted(dispatch.shutdown_dispatcher())
+    # The running job keeps its lease; the queued one goes back still due.
+    assert store.released == [("queued", due)]
+
+    finish.set()
+    for _ in range(50):
+        if len(store.released) == 2:
+            break
+        threading.Event().wait(0.1)
+    assert store.released[1][0] == "running" and store.released[1][1] != due
+
+
+def test_run_now_holds_the_lease_until_the_run_ends(db, settings, monkeypatch):
+    settings(host_min_interval_seconds=0, execution_engine="threads")
+    started, finish = threading.Event(), threading.Event()
+
+    def run_job(job_id):
+        started.set()
+        finish.wait(5)
+
+    monkeypatch.setattr(dispatch, "run_job", run_job)
+    monkeypatch.setattr(dispatch, "_DISPATCHER", None)
+    due = "2026-01-01T00:00:00+00:00"
+    execute(
+        """
+        INSERT INTO jobs (id, url, interval_seconds, mode, webhook_url, status, created_at, updated_at, next_run_at)
+        VALUES ('job', 'http://site.test/', 300, 'static', '', 'active', ?, ?, ?)
+        """,
+        (due, due, due),
+    )
+    first, second = LeasedWorker(SQLiteLeaseStore(), "w1"), LeasedWorker(SQLiteLeaseStore(), "w2")
+    assert first.run_now("job", "site.test")
+    assert started.wait(5)
+    # Due, but leased by the manual run: no other worker may start it.
+    assert second.poll() == 0
+    assert not second.run_now("job", "site.test")
+
+    finish.set()
+    for _ in range(50):
+        row = fetch_one("SELECT lease_owner, next_run_at FROM jobs WHERE id = 'job'")
+        if row["lease_owner"] is None:
+            break
+        threading.Event().wait(0.1)
+    # Released with the schedule untouched, so it is claimable again.
+    assert tuple(row) == (None, due)
+    assert second.poll() == 1
+    dispatch.shutdown_dispatcher()
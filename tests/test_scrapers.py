@@ -0,0 +1,28 @@
+import httpx
+
+from app import scrapers
+from app.db import execute, fetch_one
+from app.runner import fetch_validators, store_validators
+
+SHELL = '<html><body><div id="root"></div><script src="/app.js"></script></body></html>'
+
+
+class _Browser:
+    def scrape_sync(self, url):
+        return {"url": url, "text": ["Rendered by script."] * 6, "images": [], "shell_html": SHELL}
+
+
+def test_browser_fallback_drops_shell_validators(db, monkeypatch):
+    client = httpx.Client(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, text=SHELL, headers={"etag": '"v1"'}))
+    )
+    monkeypatch.setattr(scrapers, "get_client", lambda: client)
+    monkeypatch.setattr(scrapers, "get_browser_pool", lambda: _Browser())
+
+    scraped = scrapers.scrape_url("http://site.test/", "auto", path="static")
+    assert scraped["scrape"]["path"] == "static+browser"
+    assert scraped["fetch"] is None
+
+    execute("INSERT INTO job_state (job_id, last_hash, last_etag, last_body_hash) VALUES ('j', 'h', '\"v1\"', 'b')")
+    store_validators("j", scraped["fetch"])
+    assert fetch_validators(dict(fetch_one("SELECT * FROM job_state WHERE job_id = 'j'"))) is None